@@ -0,0 +1,220 @@
+"""
+Modifications du panier par lot (``POST /cart/batch/``)
+
+Un lot est une liste d'opérations appliquées dans l'ordre, en une transaction :
+
+- ``{"op": "add", "product_id": 1, "size": "M", "quantity": 1}``
+- ``{"op": "update", "product_id": 1, "size": "M", "quantity": 3}`` (0 retire la ligne)
+- ``{"op": "remove", "product_id": 1, "size": "M"}``
+- ``{"op": "customize", "product_id": 1, "size": "M", "type": "name", "name": "DROGBA", "number": "11"}``
+  ou ``{"op": "customize", ..., "type": "badge", "badge_type": "liga"}``
+
+Les produits (avec leurs stocks par taille) et les lignes existantes sont lus
+une fois ; les quantités finales sont contrôlées une fois par produit et par
+taille, puis écrites en une passe. Au moindre refus, rien n'est appliqué.
+
+Avec une clé d'idempotence, la réponse est enregistrée (``CartBatch``) dans
+la même transaction : un lot rejoué avec la même clé renvoie la réponse
+d'origine sans rien réappliquer.
+"""
+
+import hashlib
+import json
+
+from django.db import transaction
+
+from products.models import CartItemCustomization, JerseyCustomization, Product
+
+from .models import CartBatch, CartItem
+
+OPERATIONS = ('add', 'update', 'remove', 'customize')
+
+MAX_OPERATIONS = 50
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+# Durée pendant laquelle un lot peut être rejoué (au-delà, purge_carts l'efface)
+IDEMPOTENCY_TTL_HOURS = 24
+
+
+class BatchError(ValueError):
+    """Lot refusé ; ``index`` désigne l'opération fautive (None pour le lot entier)"""
+
+    def __init__(self, message, index=None, status=400):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+
+
+def fingerprint(operations):
+    """Empreinte d'un lot, pour refuser une clé réutilisée avec d'autres opérations"""
+    canonical = json.dumps(operations, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def parse_operations(operations):
+    """Valide la forme des opérations et normalise leurs champs"""
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("Aucune opération fournie.")
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f"{MAX_OPERATIONS} opérations au maximum par lot.")
+
+    parsed = []
+    for index, raw in enumerate(operations):
+        if not isinstance(raw, dict) or raw.get('op') not in OPERATIONS:
+            raise BatchError("Opération inconnue.", index)
+        try:
+            operation = dict(raw, product_id=int(raw['product_id']), size=str(raw['size']))
+            if raw['op'] in ('add', 'update'):
+                operation['quantity'] = int(raw.get('quantity', 1 if raw['op'] == 'add' else 0))
+        except (KeyError, TypeError, ValueError):
+            raise BatchError("Données invalides.", index)
+        if (raw['op'] == 'add' and operation['quantity'] < 1) or operation.get('quantity', 0) < 0:
+            raise BatchError("Quantité invalide.", index)
+        if raw['op'] == 'customize' and raw.get('type') not in ('name', 'badge'):
+            raise BatchError("Personnalisation inconnue.", index)
+        parsed.append(operation)
+    return parsed
+
+
+def serialize(priced):
+    """Instantané tarifé du panier au format JSON des réponses AJAX"""
+    return {
+        'count': priced.count,
+        'subtotal': float(priced.subtotal),
+        'lines': [
+            {
+                'product_id': line.product.id,
+                'name': line.product.name,
+                'size': line.size,
+                'quantity': line.quantity,
+                'unit_price': float(line.unit_price),
+                'customization_price': float(line.customization_price),
+                'total_price': float(line.total_price),
+                'customizations': [
+                    {
+                        'name': custom.customization.name,
+                        'custom_text': custom.custom_text,
+                        'price': float(custom.price),
+                    }
+                    for custom in line.customizations
+                ],
+            }
+            for line in priced
+        ],
+    }
+
+
+def apply_batch(cart, operations, idempotency_key=None):
+    """
+    Applique un lot au panier et retourne ``(réponse, rejouée)``.
+
+    Lève ``BatchError`` si une opération est refusée (le panier est inchangé).
+    """
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise BatchError("Clé d'idempotence invalide.")
+    operations = parse_operations(operations)
+    batch_fingerprint = fingerprint(operations)
+    # Session et panier créés hors de la transaction : un premier lot refusé ne doit pas les annuler
+    cart.get_cart_id(create=True)
+
+    with transaction.atomic():
+        # Le verrou sur le panier sérialise les lots concurrents (et leurs rejeux)
+        cart_id = cart.lock()
+        if idempotency_key is not None:
+            previous = CartBatch.objects.filter(cart_id=cart_id, idempotency_key=idempotency_key).first()
+            if previous is not None:
+                if previous.fingerprint != batch_fingerprint:
+                    raise BatchError("Clé d'idempotence déjà utilisée pour un autre lot.", status=422)
+                return previous.response, True
+
+        products = Product.objects.filter(
+            id__in={operation['product_id'] for operation in operations}, is_active=True
+        ).prefetch_related('variants').in_bulk()
+        lines = {(item.product_id, item.size): item for item in CartItem.objects.filter(cart_id=cart_id)}
+        quantities = {key: item.quantity for key, item in lines.items()}
+
+        customizations = []
+        for index, operation in enumerate(operations):
+            key = (operation['product_id'], operation['size'])
+            if operation['op'] != 'remove' and operation['product_id'] not in products:
+                raise BatchError("Produit introuvable.", index)
+            if operation['op'] == 'add':
+                quantities[key] = quantities.get(key, 0) + operation['quantity']
+            elif operation['op'] == 'update':
+                quantities[key] = operation['quantity']
+            elif operation['op'] == 'remove':
+                quantities[key] = 0
+            elif not quantities.get(key):
+                raise BatchError("Article absent du panier.", index)
+            else:
+                customizations.append((index, key, operation))
+
+        # Un contrôle de taille et de stock par produit et par taille, sur la quantité finale ;
+        # le stock proposé est celui des variantes préchargées, réservations des paniers en caisse déduites
+        # (``ProductVariant.available``, même règle que ``reserve_cart``)
+        for (product_id, size), quantity in quantities.items():
+            line = lines.get((product_id, size))
+            if not quantity or (line is not None and line.quantity == quantity):
+                continue
+            product = products.get(product_id)
+            if product is None:
+                raise BatchError("Produit introuvable.")
+            if not product.is_available_in_size(size):
+                raise BatchError(f"La taille {size} n'est pas disponible pour {product.name}.")
+            if quantity > product.get_stock_for_size(size):
+                raise BatchError(f"Stock insuffisant pour {product.name} (taille {size}).", status=409)
+
+        to_create, to_update, to_delete = [], [], []
+        for key, quantity in quantities.items():
+            line = lines.get(key)
+            if line is None:
+                if quantity:
+                    to_create.append(CartItem(cart_id=cart_id, product_id=key[0], size=key[1], quantity=quantity))
+            elif not quantity:
+                to_delete.append(line.pk)
+            elif quantity != line.quantity:
+                line.quantity = quantity
+                to_update.append(line)
+        if to_delete:
+            CartItem.objects.filter(pk__in=to_delete).delete()
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        for item in CartItem.objects.bulk_create(to_create):
+            lines[(item.product_id, item.size)] = item
+
+        for index, key, operation in customizations:
+            if not quantities.get(key):
+                raise BatchError("Article absent du panier.", index)
+            _customize(lines[key], operation, index)
+
+        cart._reload(cart_id)
+        response = serialize(cart.priced())
+        if idempotency_key is not None:
+            CartBatch.objects.create(
+                cart_id=cart_id,
+                idempotency_key=idempotency_key,
+                fingerprint=batch_fingerprint,
+                response=response,
+            )
+    return response, False
+
+
+def _customize(cart_item, operation, index):
+    """Ajoute une personnalisation (le prix est calculé par CartItemCustomization.save)"""
+    if operation['type'] == 'name':
+        custom_text = f"{operation.get('name', '')} {operation.get('number', '')}".strip()
+        if not custom_text:
+            raise BatchError("Nom ou numéro manquant.", index)
+        CartItemCustomization.objects.create(
+            cart_item=cart_item,
+            customization=JerseyCustomization.get_or_create_name_customization(),
+            custom_text=custom_text,
+        )
+    else:
+        badge_type = operation.get('badge_type')
+        if badge_type not in dict(JerseyCustomization.BADGE_TYPES):
+            raise BatchError("Badge inconnu.", index)
+        CartItemCustomization.objects.create(
+            cart_item=cart_item,
+            customization=JerseyCustomization.get_or_create_badge_customization(badge_type),
+        )
@@ -1,6 +1,107 @@
+"""
+Moteur du panier
+
+La base de données (``Cart`` / ``CartItem``) est la seule source de vérité :
+c'est elle qui porte les personnalisations et que lit la commande. La session
+n'en garde qu'une copie (écriture simultanée) pour les lectures fréquentes
+(badge de l'en-tête, affichage), au format historique
+``{"<product_id>_<taille>": {"quantity", "price", "size"}}``.
+
+Chaque modification s'exécute dans une transaction et met à jour la copie en
+session à partir de la ligne écrite en base : les deux ne peuvent plus diverger.
+
+Les lectures qui ont besoin des prix (itération, totaux) passent par
+l'instantané tarifé de ``pricing``, calculé une fois par requête.
+
+Un résumé (nombre d'articles, sous-total) est aussi dénormalisé en session :
+le badge de l'en-tête le lit sans désérialiser le panier ni charger les produits
+(voir ``get_cart_summary`` et ``context_processors.cart``).
+"""
+
 from decimal import Decimal
 from django.conf import settings
-from products.models import Product
+from django.db import transaction
+from django.db.models import Case, FilteredRelation, IntegerField, Q, Value, When
+from . import pricing
+
+# Identifiant du panier en base et propriétaire (id utilisateur ou None), gardés en session
+CART_ID_SESSION_KEY = 'cart_id'
+
+# Résumé du panier pour le badge : {"count", "total", "owner"}
+CART_SUMMARY_SESSION_KEY = 'cart_summary'
+
+EMPTY_SUMMARY = {'count': 0, 'total': '0'}
+
+
+def _item_key(product_id, size):
+    return f"{product_id}_{size}"
+
+
+def merge_carts(source_id, target_id):
+    """
+    Fusionne le panier ``source_id`` dans ``target_id`` puis le supprime.
+
+    Un seul upsert écrit toutes les lignes dans le panier cible (quantités
+    additionnées sur ``(panier, produit, taille)``) ; les personnalisations
+    sont déplacées en une mise à jour vers la ligne cible correspondante.
+    """
+    from products.models import CartItemCustomization
+    from .models import Cart as CartModel, CartItem
+
+    target, source = {}, {}
+    for item_id, cart_id, product_id, size, quantity in CartItem.objects.filter(
+        cart_id__in=[source_id, target_id]
+    ).values_list('id', 'cart_id', 'product_id', 'size', 'quantity'):
+        if cart_id == target_id:
+            target[(product_id, size)] = quantity
+        else:
+            source[(product_id, size)] = (item_id, quantity)
+    if source:
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart_id=target_id, product_id=product_id, size=size,
+                         quantity=target.get((product_id, size), 0) + quantity)
+                for (product_id, size), (_item_id, quantity) in source.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product', 'size'],
+            update_fields=['quantity'],
+        )
+        target_ids = {
+            (product_id, size): item_id
+            for item_id, product_id, size in CartItem.objects.filter(
+                cart_id=target_id, product_id__in={product_id for product_id, _size in source}
+            ).values_list('id', 'product_id', 'size')
+        }
+        moves = {item_id: target_ids[key] for key, (item_id, _quantity) in source.items()}
+        CartItemCustomization.objects.filter(cart_item_id__in=list(moves)).update(
+            cart_item_id=Case(
+                *[When(cart_item_id=old_id, then=Value(new_id)) for old_id, new_id in moves.items()],
+                output_field=IntegerField(),
+            )
+        )
+    CartModel.objects.filter(pk=source_id).delete()
+
+
+def get_cart_summary(request):
+    """
+    Nombre d'articles et sous-total du panier, lus dans la session.
+
+    Le panier n'est chargé que si le résumé manque ou appartient à un autre
+    propriétaire (connexion depuis la dernière écriture).
+    """
+    session = request.session
+    summary = session.get(CART_SUMMARY_SESSION_KEY)
+    user = getattr(request, 'user', None)
+    owner = user.pk if user is not None and user.is_authenticated else None
+    if summary is not None and summary.get('owner') == owner:
+        return summary
+    if summary is None and not session.get(settings.CART_SESSION_ID) and owner is None:
+        # Visiteur anonyme qui n'a jamais rien ajouté : rien à lire ni à écrire
+        return EMPTY_SUMMARY
+    cart = Cart(request)
+    cart.get_cart_id()
+    return cart.summary()
 
 
 class Cart:
@@ -8,159 +109,248 @@ class Cart:
         """Initialise le panier"""
         self.session = request.session
         self._request = request
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # Sauvegarder un panier vide dans la session
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # Le panier vide n'est écrit en session qu'à la première modification (save)
+        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
+
+    # Panier canonique (base de données)
+
+    @property
+    def _user(self):
+        user = getattr(self._request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def _owner(self):
+        user = self._user
+        return user.pk if user else None
+
+    def _session_key(self):
+        if not self.session.session_key:
+            self.session.save()
+        return self.session.session_key
+
+    def _find_cart(self):
+        from .models import Cart as CartModel
+
+        user = self._user
+        if user:
+            return CartModel.objects.filter(user=user).order_by('id').first()
+        if not self.session.session_key:
+            return None
+        return CartModel.objects.filter(user__isnull=True, session_key=self.session.session_key).order_by('id').first()
+
+    def get_cart_id(self, create=False):
+        """
+        Retourne l'id du panier en base du visiteur courant (None s'il n'existe pas).
+
+        L'id est mémorisé en session : aucune requête tant que le propriétaire ne change pas.
+        """
+        from .models import Cart as CartModel
+
+        owner = self._owner()
+        cached = self.session.get(CART_ID_SESSION_KEY)
+        if cached and cached[1] == owner:
+            return cached[0]
+
+        # Changement de propriétaire (le panier anonyme est fusionné à la connexion,
+        # voir attach_to_user) : on relit le panier du nouveau propriétaire
+        cart = self._find_cart()
+        if cart is not None:
+            cart_id = cart.pk
+        elif create:
+            cart_id = CartModel.objects.create(
+                user=self._user, session_key=None if owner else self._session_key()
+            ).pk
+            self.session[CART_ID_SESSION_KEY] = [cart_id, owner]
+            # Nouveau panier : rien à relire en base
+            if self.cart:
+                self.cart.clear()
+            self.save()
+            return cart_id
+        else:
+            cart_id = None
+
+        if cart_id is None:
+            self.session.pop(CART_ID_SESSION_KEY, None)
+        else:
+            self.session[CART_ID_SESSION_KEY] = [cart_id, owner]
+        self._reload(cart_id)
+        return cart_id
+
+    def attach_to_user(self, user):
+        """
+        Rattache le panier anonyme de la session à l'utilisateur qui se connecte.
+
+        Sans panier utilisateur, le panier anonyme est simplement adopté ; sinon
+        ses lignes y sont fusionnées (voir ``merge_carts``). Appelé par le
+        signal ``user_logged_in``.
+        """
+        from .models import Cart as CartModel
+
+        cached = self.session.get(CART_ID_SESSION_KEY)
+        if not cached or cached[1] is not None:
+            return
+        anonymous_id = cached[0]
+        target = CartModel.objects.filter(user=user).order_by('id').values_list('id', flat=True).first()
+        with transaction.atomic():
+            if target is None:
+                if CartModel.objects.filter(pk=anonymous_id, user__isnull=True).update(user=user, session_key=None):
+                    target = anonymous_id
+            elif target != anonymous_id:
+                merge_carts(anonymous_id, target)
+
+        if target is None:
+            self.session.pop(CART_ID_SESSION_KEY, None)
+        else:
+            self.session[CART_ID_SESSION_KEY] = [target, user.pk]
+        self._reload(target)
+
+    def _reload(self, cart_id):
+        """Reconstruit la copie en session à partir de la base"""
+        from .models import CartItem
+
+        had_items = bool(self.cart)
+        self.cart.clear()
+        if cart_id is not None:
+            for item in CartItem.objects.filter(cart_id=cart_id).select_related('product'):
+                self._store(item)
+        if had_items or self.cart or CART_SUMMARY_SESSION_KEY in self.session:
+            self.save()
+
+    def _store(self, cart_item):
+        """Reporte une ligne du panier en base dans la copie en session"""
+        self.cart[_item_key(cart_item.product_id, cart_item.size)] = {
+            'quantity': cart_item.quantity,
+            'price': str(cart_item.product.current_price),
+            'size': cart_item.size,
+        }
+
+    def db_items(self):
+        """Articles du panier en base (queryset vide si le visiteur n'a pas de panier)"""
+        from .models import CartItem
+
+        cart_id = self.get_cart_id()
+        if cart_id is None:
+            return CartItem.objects.none()
+        return CartItem.objects.filter(cart_id=cart_id)
+
+    # Modifications
+
+    def lock(self):
+        """
+        Crée au besoin puis verrouille le panier en base jusqu'à la fin de la
+        transaction en cours ; retourne son id.
+        """
+        from .models import Cart as CartModel
+
+        cart_id = self.get_cart_id(create=True)
+        if CartModel.objects.select_for_update().filter(pk=cart_id).values_list('id', flat=True).first() is None:
+            # Panier supprimé entre-temps (purge, administration) : on en recrée un
+            self.session.pop(CART_ID_SESSION_KEY, None)
+            cart_id = self.get_cart_id(create=True)
+        return cart_id
 
     def add(self, product, size, quantity=1, override_quantity=False):
         """Ajouter un produit au panier ou mettre à jour sa quantité"""
-        product_id = str(product.id)
-        size_key = f"{product_id}_{size}"
-        
-        if size_key not in self.cart:
-            self.cart[size_key] = {
-                'quantity': 0,
-                'price': str(product.current_price),
-                'size': size
-            }
-        
-        if override_quantity:
-            self.cart[size_key]['quantity'] = quantity
-        else:
-            self.cart[size_key]['quantity'] += quantity
-        
+        from .models import Cart as CartModel, CartItem
+
+        with transaction.atomic():
+            line = None
+            cart_id = self.get_cart_id(create=True)
+            # Une requête : verrou sur le panier (toujours présent ?) et ligne existante éventuelle
+            row = CartModel.objects.select_for_update(of=('self',)).filter(pk=cart_id).annotate(
+                line=FilteredRelation('items', condition=Q(items__product_id=product.id, items__size=size))
+            ).values_list('line__id', 'line__quantity').first()
+            if row is None:
+                # Panier supprimé entre-temps (purge, administration) : on en recrée un
+                self.session.pop(CART_ID_SESSION_KEY, None)
+                cart_id = self.get_cart_id(create=True)
+            elif row[0] is not None:
+                line = row
+
+            current = line[1] if line else 0
+            cart_item = CartItem(
+                pk=line[0] if line else None,
+                cart_id=cart_id,
+                product=product,
+                size=size,
+                quantity=quantity if override_quantity else current + quantity,
+            )
+            # CartItem.save() valide la taille et le stock sur la quantité totale
+            if line:
+                cart_item.save(update_fields=['quantity'])
+            else:
+                cart_item.save(force_insert=True)
+
+        self._store(cart_item)
         self.save()
-        
+
         # Retourner le cart_item pour les personnalisations
-        from .models import Cart, CartItem
-        from django.contrib.auth.models import AnonymousUser
-        
-        # Créer ou récupérer le panier
-        if hasattr(self, '_request') and not isinstance(self._request.user, AnonymousUser):
-            cart, created = Cart.objects.get_or_create(user=self._request.user)
-        else:
-            cart, created = Cart.objects.get_or_create(session_key=self._request.session.session_key)
-        
-        # Créer ou récupérer le cart_item
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            size=size,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            if override_quantity:
-                cart_item.quantity = quantity
-            else:
-                cart_item.quantity += quantity
-            cart_item.save()
-        
         return cart_item
 
     def save(self):
-        """Marquer la session comme "modifiée" pour s'assurer qu'elle est sauvegardée"""
+        """Écrire la copie et le résumé en session et marquer celle-ci comme modifiée"""
+        self.session[settings.CART_SESSION_ID] = self.cart
+        self.session[CART_SUMMARY_SESSION_KEY] = self.summary()
         self.session.modified = True
+        pricing.invalidate(self._request)
 
     def remove(self, product, size):
         """Supprimer un produit du panier"""
-        product_id = str(product.id)
-        size_key = f"{product_id}_{size}"
-        
-        if size_key in self.cart:
-            del self.cart[size_key]
+        from .models import CartItem
+
+        with transaction.atomic():
+            cart_id = self.get_cart_id()
+            if cart_id is not None:
+                CartItem.objects.filter(cart_id=cart_id, product_id=product.id, size=size).delete()
+
+        if self.cart.pop(_item_key(product.id, size), None) is not None:
             self.save()
 
+    def clear(self):
+        """Vider le panier (session et base de données)"""
+        from .models import CartItem
+
+        with transaction.atomic():
+            cart_id = self.get_cart_id()
+            if cart_id is not None:
+                CartItem.objects.filter(cart_id=cart_id).delete()
+
+        self.cart.clear()
+        self.save()
+
+    def update_quantity(self, product, size, quantity):
+        """Mettre à jour la quantité d'un article"""
+        if quantity > 0:
+            self.add(product, size, quantity, override_quantity=True)
+        else:
+            self.remove(product, size)
+
+    # Lectures
+
+    def priced(self):
+        """Instantané tarifé du panier (mémorisé pour la requête)"""
+        return pricing.get_priced_cart(self)
+
     def __iter__(self):
-        """Itérer sur les articles du panier et obtenir les produits de la base de données"""
-        product_ids = []
-        for key in self.cart.keys():
-            product_id = key.split('_')[0]
-            if product_id not in product_ids:
-                product_ids.append(product_id)
-        
-        # Obtenir les objets produit et les ajouter au panier
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        
-        for product in products:
-            product_id = str(product.id)
-            for key in cart.keys():
-                if key.startswith(product_id + '_'):
-                    cart[key]['product'] = product
-
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        """Itérer sur les articles du panier (produits et personnalisations chargés en une passe)"""
+        for line in self.priced():
+            yield line.as_item()
 
     def __len__(self):
         """Compter tous les articles dans le panier"""
         return sum(item['quantity'] for item in self.cart.values())
 
+    def summary(self):
+        """Résumé dénormalisé : nombre d'articles et sous-total (hors personnalisations)"""
+        total = sum(
+            (Decimal(item['price']) * item['quantity'] for item in self.cart.values()), Decimal('0')
+        )
+        return {'count': len(self), 'total': str(total), 'owner': self._owner()}
+
     def get_total_price(self):
         """Calculer le coût total des articles dans le panier avec personnalisations"""
-        total = 0
-        
-        # Récupérer les cart_items avec leurs personnalisations
-        from .models import Cart, CartItem
-        from django.contrib.auth.models import AnonymousUser
-        
-        if hasattr(self, '_request') and not isinstance(self._request.user, AnonymousUser):
-            cart = Cart.objects.filter(user=self._request.user).first()
-        else:
-            cart = Cart.objects.filter(session_key=self._request.session.session_key).first()
-        
-        if cart:
-            # Utiliser les cart_items qui ont déjà les personnalisations calculées
-            for cart_item in cart.items.all():
-                total += cart_item.total_price
-        else:
-            # Fallback : calcul basique sans personnalisations
-            for item in self.cart.values():
-                base_price = Decimal(item['price']) * item['quantity']
-                total += base_price
-        
-        return total
-
-    def clear(self):
-        """Supprimer le panier de la session et de la base de données"""
-        # Vider la session
-        if settings.CART_SESSION_ID in self.session:
-            del self.session[settings.CART_SESSION_ID]
-        
-        # Vider la base de données
-        from .models import Cart, CartItem
-        from django.contrib.auth.models import AnonymousUser
-        
-        if hasattr(self, '_request') and not isinstance(self._request.user, AnonymousUser):
-            # Utilisateur connecté
-            try:
-                cart = Cart.objects.get(user=self._request.user)
-                cart.items.all().delete()
-            except Cart.DoesNotExist:
-                pass
-        else:
-            # Utilisateur anonyme
-            try:
-                cart = Cart.objects.get(session_key=self._request.session.session_key)
-                cart.items.all().delete()
-            except Cart.DoesNotExist:
-                pass
-        
-        self.save()
+        return self.priced().subtotal
 
     def get_item(self, product, size):
         """Obtenir un article spécifique du panier"""
-        product_id = str(product.id)
-        size_key = f"{product_id}_{size}"
-        return self.cart.get(size_key)
-
-    def update_quantity(self, product, size, quantity):
-        """Mettre à jour la quantité d'un article"""
-        if quantity > 0:
-            self.add(product, size, quantity, override_quantity=True)
-        else:
-            self.remove(product, size)
+        return self.cart.get(_item_key(product.id, size))
@@ -1,6 +1,48 @@
-from .cart import Cart
+from decimal import Decimal
+from django.utils.functional import cached_property
+from .cart import Cart, get_cart_summary
+
+
+class LazyCart:
+    """
+    Panier des templates, construit à la première utilisation.
+
+    ``{% if cart %}`` et ``{{ cart|length }}`` (badge de l'en-tête) se
+    contentent du résumé en session ; itérer ou appeler une méthode charge
+    le vrai panier. Une page qui ne lit pas le panier ne touche pas la session.
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    @cached_property
+    def _cart(self):
+        return Cart(self._request)
+
+    @cached_property
+    def _summary(self):
+        return get_cart_summary(self._request)
+
+    @property
+    def total(self):
+        """Sous-total des articles (hors personnalisations)"""
+        return Decimal(self._summary['total'])
+
+    def __len__(self):
+        return self._summary['count']
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        return iter(self._cart)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._cart, name)
 
 
 def cart(request):
     """Context processor pour rendre le panier disponible dans tous les templates"""
-    return {'cart': Cart(request)}
+    return {'cart': LazyCart(request)}
@@ -0,0 +1,43 @@
+"""
+Commande Django pour purger les paniers anonymes abandonnés et les sessions expirées
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from cart.purge import BATCH_SIZE, CartPurger
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime par lots les paniers anonymes dont la session a expiré, "
+        "les lots rejouables périmés et les sessions expirées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Nombre de paniers / sessions supprimés par transaction (défaut : {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help="Pause en secondes entre deux lots, pour laisser respirer la base (défaut : 0)",
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être supérieur à 0")
+
+        self.stdout.write("🧹 Purge des paniers abandonnés et des sessions expirées...")
+        purger = CartPurger(batch_size=options['batch_size'], pause=options['pause']).run()
+
+        self.stdout.write(f"🛒 Paniers supprimés : {purger.carts}")
+        self.stdout.write(f"🔑 Sessions supprimées : {purger.sessions}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Purge terminée : {purger.rows} ligne(s) en {purger.batches} lot(s), "
+                f"{purger.elapsed:.1f}s ({purger.rate:.0f} lignes/s)"
+            )
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, verbose_name="Clé d'idempotence")),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Empreinte des opérations')),
+                ('response', models.JSONField(verbose_name='Réponse')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='cart.cart', verbose_name='Panier')),
+            ],
+            options={
+                'verbose_name': "Lot d'opérations",
+                'verbose_name_plural': "Lots d'opérations",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartbatch',
+            constraint=models.UniqueConstraint(fields=('cart', 'idempotency_key'), name='unique_cart_batch_key'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cart_batch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['session_key'], name='cart_anon_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['updated_at'], name='cart_anon_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cartbatch',
+            index=models.Index(fields=['created_at'], name='cart_batch_created_idx'),
+        ),
+    ]
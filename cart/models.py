@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from products.models import Product
 
@@ -12,6 +13,11 @@ class Cart(models.Model):
     class Meta:
         verbose_name = "Panier"
         verbose_name_plural = "Paniers"
+        indexes = [
+            # Paniers anonymes : recherche par session et purge par ancienneté
+            models.Index(fields=['session_key'], name='cart_anon_session_idx', condition=Q(user__isnull=True)),
+            models.Index(fields=['updated_at'], name='cart_anon_updated_idx', condition=Q(user__isnull=True)),
+        ]
 
     def __str__(self):
         if self.user:
@@ -79,3 +85,25 @@ class CartItem(models.Model):
             raise ValueError(f"Stock insuffisant pour la taille {self.size}")
         
         super().save(*args, **kwargs)
+
+
+class CartBatch(models.Model):
+    """Lot d'opérations appliqué au panier, mémorisé par clé d'idempotence"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='batches', verbose_name="Panier")
+    idempotency_key = models.CharField(max_length=64, verbose_name="Clé d'idempotence")
+    fingerprint = models.CharField(max_length=64, verbose_name="Empreinte des opérations")
+    response = models.JSONField(verbose_name="Réponse")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+
+    class Meta:
+        verbose_name = "Lot d'opérations"
+        verbose_name_plural = "Lots d'opérations"
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'idempotency_key'], name='unique_cart_batch_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='cart_batch_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Lot {self.idempotency_key} ({self.cart})"
@@ -0,0 +1,128 @@
+"""
+Tarification du panier
+
+``price_cart`` charge en une passe les lignes du panier en base, leurs
+produits (``select_related``), leurs personnalisations et les images des
+produits (``prefetch_related``) ; les options de personnalisation viennent
+du catalogue en mémoire (``products.customizations``). Il calcule ensuite,
+avec les règles de prix (``products.pricing_rules``), un instantané figé :
+prix unitaire courant, prix de base, personnalisations et total de chaque
+ligne, sous-total du panier.
+
+``get_priced_cart`` mémorise cet instantané sur la requête : vues, template
+tags et réponses AJAX lisent le même calcul, quel que soit le nombre d'appels.
+Toute modification du panier via ``Cart`` l'invalide.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from products.customizations import get_option
+from products.pricing_rules import price_line
+
+# Attribut de la requête qui porte l'instantané mémorisé
+REQUEST_ATTRIBUTE = '_priced_cart'
+
+
+@dataclass(frozen=True)
+class PricedLine:
+    """Ligne tarifée du panier"""
+    cart_item: object
+    product: object
+    size: str
+    quantity: int
+    unit_price: Decimal
+    customizations: tuple
+    customization_price: Decimal
+
+    @property
+    def base_price(self):
+        return self.unit_price * self.quantity
+
+    @property
+    def total_price(self):
+        return self.base_price + self.customization_price
+
+    def as_item(self):
+        """Ligne au format historique des itérations sur ``Cart``"""
+        return {
+            'product': self.product,
+            'size': self.size,
+            'quantity': self.quantity,
+            'price': self.unit_price,
+            'total_price': self.base_price,
+            'customizations': list(self.customizations),
+            'total_price_with_customizations': self.total_price,
+            'cart_item': self.cart_item,
+        }
+
+
+@dataclass(frozen=True)
+class PricedCart:
+    """Instantané tarifé du panier"""
+    lines: tuple
+
+    @property
+    def count(self):
+        return sum(line.quantity for line in self.lines)
+
+    @property
+    def subtotal(self):
+        return sum((line.total_price for line in self.lines), Decimal('0'))
+
+    def stock_lines(self):
+        """Lignes ``(produit, taille, quantité)`` pour les réservations de stock"""
+        return [(line.product.id, line.size, line.quantity) for line in self.lines]
+
+    def get_line(self, product_id, size):
+        for line in self.lines:
+            if line.product.id == product_id and line.size == size:
+                return line
+        return None
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return self.count
+
+
+def price_cart(items):
+    """Tarifie un queryset de ``CartItem`` (lignes, personnalisations et images : trois requêtes)"""
+    items = items.select_related('product', 'product__team').prefetch_related(
+        'customizations', 'product__images'
+    ).order_by('added_at', 'id')
+
+    lines = []
+    for cart_item in items:
+        customizations = tuple(cart_item.customizations.all())
+        price = price_line(cart_item.product, cart_item.quantity, customizations)
+        for custom, custom_price in zip(customizations, price.customization_prices):
+            # Options résolues depuis le catalogue en mémoire, prix affiché = prix des règles
+            custom.customization = get_option(custom.customization_id)
+            custom.price = custom_price
+        lines.append(PricedLine(
+            cart_item=cart_item,
+            product=cart_item.product,
+            size=cart_item.size,
+            quantity=cart_item.quantity,
+            unit_price=price.unit_price,
+            customizations=customizations,
+            customization_price=price.customization_price,
+        ))
+    return PricedCart(lines=tuple(lines))
+
+
+def get_priced_cart(cart):
+    """Instantané tarifé du panier, calculé une fois par requête"""
+    request = cart._request
+    priced = getattr(request, REQUEST_ATTRIBUTE, None)
+    if priced is None:
+        priced = price_cart(cart.db_items())
+        setattr(request, REQUEST_ATTRIBUTE, priced)
+    return priced
+
+
+def invalidate(request):
+    """Oublie l'instantané mémorisé (après une modification du panier)"""
+    request.__dict__.pop(REQUEST_ATTRIBUTE, None)
@@ -0,0 +1,133 @@
+"""
+Purge des paniers anonymes abandonnés et des sessions expirées
+
+Un panier anonyme n'est joignable que par sa session : une fois celle-ci
+expirée ou supprimée, il est abandonné. Une session expire au plus tôt
+``SESSION_COOKIE_AGE`` après la création du panier : seuls les paniers
+anonymes plus anciens (index partiel sur ``updated_at``) sont examinés, puis
+gardés s'ils ont encore une session valide.
+
+Tout est supprimé par lots bornés, chacun dans sa propre transaction
+(personnalisations, lignes, lots rejouables puis paniers) : aucun verrou
+n'est tenu longtemps et la commande peut tourner toutes les quelques minutes
+(``python manage.py purge_carts``).
+"""
+
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from products.models import CartItemCustomization
+
+from .batch import IDEMPOTENCY_TTL_HOURS
+from .models import Cart, CartBatch, CartItem
+
+BATCH_SIZE = 500
+
+
+def session_model():
+    """Modèle des sessions en base, ou None si le moteur de session n'en utilise pas"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    return store.get_model_class() if hasattr(store, 'get_model_class') else None
+
+
+class CartPurger:
+    """
+    Supprime par lots les paniers anonymes abandonnés, les lots rejouables
+    périmés et les sessions expirées.
+
+    ``progress`` est appelé après chaque lot avec le purgeur lui-même.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, pause=0.0, progress=None):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.progress = progress
+        self.carts = 0
+        self.rows = 0
+        self.sessions = 0
+        self.batches = 0
+        self.elapsed = 0.0
+        self.started_at = None
+
+    @property
+    def rate(self):
+        """Lignes supprimées par seconde"""
+        elapsed = self.elapsed or (time.monotonic() - self.started_at if self.started_at else 0)
+        return self.rows / elapsed if elapsed else 0.0
+
+    def run(self):
+        self.started_at = time.monotonic()
+        now = timezone.now()
+        self._purge_carts(now)
+        self._purge_batches(now)
+        self._purge_sessions(now)
+        self.elapsed = time.monotonic() - self.started_at
+        return self
+
+    def abandoned_carts(self, now):
+        """Paniers anonymes plus anciens que la durée de session et sans session valide"""
+        carts = Cart.objects.filter(
+            user__isnull=True,
+            updated_at__lt=now - timedelta(seconds=settings.SESSION_COOKIE_AGE),
+        )
+        model = session_model()
+        if model is not None:
+            carts = carts.exclude(
+                Exists(model.objects.filter(session_key=OuterRef('session_key'), expire_date__gt=now))
+            )
+        return carts
+
+    def _purge_carts(self, now):
+        candidates = self.abandoned_carts(now).order_by('updated_at')
+        while True:
+            ids = list(candidates.values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Des enfants vers le parent : chaque DELETE porte sur un lot d'ids indexés
+                deleted = CartItemCustomization.objects.filter(cart_item__cart_id__in=ids).delete()[0]
+                deleted += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                deleted += CartBatch.objects.filter(cart_id__in=ids).delete()[0]
+                deleted += Cart.objects.filter(id__in=ids).delete()[0]
+            self.carts += len(ids)
+            self._done(deleted)
+
+    def _purge_batches(self, now):
+        expired = CartBatch.objects.filter(
+            created_at__lt=now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        ).order_by('created_at')
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                break
+            self._done(CartBatch.objects.filter(id__in=ids).delete()[0])
+
+    def _purge_sessions(self, now):
+        model = session_model()
+        if model is None:
+            # Moteurs sans table (cache, fichiers) : nettoyage natif du moteur
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+            return
+        expired = model.objects.filter(expire_date__lt=now).order_by('expire_date')
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:self.batch_size])
+            if not keys:
+                break
+            deleted = model.objects.filter(session_key__in=keys).delete()[0]
+            self.sessions += deleted
+            self._done(deleted)
+
+    def _done(self, deleted):
+        self.rows += deleted
+        self.batches += 1
+        if self.progress:
+            self.progress(self)
+        if self.pause:
+            time.sleep(self.pause)
+
@@ -0,0 +1,15 @@
+"""
+Signaux du panier : rattachement du panier anonyme à la connexion
+"""
+
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from .cart import Cart
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """Fusionne le panier de la session anonyme dans celui de l'utilisateur connecté"""
+    if request is None or not hasattr(request, 'session'):
+        return
+    Cart(request).attach_to_user(user)
@@ -0,0 +1,67 @@
+"""
+Moteur de session du site (``SESSION_ENGINE = 'cart.sessions'``)
+
+Basé sur ``cached_db`` : les lectures passent par le cache local
+(``SESSION_CACHE_ALIAS``, un cache fichier partagé par les workers) et la
+base reste la référence en cas d'absence dans le cache.
+
+Le panier marque la session modifiée à chaque accès en écriture, même quand
+rien ne change. Ce moteur compare l'empreinte du contenu à celle lue au
+chargement et n'écrit (base et cache) que si elle a changé : la navigation
+sans modification du panier ne déclenche plus d'UPDATE sur ``django_session``.
+
+Le cookie, lui, est prolongé à chaque requête qui marque la session modifiée :
+une écriture est donc quand même faite une fois par ``REFRESH_INTERVAL`` pour
+que l'expiration en base suive celle du cookie.
+"""
+
+import hashlib
+import json
+import time
+
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+# Date (timestamp) de la dernière écriture effective, exclue de l'empreinte
+REFRESHED_AT_KEY = '_session_refreshed_at'
+
+REFRESH_INTERVAL = 24 * 60 * 60
+
+
+def digest(session_dict):
+    """Empreinte stable du contenu d'une session"""
+    content = {key: value for key, value in session_dict.items() if key != REFRESHED_AT_KEY}
+    payload = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class SessionStore(CachedDBStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._stored_digest = None
+
+    def load(self):
+        data = super().load()
+        # Session inconnue ou expirée : une nouvelle clé sera créée, il faudra l'écrire
+        self._stored_digest = digest(data) if self.session_key else None
+        return data
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        now = int(time.time())
+        if (
+            not must_create
+            and self._stored_digest is not None
+            and digest(data) == self._stored_digest
+            and now - data.get(REFRESHED_AT_KEY, 0) < REFRESH_INTERVAL
+        ):
+            # Contenu identique à celui lu et expiration récente : rien à écrire
+            return
+        data[REFRESHED_AT_KEY] = now
+        super().save(must_create=must_create)
+        self._stored_digest = digest(data)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None or session_key == self.session_key:
+            self._stored_digest = None
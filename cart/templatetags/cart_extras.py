@@ -9,6 +9,10 @@ def get_cart_item(item, user):
     Récupère le cart_item correspondant à un item du panier
     pour accéder aux personnalisations
     """
+    # Les items issus de l'instantané tarifé portent déjà leur cart_item
+    # (produit et personnalisations préchargés)
+    if 'cart_item' in item:
+        return item['cart_item']
     try:
         cart_item = CartItem.objects.filter(
             cart__user=user,
@@ -1,3 +1,394 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from products import customizations
+from products.cache import bump_shared_version
+from products.models import CartItemCustomization, Category, JerseyCustomization, Product, ProductVariant, Team
+from products.pricing_rules import customization_price
+from .cart import CART_SUMMARY_SESSION_KEY, Cart
+from .models import Cart as CartModel, CartItem
+from .pricing import price_cart
+from .sessions import SessionStore as CartSessionStore
 
-# Create your tests here.
+
+class CartEngineTest(TestCase):
+    """Tests du moteur de panier (base canonique + copie en session)"""
+
+    def setUp(self):
+        customizations.invalidate()
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="ASEC Mimosas", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot ASEC", category=category, team=team, description="Maillot",
+            price=Decimal('10000'), available_sizes=['M', 'L'], stock_quantity=5
+        )
+
+    def _cart(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        return Cart(request)
+
+    def test_session_and_database_stay_in_sync(self):
+        """Ajout, mise à jour et suppression écrivent la base et la copie en session"""
+        cart = self._cart()
+        cart.add(self.product, 'M', 2)
+        cart.add(self.product, 'M', 1)
+        cart.add(self.product, 'L', 1)
+        self.assertEqual(len(cart), 4)
+        self.assertEqual(
+            dict(CartItem.objects.values_list('size', 'quantity')), {'M': 3, 'L': 1}
+        )
+
+        cart.remove(self.product, 'M')
+        self.assertEqual(list(CartItem.objects.values_list('size', flat=True)), ['L'])
+        self.assertEqual(list(cart.cart), [f'{self.product.id}_L'])
+        self.assertEqual(cart.get_total_price(), Decimal('10000'))
+
+        with self.assertRaises(ValueError):
+            cart.add(self.product, 'L', 10)
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+    def test_add_to_existing_cart_takes_two_queries(self):
+        """Un ajout sur un panier existant coûte une lecture et une écriture"""
+        cart = self._cart()
+        cart.add(self.product, 'M', 1)
+        self.product.is_available_in_size('L')
+        with CaptureQueriesContext(connection) as queries:
+            cart.add(self.product, 'L', 1)
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 2)
+
+    def test_login_keeps_anonymous_cart(self):
+        """Le panier anonyme suit le visiteur après connexion"""
+        user = User.objects.create_user(username='fan', password='testpass123')
+        self.client.post(reverse('cart:cart_add'), {'product_id': self.product.id, 'size': 'M', 'quantity': 2})
+        self.client.login(username='fan', password='testpass123')
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual([item['quantity'] for item in response.context['cart_items']], [2])
+        self.assertEqual(CartModel.objects.get().user, user)
+
+    def test_login_merges_into_existing_user_cart(self):
+        """À la connexion, les lignes anonymes sont fusionnées dans le panier du compte"""
+        user = User.objects.create_user(username='fan', password='testpass123')
+        user_cart = CartModel.objects.create(user=user)
+        CartItem.objects.create(cart=user_cart, product=self.product, size='M', quantity=1)
+
+        self.client.post(reverse('cart:cart_add'), {
+            'product_id': self.product.id, 'size': 'M', 'quantity': 2,
+            'customization_0_type': 'badge', 'customization_0_badge_type': 'liga',
+        })
+        self.client.post(reverse('cart:cart_add'), {'product_id': self.product.id, 'size': 'L', 'quantity': 1})
+        self.client.login(username='fan', password='testpass123')
+
+        self.assertEqual(list(CartModel.objects.values_list('id', flat=True)), [user_cart.id])
+        merged = {item.size: item for item in CartItem.objects.all()}
+        self.assertEqual({size: item.quantity for size, item in merged.items()}, {'M': 3, 'L': 1})
+        self.assertEqual(merged['M'].customizations.count(), 1)
+        self.assertEqual(len(self.client.session[settings.CART_SESSION_ID]), 2)
+
+
+class LazyCartTest(TestCase):
+    """Tests du panier paresseux des templates"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Extérieur")
+        team = Team.objects.create(name="Africa Sports", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Africa", category=category, team=team, description="Maillot",
+            price=Decimal('8000'), available_sizes=['M'], stock_quantity=5
+        )
+
+    def test_page_without_cart_does_not_touch_session(self):
+        """Un visiteur sans panier ne crée pas de session en naviguant"""
+        response = self.client.get(reverse('products:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_badge_reads_session_summary(self):
+        """Le badge de l'en-tête se lit dans le résumé en session, sans requête panier"""
+        self.client.post(reverse('cart:cart_add'), {'product_id': self.product.id, 'size': 'M', 'quantity': 2})
+        summary = self.client.session[CART_SUMMARY_SESSION_KEY]
+        self.assertEqual((summary['count'], summary['total']), (2, '16000.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('products:product_list'))
+        self.assertContains(response, '<span class="cart-badge">2</span>', html=True)
+        self.assertFalse([q for q in queries if 'cart_' in q['sql']])
+
+
+class CartPricingTest(TestCase):
+    """Tests de l'instantané tarifé du panier"""
+
+    def setUp(self):
+        customizations.invalidate()
+        self.category = Category.objects.create(name="Third")
+        self.team = Team.objects.create(name="Stade d'Abidjan", country="Côte d'Ivoire")
+        self.badge = JerseyCustomization.get_or_create_badge_customization('liga')
+        self.name_option = JerseyCustomization.get_or_create_name_customization()
+
+    def _add_lines(self, cart, count):
+        for index in range(count):
+            product = Product.objects.create(
+                name=f"Maillot {index}", category=self.category, team=self.team, description="Maillot",
+                price=Decimal('10000'), sale_price=Decimal('9000'), available_sizes=['M'], stock_quantity=5
+            )
+            cart_item = cart.add(product, 'M', 2)
+            CartItemCustomization.objects.create(cart_item=cart_item, customization=self.badge)
+
+    def _request(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        return request
+
+    def test_snapshot_prices_lines_and_customizations(self):
+        """Prix courant, personnalisations et sous-total sont calculés une seule fois par requête"""
+        request = self._request()
+        self._add_lines(Cart(request), 2)
+
+        # Catalogue des personnalisations chargé une fois, puis résolu sans requête
+        customizations.get_option(self.badge.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(JerseyCustomization.get_or_create_badge_customization('liga'), self.badge)
+            self.assertEqual(JerseyCustomization.get_or_create_name_customization(), self.name_option)
+
+        cart = Cart(request)
+        with self.assertNumQueries(3):
+            priced = cart.priced()
+            self.assertEqual(cart.get_total_price(), 2 * (Decimal('18000') + Decimal('500')))
+            self.assertEqual([item['total_price_with_customizations'] for item in cart], [Decimal('18500')] * 2)
+        self.assertIs(Cart(request).priced(), priced)
+
+        cart.remove(priced.lines[0].product, 'M')
+        self.assertEqual(cart.get_total_price(), Decimal('18500'))
+
+    def test_posted_customization_price_is_ignored(self):
+        """Le prix de personnalisation envoyé par le navigateur n'est jamais lu"""
+        product = Product.objects.create(
+            name="Maillot nominatif", category=self.category, team=self.team, description="Maillot",
+            price=Decimal('10000'), available_sizes=['M'], stock_quantity=5
+        )
+        self.client.post(reverse('cart:cart_add'), {
+            'product_id': product.id, 'size': 'M', 'quantity': 1,
+            'customization_0_type': 'name', 'customization_0_name': 'MESSI',
+            'customization_0_number': '10', 'customization_0_price': '1',
+            'customization_1_type': 'badge', 'customization_1_badge_type': 'liga',
+            'customization_1_price': '0',
+        })
+        prices = dict(CartItemCustomization.objects.values_list('customization_id', 'price'))
+        # "MESSI 10" : 8 caractères à 500 FCFA, badge à prix fixe
+        self.assertEqual(prices, {self.name_option.id: Decimal('4000'), self.badge.id: Decimal('500')})
+
+    def test_option_price_change_reprices_cart(self):
+        """Modifier le prix d'une option change la version des règles : le panier est retarifé"""
+        request = self._request()
+        self._add_lines(Cart(request), 1)
+        self.assertEqual(Cart(request).get_total_price(), Decimal('18500'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.badge.price = Decimal('800')
+            self.badge.save()
+        # Pas de script de correction : prix enregistré et instantané suivent la règle
+        priced = price_cart(CartItem.objects.all())
+        self.assertEqual(priced.subtotal, Decimal('18800'))
+        self.assertEqual(priced.lines[0].customizations[0].price, Decimal('800'))
+
+    def test_option_change_in_another_process_is_seen(self):
+        """Le catalogue mémorisé suit la version partagée, pas une durée de vie"""
+        self.assertEqual(customization_price(self.badge), Decimal('500'))
+        # Autre worker : option modifiée puis version publiée par son receiver
+        JerseyCustomization.objects.filter(pk=self.badge.pk).update(price=Decimal('900'))
+        self.assertEqual(customization_price(self.badge), Decimal('500'))
+        bump_shared_version(customizations.VERSION_KEY)
+        self.assertEqual(customization_price(self.badge), Decimal('900'))
+
+    def test_cart_detail_queries_do_not_grow_with_lines(self):
+        """Les requêtes panier/produits de la page panier ne dépendent pas du nombre de lignes"""
+        counts = []
+        for lines in (1, 4):
+            client = self.client_class()
+            for index in range(lines):
+                product = Product.objects.create(
+                    name=f"Maillot {lines}-{index}", category=self.category, team=self.team,
+                    description="Maillot", price=Decimal('10000'), available_sizes=['M'], stock_quantity=5
+                )
+                client.post(reverse('cart:cart_add'), {
+                    'product_id': product.id, 'size': 'M', 'quantity': 1,
+                    'customization_0_type': 'badge', 'customization_0_badge_type': 'liga',
+                })
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse('cart:cart_detail'))
+            self.assertEqual(len(response.context['cart_items']), lines)
+            counts.append(len([q for q in queries if 'cart' in q['sql'] or '"products_' in q['sql']]))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CartBatchTest(TestCase):
+    """Tests de l'endpoint de modifications par lot"""
+
+    def setUp(self):
+        customizations.invalidate()
+        category = Category.objects.create(name="Rétro")
+        team = Team.objects.create(name="Séwé Sport", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Séwé", category=category, team=team, description="Maillot",
+            price=Decimal('10000'), available_sizes=['M', 'L'], stock_quantity=5
+        )
+        self.url = reverse('cart:cart_batch')
+
+    def _post(self, operations, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(
+            self.url, json.dumps({'operations': operations}), content_type='application/json', **headers
+        )
+
+    def test_operations_applied_in_one_batch(self):
+        """Ajouts, mises à jour, retraits et personnalisations s'appliquent ensemble"""
+        response = self._post([
+            {'op': 'add', 'product_id': self.product.id, 'size': 'M'},
+            {'op': 'add', 'product_id': self.product.id, 'size': 'M', 'quantity': 2},
+            {'op': 'add', 'product_id': self.product.id, 'size': 'L'},
+            {'op': 'remove', 'product_id': self.product.id, 'size': 'L'},
+            {'op': 'customize', 'product_id': self.product.id, 'size': 'M', 'type': 'badge', 'badge_type': 'liga'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        cart = response.json()['cart']
+        self.assertEqual(cart['count'], 3)
+        self.assertEqual([line['size'] for line in cart['lines']], ['M'])
+        self.assertEqual(cart['subtotal'], 30500.0)
+        self.assertEqual(dict(CartItem.objects.values_list('size', 'quantity')), {'M': 3})
+        self.assertEqual(len(self.client.session[settings.CART_SESSION_ID]), 1)
+
+    def test_rejected_batch_changes_nothing(self):
+        """Un stock insuffisant rejette tout le lot"""
+        self._post([{'op': 'add', 'product_id': self.product.id, 'size': 'M'}])
+        response = self._post([
+            {'op': 'update', 'product_id': self.product.id, 'size': 'M', 'quantity': 2},
+            {'op': 'add', 'product_id': self.product.id, 'size': 'L', 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(dict(CartItem.objects.values_list('size', 'quantity')), {'M': 1})
+
+        response = self._post([{'op': 'customize', 'product_id': self.product.id, 'size': 'L', 'type': 'badge'}])
+        self.assertEqual((response.status_code, response.json()['operation']), (400, 0))
+
+    def test_reserved_stock_is_not_available(self):
+        """Le stock réservé par les autres paniers en caisse n'est pas proposé"""
+        ProductVariant.objects.filter(product=self.product, size='M').update(reserved=4)
+        response = self._post([{'op': 'add', 'product_id': self.product.id, 'size': 'M', 'quantity': 2}])
+        self.assertEqual(response.status_code, 409)
+        response = self._post([{'op': 'add', 'product_id': self.product.id, 'size': 'M'}])
+        self.assertEqual(response.status_code, 200)
+
+    def test_idempotency_key_replays_response(self):
+        """Un lot rejoué avec la même clé n'est pas réappliqué"""
+        operations = [{'op': 'add', 'product_id': self.product.id, 'size': 'M'}]
+        first = self._post(operations, key='tap-1')
+        replay = self._post(operations, key='tap-1')
+        self.assertFalse(first.json()['replayed'])
+        self.assertTrue(replay.json()['replayed'])
+        self.assertEqual(replay.json()['cart'], first.json()['cart'])
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+        self._post(operations, key='tap-2')
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+        conflict = self._post([{'op': 'remove', 'product_id': self.product.id, 'size': 'M'}], key='tap-2')
+        self.assertEqual(conflict.status_code, 422)
+
+
+class PurgeCartsTest(TestCase):
+    """Tests de la commande purge_carts"""
+
+    def setUp(self):
+        customizations.invalidate()
+        category = Category.objects.create(name="Entraînement")
+        team = Team.objects.create(name="Stella Club", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Stella", category=category, team=team, description="Maillot",
+            price=Decimal('7000'), available_sizes=['M'], stock_quantity=5
+        )
+
+    def _anonymous_cart(self, session_key, expire_date, age):
+        Session.objects.create(session_key=session_key, session_data='', expire_date=expire_date)
+        cart = CartModel.objects.create(session_key=session_key)
+        item = CartItem.objects.create(cart=cart, product=self.product, size='M', quantity=1)
+        CartItemCustomization.objects.create(
+            cart_item=item, customization=JerseyCustomization.get_or_create_badge_customization('liga')
+        )
+        CartModel.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - age)
+        return cart
+
+    def test_purges_only_abandoned_anonymous_carts(self):
+        """Seuls les paniers anonymes sans session valide sont supprimés, par lots"""
+        now = timezone.now()
+        old = timedelta(seconds=settings.SESSION_COOKIE_AGE + 60)
+        abandoned = [self._anonymous_cart(f'expired{index}', now - timedelta(days=1), old) for index in range(3)]
+        alive = self._anonymous_cart('alive', now + timedelta(days=1), old)
+        recent = self._anonymous_cart('recent', now - timedelta(days=1), timedelta(minutes=5))
+        user_cart = CartModel.objects.create(user=User.objects.create_user(username='fan', password='x'))
+        CartModel.objects.filter(pk=user_cart.pk).update(updated_at=now - old)
+
+        out = StringIO()
+        call_command('purge_carts', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(
+            set(CartModel.objects.values_list('id', flat=True)), {alive.id, recent.id, user_cart.id}
+        )
+        self.assertFalse(CartItem.objects.filter(cart__in=abandoned).exists())
+        self.assertEqual(CartItemCustomization.objects.count(), 2)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['alive'])
+        self.assertIn("Paniers supprimés : 3", out.getvalue())
+        self.assertIn("lignes/s", out.getvalue())
+
+
+class CartSessionStoreTest(TestCase):
+    """Tests du moteur de session (écriture seulement si le contenu change)"""
+
+    def test_unchanged_session_is_not_written(self):
+        session = CartSessionStore()
+        session[settings.CART_SESSION_ID] = {'1_M': {'quantity': 1, 'price': '9000', 'size': 'M'}}
+        session.save()
+
+        session = CartSessionStore(session.session_key)
+        session[settings.CART_SESSION_ID] = dict(session[settings.CART_SESSION_ID])
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(len(queries), 0)
+
+        session[settings.CART_SESSION_ID] = {}
+        session.save()
+        self.assertEqual(
+            CartSessionStore(session.session_key).get(settings.CART_SESSION_ID), {}
+        )
+        stored = Session.objects.get(session_key=session.session_key).get_decoded()
+        self.assertEqual(stored[settings.CART_SESSION_ID], {})
+
+    def test_production_settings_open_a_session(self):
+        """La configuration de production fournit le cache des sessions"""
+        from ecom_maillot import settings_production
+
+        with override_settings(
+            CACHES=settings_production.CACHES,
+            SESSION_ENGINE=settings_production.SESSION_ENGINE,
+            SESSION_CACHE_ALIAS=settings_production.SESSION_CACHE_ALIAS,
+        ):
+            engine = import_module(settings.SESSION_ENGINE)
+            session = engine.SessionStore()
+            session[settings.CART_SESSION_ID] = {}
+            session.save()
+            self.assertEqual(engine.SessionStore(session.session_key).get(settings.CART_SESSION_ID), {})
@@ -10,4 +10,5 @@ urlpatterns = [
     path('remove/', views.cart_remove, name='cart_remove'),
     path('clear/', views.cart_clear, name='cart_clear'),
     path('update-ajax/', views.cart_update_ajax, name='cart_update_ajax'),
+    path('batch/', views.cart_batch, name='cart_batch'),
 ]
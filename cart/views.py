@@ -1,8 +1,10 @@
+import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from products.models import Product
+from .batch import BatchError, apply_batch
 from .cart import Cart
 
 
@@ -10,44 +12,10 @@ def cart_detail(request):
     """Afficher le détail du panier avec personnalisations"""
     cart = Cart(request)
     
-    # Récupérer les cart_items avec leurs personnalisations
-    cart_items = []
-    for item in cart:
-        # Récupérer le cart_item de la base de données pour les personnalisations
-        from .models import CartItem
-        from django.contrib.auth.models import AnonymousUser
-        
-        if not isinstance(request.user, AnonymousUser):
-            cart_item = CartItem.objects.filter(
-                cart__user=request.user,
-                product=item['product'],
-                size=item['size']
-            ).first()
-        else:
-            cart_item = CartItem.objects.filter(
-                cart__session_key=request.session.session_key,
-                product=item['product'],
-                size=item['size']
-            ).first()
-        
-        if cart_item:
-            item['customizations'] = cart_item.customizations.all()
-        else:
-            item['customizations'] = []
-        
-        # Calculer le prix total avec personnalisations
-        base_price = item['price'] * item['quantity']
-        customization_price = sum(cust.price for cust in item['customizations'])
-        item['total_price_with_customizations'] = base_price + customization_price
-        
-        cart_items.append(item)
-    
-    # Calculer le total avec personnalisations
-    total_with_customizations = 0
-    for item in cart_items:
-        base_price = item['price'] * item['quantity']
-        customization_price = sum(cust.price for cust in item.get('customizations', []))
-        total_with_customizations += base_price + customization_price
+    # Lignes, produits et personnalisations tarifés en une passe
+    priced = cart.priced()
+    cart_items = [line.as_item() for line in priced]
+    total_with_customizations = priced.subtotal
     
     context = {
         'cart_items': cart_items,
@@ -86,28 +54,26 @@ def cart_add(request):
         while f'customization_{index}_type' in request.POST:
             custom_type = request.POST.get(f'customization_{index}_type')
             
+            # Le prix éventuellement envoyé (customization_{i}_price) est ignoré :
+            # il est calculé par les règles de prix à l'enregistrement
             if custom_type == 'name':
                 custom_name = request.POST.get(f'customization_{index}_name', '')
                 custom_number = request.POST.get(f'customization_{index}_number', '')
-                custom_price = float(request.POST.get(f'customization_{index}_price', 0))
                 
                 if custom_name or custom_number:
                     customizations.append({
                         'type': 'name',
                         'name': custom_name,
                         'number': custom_number,
-                        'price': custom_price
                     })
             
             elif custom_type == 'badge':
                 badge_type = request.POST.get(f'customization_{index}_badge_type', '')
-                custom_price = float(request.POST.get(f'customization_{index}_price', 500))
                 
                 if badge_type:
                     customizations.append({
                         'type': 'badge',
                         'badge_type': badge_type,
-                        'price': custom_price
                     })
             
             index += 1
@@ -127,7 +93,6 @@ def cart_add(request):
                         cart_item=cart_item,
                         customization=customization,
                         custom_text=custom_text,
-                        price=custom['price']
                     )
                 
                 elif custom['type'] == 'badge':
@@ -138,7 +103,6 @@ def cart_add(request):
                     CartItemCustomization.objects.create(
                         cart_item=cart_item,
                         customization=customization,
-                        price=custom['price']
                     )
         
         # Message de succès
@@ -248,3 +212,33 @@ def cart_update_ajax(request):
             'success': False,
             'message': 'Données invalides.'
         })
+
+
+
+@require_POST
+def cart_batch(request):
+    """Appliquer un lot d'opérations au panier (JSON) et renvoyer le panier tarifé"""
+    try:
+        payload = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'message': 'JSON invalide.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'success': False, 'message': 'JSON invalide.'}, status=400)
+    
+    # La clé d'idempotence peut venir de l'en-tête (usage standard) ou du corps
+    idempotency_key = request.headers.get('Idempotency-Key') or payload.get('idempotency_key')
+    
+    try:
+        cart_data, replayed = apply_batch(Cart(request), payload.get('operations'), idempotency_key)
+    except BatchError as exc:
+        return JsonResponse({
+            'success': False,
+            'message': str(exc),
+            'operation': exc.index,
+        }, status=exc.status)
+    
+    return JsonResponse({
+        'success': True,
+        'replayed': replayed,
+        'cart': cart_data,
+    })
@@ -9,7 +9,8 @@ from django.core.paginator import Paginator
 from django.db import transaction
 from django.template.loader import render_to_string
 from products.models import Product, Category, Team, JerseyCustomization
-from orders.models import Order, OrderItem, OrderItemCustomization
+from products.cache import bump_catalog_version_on_commit
+from orders.models import Order, OrderItemCustomization
 from payments.models import Payment, PaymentLog
 from django.contrib.auth.models import User
 from cart.models import Cart, CartItem
@@ -43,9 +44,7 @@ def dashboard_home(request):
     recent_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
     
     # Produits les plus vendus
-    top_products = OrderItem.objects.values('product_name').annotate(
-        total_sold=Sum('quantity')
-    ).order_by('-total_sold')[:5]
+    top_products = Product.objects.filter(units_sold__gt=0).order_by('-units_sold', '-id')[:5]
     
     # Statistiques des 7 derniers jours
     orders_7_days = Order.objects.filter(created_at__date__gte=last_7_days).count()
@@ -65,7 +64,7 @@ def dashboard_home(request):
     ).count()
     
     # Produits en promotion
-    products_on_sale = Product.objects.filter(sale_price__isnull=False, sale_price__lt=F('price')).count()
+    products_on_sale = Product.objects.filter(effective_price__lt=F('price')).count()
     
     # Statistiques des utilisateurs
     new_users_7_days = User.objects.filter(
@@ -146,22 +145,23 @@ def dashboard_orders(request):
     # Actions en lot
     if request.method == 'POST':
         from orders.sync_utils import cancel_order_and_payment
+        from orders.transitions import transition_orders
         
         action = request.POST.get('action')
         order_ids = request.POST.getlist('order_ids')
         
         if action and order_ids:
             if action == 'mark_pending':
-                Order.objects.filter(id__in=order_ids).update(status='pending')
+                transition_orders(Order.objects.filter(id__in=order_ids), 'pending')
                 messages.success(request, f'{len(order_ids)} commande(s) marquée(s) comme en attente.')
             elif action == 'mark_processing':
-                Order.objects.filter(id__in=order_ids).update(status='processing')
+                transition_orders(Order.objects.filter(id__in=order_ids), 'processing')
                 messages.success(request, f'{len(order_ids)} commande(s) marquée(s) comme en cours.')
             elif action == 'mark_shipped':
-                Order.objects.filter(id__in=order_ids).update(status='shipped')
+                transition_orders(Order.objects.filter(id__in=order_ids), 'shipped')
                 messages.success(request, f'{len(order_ids)} commande(s) marquée(s) comme expédiée(s).')
             elif action == 'mark_delivered':
-                Order.objects.filter(id__in=order_ids).update(status='delivered')
+                transition_orders(Order.objects.filter(id__in=order_ids), 'delivered')
                 messages.success(request, f'{len(order_ids)} commande(s) marquée(s) comme livrée(s).')
             elif action == 'mark_cancelled':
                 # Utiliser la synchronisation pour les annulations
@@ -339,6 +339,9 @@ def dashboard_products(request):
                 Product.objects.filter(id__in=product_ids).delete()
                 messages.success(request, f'{len(product_ids)} produit(s) supprimé(s).')
             
+            # Les mises à jour en lot ne déclenchent pas les signaux post_save
+            bump_catalog_version_on_commit()
+            
             return redirect('dashboard:products')
     
     # Pagination
@@ -439,10 +442,17 @@ def dashboard_product_edit(request, product_id):
     categories = Category.objects.all()
     teams = Team.objects.all()
     
+    # Historique du stock sur 30 jours, lu dans le journal de stock (sans les commandes)
+    from products.ledger import stock_history
+    
     context = {
         'product': product,
         'categories': categories,
         'teams': teams,
+        'stock_history': [
+            {'day': day.strftime('%d/%m'), 'stock': stock} for day, stock in stock_history(product)
+        ],
+        'stock_movements': product.stock_movements.select_related('order').order_by('-id')[:10],
     }
     
     return render(request, 'dashboard/product_edit.html', context)
@@ -692,15 +702,12 @@ def dashboard_analytics(request):
         })
     
     # Top 10 des produits les plus vendus
-    top_products = OrderItem.objects.values('product_name').annotate(
-        total_sold=Sum('quantity'),
-        total_revenue=Sum(F('price') * F('quantity'))
-    ).order_by('-total_sold')[:10]
+    top_products = Product.objects.filter(units_sold__gt=0).order_by('-units_sold', '-id')[:10]
     
     # Statistiques des équipes
     team_stats = Team.objects.annotate(
         product_count=Count('products'),
-        total_sales=Sum('products__orderitem__quantity', default=0)
+        total_sales=Sum('products__units_sold', default=0)
     ).order_by('-total_sales')
     
     context = {
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from decouple import config
 
@@ -108,6 +109,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Sessions : cache fichier local, partagé par tous les workers de la machine
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('SESSION_CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'ecom_maillot_sessions')),
+        'OPTIONS': {'MAX_ENTRIES': config('SESSION_CACHE_MAX_ENTRIES', default=50000, cast=int)},
+    },
+}
+
+
+# Sessions
+# Lecture dans le cache, écriture en base uniquement si le contenu change (voir cart/sessions.py)
+
+SESSION_ENGINE = 'cart.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
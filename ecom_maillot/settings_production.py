@@ -44,6 +44,21 @@ DATABASES = {
     }
 }
 
+# Cache partagé entre les workers gunicorn (fichiers locaux, sans service externe)
+# Indispensable pour que la version du catalogue soit commune à tous les workers.
+# Les autres caches de la configuration de base (dont 'sessions') sont conservés.
+CACHES = {
+    **CACHES,
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+
 # Configuration des emails (à adapter selon votre fournisseur)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', '')
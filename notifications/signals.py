@@ -7,24 +7,12 @@ from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
 from .email_service import get_email_service
-from orders.models import Order
 from payments.models import Payment
 from products.models import Product
 from cart.models import CartItem
 from django.contrib.auth.models import User
 
 
-@receiver(post_save, sender=Order)
-def send_order_confirmation_email(sender, instance, created, **kwargs):
-    """Envoie un email de confirmation lors de la création d'une commande"""
-    if created:
-        # Attendre un peu pour s'assurer que tous les OrderItems sont créés
-        from django.db import transaction
-        transaction.on_commit(
-            lambda: get_email_service().send_order_confirmation(instance)
-        )
-
-
 @receiver(post_save, sender=Payment)
 def send_payment_confirmation_email(sender, instance, created, **kwargs):
     """Envoie un email de confirmation lors de la validation d'un paiement"""
@@ -43,45 +31,19 @@ def send_payment_confirmation_email(sender, instance, created, **kwargs):
                 get_email_service().send_payment_confirmation(instance)
 
 
-@receiver(pre_save, sender=Order)
-def send_shipping_notification_email(sender, instance, **kwargs):
-    """Envoie un email de notification lors de l'expédition"""
-    if instance.pk:  # Commande existante
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            # Vérifier si le statut a changé vers 'shipped'
-            if (old_instance.status != 'shipped' and 
-                instance.status == 'shipped'):
-                get_email_service().send_shipping_notification(instance)
-        except Order.DoesNotExist:
-            pass
-
-
-@receiver(pre_save, sender=Order)
-def send_delivery_notification_email(sender, instance, **kwargs):
-    """Envoie un email de notification lors de la livraison"""
-    if instance.pk:  # Commande existante
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            # Vérifier si le statut a changé vers 'delivered'
-            if (old_instance.status != 'delivered' and 
-                instance.status == 'delivered'):
-                get_email_service().send_delivery_notification(instance)
-        except Order.DoesNotExist:
-            pass
+# Confirmation, expédition et livraison : voir orders.transitions (transitions de statut)
 
 
 @receiver(pre_save, sender=Product)
 def send_stock_alert_email(sender, instance, **kwargs):
-    """Envoie une alerte de stock faible"""
-    if instance.pk:  # Produit existant
-        try:
-            old_instance = Product.objects.get(pk=instance.pk)
-            # Vérifier si le stock a baissé en dessous du seuil
-            if (old_instance.stock_quantity > 5 and instance.stock_quantity <= 5):
-                get_email_service().send_stock_alert(instance, instance.stock_quantity)
-        except Product.DoesNotExist:
-            pass
+    """Envoie une alerte de stock faible (modification manuelle du stock)"""
+    from products.stock import crosses_low_stock
+
+    # Stock lu au chargement du produit ; les mouvements liés aux commandes
+    # (products.stock) calculent leurs alertes sans passer par ce signal
+    previous = getattr(instance, '_loaded_stock', None)
+    if instance.pk and previous is not None and crosses_low_stock(previous, instance.stock_quantity):
+        get_email_service().send_stock_alert(instance, instance.stock_quantity)
 
 
 # Fonction pour gérer les rappels de panier abandonné
@@ -0,0 +1,55 @@
+"""
+Matérialisation d'une commande à partir du panier
+
+Le panier est tarifé une seule fois (instantané de ``cart.pricing``) : la
+commande est écrite en un INSERT avec ses totaux et son statut de paiement
+définitifs, puis ses articles et leurs personnalisations en un
+``bulk_create`` chacun. Le nombre de requêtes ne dépend ni du nombre de
+lignes ni du nombre de personnalisations par ligne, et les signaux de
+``Order`` ne sont émis qu'une fois (création).
+"""
+
+from core.models import ShippingSettings
+
+from .models import OrderItem, OrderItemCustomization
+
+
+def materialize_order(order, priced):
+    """
+    Enregistre ``order`` (non encore sauvegardée) et ses articles à partir de
+    l'instantané tarifé ``priced``.
+    """
+    subtotal = priced.subtotal
+    shipping_cost = ShippingSettings.get_active_settings().calculate_shipping_cost(subtotal)
+    order.subtotal = subtotal
+    order.shipping_cost = shipping_cost
+    order.total = subtotal + shipping_cost
+    if order.payment_method == 'cash_on_delivery':
+        # Paiement à la livraison : en attente de paiement dès la création
+        order.payment_status = 'cash_on_delivery'
+    order.save(force_insert=True)
+
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=line.product,
+            product_name=line.product.name,
+            size=line.size,
+            quantity=line.quantity,
+            price=line.unit_price,  # Prix actuel (promotion si applicable)
+            total_price=line.total_price,  # Personnalisations comprises
+        )
+        for line in priced
+    ])
+    OrderItemCustomization.objects.bulk_create([
+        OrderItemCustomization(
+            order_item=item,
+            customization_id=custom.customization_id,
+            custom_text=custom.custom_text,
+            quantity=custom.quantity,
+            price=custom.price,  # Prix des règles, figé à la commande
+        )
+        for item, line in zip(items, priced)
+        for custom in line.customizations
+    ])
+    return order
@@ -88,13 +88,38 @@ class Order(models.Model):
     def __str__(self):
         return f"Commande {self.order_number} - {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut lu en base : la transition est calculée à l'enregistrement sans relire la commande
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_payment_status = instance.__dict__.get('payment_status')
+        return instance
+
+    def previous_state(self):
+        """Statut et statut de paiement enregistrés en base (None pour une commande non encore créée)"""
+        if self._state.adding:
+            return None, None
+        loaded = (getattr(self, '_loaded_status', None), getattr(self, '_loaded_payment_status', None))
+        if None in loaded:
+            loaded = Order.objects.filter(pk=self.pk).values_list('status', 'payment_status').first() or (None, None)
+        return loaded
+
     def save(self, *args, **kwargs):
+        from .transitions import dispatch
+
         if not self.order_number:
             # Générer un numéro de commande unique
             import datetime
             now = datetime.datetime.now()
             self.order_number = f"CMD{now.strftime('%Y%m%d%H%M%S')}{self.user.id}"
+        created = self._state.adding
+        previous, previous_payment = self.previous_state()
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
+        self._loaded_payment_status = self.payment_status
+        # Effets de bord (stock, e-mails, ventes) du changement de statut, depuis un seul point
+        dispatch(self, previous, created=created, previous_payment=previous_payment)
 
     @property
     def is_paid(self):
@@ -179,11 +204,9 @@ class OrderItemCustomization(models.Model):
             return f"{self.customization.name} sur {self.order_item.product_name}"
     
     def save(self, *args, **kwargs):
-        # Calculer le prix total
-        if self.customization.customization_type == 'name' and self.custom_text:
-            # Pour les noms/numéros, le prix dépend du nombre de caractères
-            self.price = self.customization.price * len(self.custom_text) * self.quantity
-        else:
-            # Pour les badges, prix fixe
-            self.price = self.customization.price * self.quantity
+        # Prix figé à la commande (instantané tarifé du panier) ; à défaut, règles de prix
+        if self.price is None:
+            from products.pricing_rules import customization_price
+
+            self.price = customization_price(self.customization, self.custom_text, self.quantity)
         super().save(*args, **kwargs)
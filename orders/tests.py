@@ -1,3 +1,155 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from cart.models import CartItem
+from products import customizations
+from products.models import CartItemCustomization, Category, JerseyCustomization, Product, ProductVariant, Team
+from products.stock import withdraw_stock
+from .models import Address, Order, OrderItem, OrderItemCustomization
+from .transitions import transition_orders
 
-# Create your tests here.
+
+class OrderCreateTest(TestCase):
+    """Tests de la création de commande (matérialisation en lot)"""
+
+    def setUp(self):
+        customizations.invalidate()
+        self.category = Category.objects.create(name="Domicile")
+        self.team = Team.objects.create(name="ASEC Mimosas", country="Côte d'Ivoire")
+        self.name_option = JerseyCustomization.get_or_create_name_customization()
+        self.badges = [JerseyCustomization.get_or_create_badge_customization(badge) for badge in ('liga', 'uefa')]
+
+    def _checkout(self, username, lines, badges, payment_method='paydunya'):
+        """Remplit un panier de ``lines`` lignes personnalisées et passe commande"""
+        user = User.objects.create_user(username, password='secret')
+        address = Address.objects.create(
+            user=user, first_name="Awa", last_name="Koné", phone="0700000000", email="awa@example.com",
+            address="Rue 12", city="Abidjan", postal_code="00225"
+        )
+        self.client.force_login(user)
+        for index in range(lines):
+            product = Product.objects.create(
+                name=f"Maillot {username} {index}", category=self.category, team=self.team,
+                description="Maillot", price=Decimal('10000'), available_sizes=['M'], stock_quantity=5
+            )
+            data = {
+                'product_id': product.id, 'size': 'M', 'quantity': 1,
+                'customization_0_type': 'name', 'customization_0_name': 'DROGBA', 'customization_0_number': '11',
+            }
+            for badge_index, badge in enumerate(self.badges[:badges], start=1):
+                data[f'customization_{badge_index}_type'] = 'badge'
+                data[f'customization_{badge_index}_badge_type'] = badge.badge_type
+            self.client.post(reverse('cart:cart_add'), data)
+        self.client.get(reverse('orders:order_create'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('orders:order_create'), {
+                'shipping_address': address.id, 'notes': '', 'payment_method': payment_method,
+            })
+        return response, Order.objects.get(user=user), len(queries)
+
+    def test_order_written_with_final_totals(self):
+        """Totaux, articles et personnalisations recopiés depuis l'instantané tarifé"""
+        response, order, _queries = self._checkout('awa', lines=2, badges=2, payment_method='cash_on_delivery')
+        self.assertRedirects(response, reverse('orders:order_detail', args=[order.id]), fetch_redirect_response=False)
+
+        # "DROGBA 11" : 9 caractères à 500 FCFA, deux badges à 500 FCFA
+        line_total = Decimal('10000') + Decimal('4500') + 2 * Decimal('500')
+        self.assertEqual(order.subtotal, 2 * line_total)
+        self.assertEqual(order.total, order.subtotal + order.shipping_cost)
+        self.assertEqual(order.payment_status, 'cash_on_delivery')
+        self.assertEqual([item.total_price for item in order.items.all()], [line_total] * 2)
+        self.assertEqual(OrderItemCustomization.objects.filter(order_item__order=order).count(), 6)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(CartItemCustomization.objects.exists())
+
+    def test_queries_do_not_depend_on_customizations(self):
+        """Le nombre de requêtes ne dépend pas du nombre de personnalisations par ligne"""
+        _response, _order, few = self._checkout('awa', lines=2, badges=0)
+        self.client.logout()
+        _response, _order, many = self._checkout('koffi', lines=2, badges=2)
+        self.assertEqual(few, many)
+
+
+class OrderTransitionTest(TestCase):
+    """Tests du répartiteur de transitions de statut"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('moussa', password='secret')
+        category = Category.objects.create(name="Extérieur")
+        team = Team.objects.create(name="Africa Sports", country="Côte d'Ivoire")
+        self.products = [
+            Product.objects.create(
+                name=f"Maillot {index}", category=category, team=team, description="Maillot",
+                price=Decimal('10000'), available_sizes=['M', 'L'], stock_quantity=10
+            )
+            for index in range(3)
+        ]
+
+    def _order(self, withdrawn=True):
+        """Commande de 2 articles par produit ; ``withdrawn`` : stock retiré au passage en caisse"""
+        order = Order.objects.create(
+            user=self.user, order_number=f"CMD{Order.objects.count()}", subtotal=Decimal('30000'),
+            total=Decimal('30000')
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.name, size='M', quantity=2,
+                      price=Decimal('10000'), total_price=Decimal('20000'))
+            for product in self.products
+        ])
+        if withdrawn:
+            withdraw_stock([(product.id, 'M', 2) for product in self.products], order=order)
+        return Order.objects.get(pk=order.pk)
+
+    def _stocks(self):
+        return (
+            list(Product.objects.order_by('id').values_list('stock_quantity', flat=True)),
+            list(ProductVariant.objects.filter(size='M').order_by('product_id').values_list('stock', flat=True)),
+        )
+
+    def test_status_change_does_not_refetch_order(self):
+        """Le statut précédent vient du chargement : une requête pour enregistrer"""
+        order = self._order()
+        order.status = 'processing'
+        with self.assertNumQueries(1):
+            order.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            order.status = 'shipped'
+            order.save()
+        # E-mail d'expédition envoyé après validation, une seule fois
+        self.assertEqual(len(callbacks), 1)
+
+    def test_cancellation_restores_stock_in_fixed_queries(self):
+        """Annuler rend le stock (produits et tailles) en requêtes groupées, réactiver le reprend"""
+        order = self._order()
+        self.assertEqual(self._stocks(), ([8, 8, 8], [8, 8, 8]))
+        order.status = 'cancelled'
+        with self.assertNumQueries(9):
+            order.save()
+        self.assertEqual(self._stocks(), ([10, 10, 10], [10, 10, 10]))
+
+        order.status = 'processing'
+        order.save()
+        self.assertEqual(self._stocks(), ([8, 8, 8], [8, 8, 8]))
+
+    def test_order_without_ledger_keeps_stock(self):
+        """Commande antérieure au journal : l'annuler ou la réactiver ne touche pas au stock"""
+        order = self._order(withdrawn=False)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self._stocks(), ([10, 10, 10], [10, 10, 10]))
+        order.status = 'processing'
+        order.save()
+        self.assertEqual(self._stocks(), ([10, 10, 10], [10, 10, 10]))
+
+    def test_bulk_transition(self):
+        """Actions en lot : une mise à jour, e-mails pour chaque commande expédiée"""
+        orders = [self._order() for _index in range(3)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(5):
+                changed = transition_orders(Order.objects.filter(pk__in=[order.pk for order in orders]), 'shipped')
+        self.assertEqual(changed, 3)
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'shipped'})
@@ -0,0 +1,209 @@
+"""
+Transitions de statut des commandes
+
+``Order.save`` calcule la transition (statut précédent -> nouveau statut) à
+partir du statut lu en base au chargement de la commande, sans la relire, et
+la passe à ``dispatch`` : c'est le seul point de départ des effets de bord
+(stock, e-mails, ventes). Les articles de la commande ne sont chargés
+qu'une fois, et seulement si un effet de bord en a besoin ; une transition
+coûte ainsi un nombre de requêtes fixe, quel que soit le nombre d'articles.
+
+Les stocks sont retirés à la création de la commande (``commit_cart``) : une
+annulation les rend, une commande réactivée les reprend. Le journal de stock
+de la commande dit ce qu'elle détient : une commande antérieure au journal
+(stock jamais retiré à sa création) n'en rend ni n'en reprend. Les changements de
+statut de paiement passent aussi par ``dispatch`` : une commande compte dans
+les ventes des produits (``products.sales``) dès qu'elle est payée ou livrée.
+
+``transition_orders`` applique un statut à plusieurs commandes (actions en
+lot du tableau de bord) en une mise à jour, avec les mêmes effets de bord.
+"""
+
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum, prefetch_related_objects
+from django.utils import timezone
+
+# Statuts pour lesquels le stock de la commande est rendu
+RESTOCKED_STATUSES = frozenset({'cancelled'})
+
+# Une commande compte dans les ventes une fois payée, ou livrée (paiement à la
+# livraison), tant qu'elle n'est ni annulée ni remboursée
+SOLD_STATUSES = frozenset({'delivered'})
+UNSOLD_STATUSES = frozenset({'cancelled', 'refunded'})
+
+HANDLERS = []
+
+
+def is_sold(status, payment_status):
+    """La commande compte dans les ventes des produits"""
+    if status is None or status in UNSOLD_STATUSES or payment_status == 'refunded':
+        return False
+    return status in SOLD_STATUSES or payment_status == 'paid'
+
+
+def sold_orders(prefix=''):
+    """Filtre des commandes vendues (même règle que ``is_sold``), ``prefix`` menant à la commande"""
+    return (
+        (Q(**{f'{prefix}status__in': SOLD_STATUSES}) | Q(**{f'{prefix}payment_status': 'paid'}))
+        & ~Q(**{f'{prefix}status__in': UNSOLD_STATUSES})
+        & ~Q(**{f'{prefix}payment_status': 'refunded'})
+    )
+
+
+@dataclass(frozen=True)
+class Transition:
+    """Changement de statut d'une commande (``previous`` vaut None à la création)"""
+    order: object
+    previous: object
+    status: str
+    previous_payment: object = None
+    payment_status: object = None
+
+    @property
+    def created(self):
+        return self.previous is None
+
+    def entered(self, statuses):
+        """La commande vient d'entrer dans l'un des statuts donnés"""
+        return self.status in statuses and (self.created or self.previous not in statuses)
+
+    def left(self, statuses):
+        """La commande vient de quitter l'un des statuts donnés"""
+        return not self.created and self.previous in statuses and self.status not in statuses
+
+    @property
+    def sold(self):
+        return is_sold(self.status, self.payment_status)
+
+    @property
+    def was_sold(self):
+        return not self.created and is_sold(self.previous, self.previous_payment)
+
+    def lines(self):
+        """Lignes ``(produit, taille, quantité)`` de la commande (articles chargés une fois)"""
+        return [(item.product_id, item.size, item.quantity) for item in order_items(self.order)]
+
+
+def handler(func):
+    """Enregistre un effet de bord des transitions"""
+    HANDLERS.append(func)
+    return func
+
+
+def order_items(order):
+    """Articles de la commande, chargés une seule fois pour tous les effets de bord"""
+    prefetch_related_objects([order], 'items')
+    return order.items.all()
+
+
+def dispatch(order, previous, created=False, previous_payment=None):
+    """
+    Exécute les effets de bord du passage de ``previous`` au statut courant
+    (``previous_payment`` : statut de paiement précédent, inchangé par défaut).
+    """
+    if previous_payment is None:
+        previous_payment = order.payment_status
+    if not created and previous == order.status and previous_payment == order.payment_status:
+        return None
+    transition = Transition(
+        order=order,
+        previous=None if created else previous,
+        status=order.status,
+        previous_payment=None if created else previous_payment,
+        payment_status=order.payment_status,
+    )
+    for func in HANDLERS:
+        func(transition)
+    return transition
+
+
+def transition_orders(orders, status):
+    """
+    Passe les commandes du queryset ``orders`` au statut ``status``.
+
+    Une mise à jour pour toutes les commandes, articles chargés en une
+    requête ; retourne le nombre de commandes dont le statut a changé.
+    """
+    from .models import OrderItem
+
+    with transaction.atomic():
+        changed = list(
+            orders.exclude(status=status).select_for_update(of=('self',)).select_related('user').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.order_by('id'))
+            )
+        )
+        if not changed:
+            return 0
+        type(changed[0]).objects.filter(pk__in=[order.pk for order in changed]).update(
+            status=status, updated_at=timezone.now()
+        )
+        for order in changed:
+            previous, order.status = order.status, status
+            order._loaded_status = status
+            dispatch(order, previous)
+    return len(changed)
+
+
+def held_stock(order):
+    """
+    Stock détenu par la commande d'après ses ventes et annulations au journal :
+    ``(mouvements, quantité nette sortie)`` (une requête).
+    """
+    from products.models import StockMovement
+
+    totals = order.stock_movements.filter(
+        kind__in=(StockMovement.SALE, StockMovement.CANCELLATION)
+    ).aggregate(movements=Count('id'), total=Sum('quantity'))
+    return totals['movements'], -(totals['total'] or 0)
+
+
+@handler
+def adjust_stock(transition):
+    """Rend le stock d'une commande annulée, le reprend si elle est réactivée"""
+    from products.stock import restore_stock, withdraw_stock
+
+    if transition.created:
+        return
+    if transition.entered(RESTOCKED_STATUSES):
+        _movements, held = held_stock(transition.order)
+        if held > 0:
+            restore_stock(transition.lines(), order=transition.order)
+    elif transition.left(RESTOCKED_STATUSES):
+        # Seul un stock rendu par une annulation est repris (pas celui d'une commande hors journal)
+        movements, held = held_stock(transition.order)
+        if movements and held <= 0:
+            withdraw_stock(transition.lines(), order=transition.order)
+
+
+@handler
+def send_emails(transition):
+    """Confirmation, expédition et livraison, envoyées après validation de la transaction"""
+    if transition.created:
+        method = 'send_order_confirmation'
+    elif transition.entered({'shipped'}):
+        method = 'send_shipping_notification'
+    elif transition.entered({'delivered'}):
+        method = 'send_delivery_notification'
+    else:
+        return
+    order = transition.order
+
+    def send():
+        from notifications.email_service import get_email_service
+
+        getattr(get_email_service(), method)(order)
+
+    transaction.on_commit(send)
+
+
+@handler
+def count_sales(transition):
+    """Compteurs de ventes des produits : une commande vendue compte une fois"""
+    from products.sales import record_sales
+
+    if transition.sold != transition.was_sold:
+        record_sales(
+            order_items(transition.order), sign=1 if transition.sold else -1, when=transition.order.created_at
+        )
@@ -5,9 +5,11 @@ from django.db import transaction
 from django.http import JsonResponse
 from django.utils import timezone
 from decimal import Decimal
-from .models import Order, OrderItem, Address, OrderItemCustomization
+from .models import Order, Address
+from .checkout import materialize_order
 from .forms import OrderCreateForm, AddressForm
 from cart.cart import Cart
+from products.reservations import InsufficientStock, commit_cart, reserve_cart
 
 
 @login_required
@@ -22,109 +24,53 @@ def order_create(request):
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
         if form.is_valid():
-            with transaction.atomic():
-                # Créer la commande
-                order = form.save(commit=False)
-                order.user = request.user
-                
-                # Calculer les totaux
-                subtotal = cart.get_total_price()
-                
-                # Calculer les frais de livraison selon les paramètres
-                from core.models import ShippingSettings
-                shipping_settings = ShippingSettings.get_active_settings()
-                shipping_cost = shipping_settings.calculate_shipping_cost(subtotal)
-                
-                total = subtotal + shipping_cost
-                
-                order.subtotal = subtotal
-                order.shipping_cost = shipping_cost
-                order.total = total
-                order.save()
-                
-                # VALIDATION: Vérifier que le panier n'est pas vide
-                if len(cart) == 0:
-                    messages.error(request, "Erreur: Le panier est vide lors de la création de la commande.")
-                    order.delete()
-                    return redirect('cart:cart_detail')
-                
-                # Créer les articles de commande avec personnalisations
-                articles_created = 0
-                for item in cart:
-                    # Récupérer le cart_item pour les personnalisations
-                    from cart.models import CartItem
-                    cart_item = CartItem.objects.filter(
-                        cart__user=request.user,
-                        product=item['product'],
-                        size=item['size']
-                    ).first()
+            # Panier tarifé une seule fois : sous-total, articles et personnalisations
+            priced = cart.priced()
+            if not priced.lines:
+                messages.error(request, "Erreur: Le panier est vide lors de la création de la commande.")
+                return redirect('cart:cart_detail')
+            
+            try:
+                with transaction.atomic():
+                    # Commande écrite en un INSERT (totaux et paiement définitifs), articles en lot
+                    order = form.save(commit=False)
+                    order.user = request.user
+                    materialize_order(order, priced)
                     
-                    # Créer l'article de commande avec le prix actuel (promotion si applicable)
-                    current_price = item['product'].current_price
-                    base_price = current_price * item['quantity']
+                    # Sortie de stock au nom de la commande : les lignes sont re-réservées
+                    # (décrément conditionnel) puis retirées du stock ; tout est annulé si l'une manque
+                    commit_cart(cart.get_cart_id(), priced.stock_lines(), order=order)
                     
-                    order_item = OrderItem.objects.create(
-                        order=order,
-                        product=item['product'],
-                        product_name=item['product'].name,
-                        size=item['size'],
-                        quantity=item['quantity'],
-                        price=current_price,  # Utiliser le prix actuel (promotion)
-                        total_price=base_price  # Prix de base avec promotion
-                    )
-                    
-                    # Copier les personnalisations du cart_item vers l'order_item
-                    if cart_item:
-                        for cart_custom in cart_item.customizations.all():
-                            OrderItemCustomization.objects.create(
-                                order_item=order_item,
-                                customization=cart_custom.customization,
-                                custom_text=cart_custom.custom_text,
-                                quantity=cart_custom.quantity,
-                                price=cart_custom.price
-                            )
-                        
-                        # Mettre à jour le total_price avec les personnalisations
-                        order_item.total_price = order_item.get_total_with_customizations()
-                        order_item.save()
-                    
-                    articles_created += 1
-                
-                # VALIDATION FINALE: Vérifier qu'au moins un article a été créé
-                if articles_created == 0:
-                    messages.error(request, "Erreur: Aucun article n'a pu être ajouté à la commande.")
-                    order.delete()
-                    return redirect('cart:cart_detail')
-                
-                # Recalculer les totaux pour s'assurer de la cohérence
-                order.recalculate_totals()
-                
-                # Vider le panier
-                cart.clear()
-                
-                messages.success(request, f"Commande {order.order_number} créée avec succès.")
-                
-                # Rediriger selon la méthode de paiement choisie
-                payment_method = request.POST.get('payment_method', 'paydunya')
-                order.payment_method = payment_method
-                order.save()
-                
-                if payment_method == 'wave_direct':
-                    return redirect('payments:wave_direct_payment', order_id=order.id)
-                elif payment_method == 'cash_on_delivery':
-                    # Pour le paiement à la livraison, marquer comme en attente de paiement
-                    order.payment_status = 'cash_on_delivery'
-                    order.save()
-                    messages.info(request, "Votre commande sera payée lors de la livraison.")
-                    return redirect('orders:order_detail', order_id=order.id)
-                else:
-                    return redirect('payments:process_payment', order_id=order.id)
+                    # Vider le panier
+                    cart.clear()
+            except InsufficientStock as exc:
+                messages.error(request, f"{exc} Merci d'ajuster votre panier.")
+                return redirect('cart:cart_detail')
+            
+            messages.success(request, f"Commande {order.order_number} créée avec succès.")
+            
+            # Rediriger selon la méthode de paiement choisie
+            if order.payment_method == 'wave_direct':
+                return redirect('payments:wave_direct_payment', order_id=order.id)
+            elif order.payment_method == 'cash_on_delivery':
+                messages.info(request, "Votre commande sera payée lors de la livraison.")
+                return redirect('orders:order_detail', order_id=order.id)
+            else:
+                return redirect('payments:process_payment', order_id=order.id)
     else:
         form = OrderCreateForm()
     
+    # Ouverture de la caisse : le stock du panier est mis de côté le temps de commander
+    try:
+        reservation_expires_at = reserve_cart(cart.get_cart_id(), cart.priced().stock_lines())
+    except InsufficientStock as exc:
+        messages.error(request, f"{exc} Merci d'ajuster votre panier.")
+        return redirect('cart:cart_detail')
+    
     context = {
         'cart': cart,
         'form': form,
+        'reservation_expires_at': reservation_expires_at,
     }
     return render(request, 'orders/order_create.html', context)
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Team, Product, ProductImage, Review, JerseyCustomization, CartItemCustomization
+from .models import Category, Team, Product, ProductImage, ProductVariant, Review, JerseyCustomization, CartItemCustomization, StockMovement
 
 
 @admin.register(Category)
@@ -25,19 +25,27 @@ class ProductImageInline(admin.TabularInline):
     fields = ['image', 'alt_text', 'is_primary', 'order']
 
 
+class ProductVariantInline(admin.TabularInline):
+    model = ProductVariant
+    extra = 0
+    fields = ['size', 'stock', 'reserved', 'sku']
+    readonly_fields = ['reserved']
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'team', 'category', 'current_price', 'stock_quantity', 'is_featured', 'is_active', 'is_on_sale_display']
     list_filter = ['category', 'team', 'is_featured', 'is_active', 'created_at']
     search_fields = ['name', 'description', 'team__name', 'category__name']
     prepopulated_fields = {'slug': ('name',)}
-    inlines = [ProductImageInline]
+    readonly_fields = ['reserved_quantity']
+    inlines = [ProductVariantInline, ProductImageInline]
     fieldsets = (
         ('Informations générales', {
             'fields': ('name', 'slug', 'image', 'category', 'team', 'description')
         }),
         ('Prix et stock', {
-            'fields': ('price', 'sale_price', 'stock_quantity', 'available_sizes')
+            'fields': ('price', 'sale_price', 'stock_quantity', 'reserved_quantity', 'available_sizes')
         }),
         ('Statut', {
             'fields': ('is_featured', 'is_active')
@@ -97,3 +105,22 @@ class CartItemCustomizationAdmin(admin.ModelAdmin):
     list_filter = ['customization__customization_type', 'created_at']
     search_fields = ['cart_item__product__name', 'custom_text']
     readonly_fields = ['price', 'created_at']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Journal de stock en lecture seule (ajout seul)"""
+    list_display = ['product', 'kind', 'quantity', 'order', 'created_at']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['product__name', 'order__order_number']
+    list_select_related = ['product', 'order']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,70 @@
+"""
+Version du catalogue partagée via le cache
+
+Chaque modification du catalogue incrémente la version ; les entrées de
+cache qui l'incluent dans leur clé deviennent alors inaccessibles et sont
+recalculées à la demande, sans purge explicite.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CHANGED_AT_KEY = 'catalog:changed_at'
+
+# Durée de vie des fragments de la page d'accueil (secondes)
+HOME_RAILS_TIMEOUT = 900
+
+
+def _new_version():
+    # Basée sur l'horloge pour ne jamais réutiliser une ancienne version après éviction
+    return int(time.time() * 1000)
+
+
+def get_shared_version(key):
+    """Retourne la version partagée enregistrée sous ``key`` (créée au premier accès)"""
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_shared_version(key):
+    """Incrémente la version partagée enregistrée sous ``key``"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, None)
+        return version
+
+
+def get_catalog_version():
+    """Retourne la version courante du catalogue"""
+    return get_shared_version(CATALOG_VERSION_KEY)
+
+
+def get_catalog_changed_at():
+    """Horodatage (secondes) de la dernière modification connue du catalogue"""
+    changed_at = cache.get(CATALOG_CHANGED_AT_KEY)
+    if changed_at is None:
+        # Inconnu (cache vidé) : on considère que le catalogue vient de changer
+        changed_at = int(time.time())
+        if not cache.add(CATALOG_CHANGED_AT_KEY, changed_at, None):
+            changed_at = cache.get(CATALOG_CHANGED_AT_KEY, changed_at)
+    return changed_at
+
+
+def bump_catalog_version():
+    """Invalide tout ce qui dépend du catalogue"""
+    cache.set(CATALOG_CHANGED_AT_KEY, int(time.time()), None)
+    return bump_shared_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    """Incrémente la version après validation de la transaction courante"""
+    transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,85 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) sur les pages du catalogue
+
+Les validateurs ne coûtent aucune requête SQL : ils reposent sur la version
+du catalogue (incrémentée à chaque modification) et sur la session.
+
+- ETag : version du catalogue + gabarits déployés + utilisateur + panier
+  (badge de l'en-tête) + jeton CSRF. Deux visiteurs ne partagent donc jamais
+  une réponse 304 qui ne leur correspond pas.
+- Last-Modified : date de la dernière modification du catalogue, envoyée
+  seulement quand la page ne dépend pas de la session (visiteur anonyme,
+  panier vide).
+
+Une page portant des messages flash n'a pas de validateur : elle est
+toujours rendue. ``Cache-Control: private, no-cache`` impose au navigateur
+de revalider à chaque visite au lieu de réutiliser une page périmée.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache import get_catalog_changed_at, get_catalog_version
+
+
+@lru_cache(maxsize=None)
+def templates_fingerprint():
+    """Date de modification la plus récente des gabarits (change à chaque déploiement)"""
+    latest = 0
+    for directory in settings.TEMPLATES[0].get('DIRS', []):
+        for root, _dirs, files in os.walk(directory):
+            for name in files:
+                latest = max(latest, int(os.path.getmtime(os.path.join(root, name))))
+    return latest
+
+
+def _has_pending_messages(request):
+    # len() ne marque pas les messages comme lus (contrairement à l'itération)
+    return hasattr(request, '_messages') and len(messages.get_messages(request)) > 0
+
+
+def _session_cart(request):
+    return request.session.get(settings.CART_SESSION_ID) or {}
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag faible des pages du catalogue"""
+    if _has_pending_messages(request):
+        return None
+    parts = [
+        get_catalog_version(),
+        templates_fingerprint(),
+        request.user.pk if request.user.is_authenticated else '',
+        json.dumps(_session_cart(request), sort_keys=True),
+        request.META.get('CSRF_COOKIE', ''),
+    ]
+    digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    """Dernière modification du catalogue, pour les pages indépendantes de la session"""
+    if request.user.is_authenticated or _session_cart(request) or _has_pending_messages(request):
+        return None
+    return datetime.fromtimestamp(max(get_catalog_changed_at(), templates_fingerprint()), tz=timezone.utc)
+
+
+def catalog_condition(view_func):
+    """Répond 304 Not Modified sans rendu quand la page n'a pas changé"""
+    conditional_view = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)(view_func)
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return _wrapped_view
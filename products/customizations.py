@@ -0,0 +1,82 @@
+"""
+Catalogue des options de personnalisation gardé en mémoire
+
+Les options (``JerseyCustomization``) sont peu nombreuses et changent
+rarement : elles sont chargées une fois par processus, en une requête, et
+résolues ensuite sans accès à la base, par id ou par
+``(type, type de badge, nom)``.
+
+Le catalogue chargé est associé à la version partagée ``VERSION_KEY``
+(cache commun aux workers, voir ``products.cache``). L'enregistrement ou la
+suppression d'une option incrémente cette version après validation (voir
+``receivers``) : tous les processus rechargent le catalogue à leur accès
+suivant et facturent aussitôt le nouveau prix. Chaque chargement porte un
+numéro de révision, qui sert de clé aux règles de prix compilées (voir
+``pricing_rules``).
+"""
+
+import threading
+
+from .cache import bump_shared_version, get_shared_version
+
+VERSION_KEY = 'customizations:version'
+
+_lock = threading.Lock()
+_state = {'version': None, 'revision': 0, 'by_id': {}, 'by_key': {}}
+
+
+def _key(customization_type, badge_type, name):
+    return (customization_type, badge_type or '', name)
+
+
+def _catalog():
+    version = get_shared_version(VERSION_KEY)
+    if _state['version'] != version:
+        from .models import JerseyCustomization
+
+        with _lock:
+            options = list(JerseyCustomization.objects.all())
+            _state.update(
+                by_id={option.id: option for option in options},
+                by_key={
+                    _key(option.customization_type, option.badge_type, option.name): option
+                    for option in options
+                },
+                version=version,
+                revision=_state['revision'] + 1,
+            )
+    return _state
+
+
+def get_option(option_id):
+    """Option de personnalisation par id (None si inconnue)"""
+    option = _catalog()['by_id'].get(option_id)
+    if option is None:
+        # Option créée depuis le chargement, avant que la nouvelle version ne soit publiée
+        _state['version'] = None
+        option = _catalog()['by_id'].get(option_id)
+    return option
+
+
+def options():
+    """Options du catalogue par id et révision de celui-ci"""
+    catalog = _catalog()
+    return catalog['by_id'], catalog['revision']
+
+
+def get_or_create_option(customization_type, name, badge_type='', **defaults):
+    """Option ``(type, badge, nom)`` du catalogue, créée si elle n'existe pas encore"""
+    from .models import JerseyCustomization
+
+    option = _catalog()['by_key'].get(_key(customization_type, badge_type, name))
+    if option is None:
+        option, _created = JerseyCustomization.objects.get_or_create(
+            customization_type=customization_type, badge_type=badge_type, name=name, defaults=defaults
+        )
+    return option
+
+
+def invalidate():
+    """Fait relire le catalogue par tous les processus (nouvelle version partagée)"""
+    _state['version'] = None
+    bump_shared_version(VERSION_KEY)
@@ -0,0 +1,94 @@
+"""
+Comptages de facettes pour les filtres de la liste des produits
+
+Les comptages des dimensions du produit (catégorie, équipe, promotion,
+stock) sont calculés en un seul parcours du résultat filtré, ceux des
+tailles en une requête groupée sur les variantes disponibles (même règle
+que le filtre « taille »), puis mis en cache sous une clé dérivée des
+filtres et de la version du catalogue.
+
+La facette d'un filtre actif est comptée sur le résultat filtré par toutes
+les autres dimensions (un parcours de plus par filtre actif) : après avoir
+choisi une catégorie, les autres catégories gardent leurs comptages.
+"""
+
+import hashlib
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+from .cache import get_catalog_version
+from .models import Product, ProductVariant
+
+FACETS_CACHE_TIMEOUT = 600
+
+# Paramètres qui ne changent pas le résultat filtré
+IGNORED_PARAMS = ('ordering', 'cursor', 'page')
+
+# Dimensions comptées (même nom que le paramètre de filtre)
+FACET_DIMENSIONS = ('category', 'team', 'size', 'on_sale', 'in_stock')
+
+
+def compute_facets(queryset):
+    """Calcule toutes les facettes en deux requêtes (produits, tailles)"""
+    categories = Counter()
+    teams = Counter()
+    on_sale = in_stock = total = 0
+
+    queryset = queryset.order_by().prefetch_related(None)
+    rows = queryset.values_list('category_id', 'team_id', 'price', 'effective_price', 'stock_quantity')
+    for category_id, team_id, price, effective_price, stock_quantity in rows.iterator():
+        total += 1
+        categories[category_id] += 1
+        teams[team_id] += 1
+        if effective_price < price:
+            on_sale += 1
+        if stock_quantity > 0:
+            in_stock += 1
+
+    sizes = dict(
+        ProductVariant.objects.available().filter(product__in=queryset.values('pk')).order_by().values(
+            'size'
+        ).annotate(total=Count('id')).values_list('size', 'total')
+    )
+
+    return {
+        'total': total,
+        'category': dict(categories),
+        'team': dict(teams),
+        'size': [(size, sizes.get(size, 0)) for size, _label in Product.SIZES],
+        'on_sale': on_sale,
+        'in_stock': in_stock,
+    }
+
+
+def filter_signature(data):
+    """Signature stable des filtres appliqués"""
+    params = {
+        key: sorted(data.getlist(key)) if hasattr(data, 'getlist') else [data[key]]
+        for key in data
+        if key not in IGNORED_PARAMS
+    }
+    params = {key: values for key, values in params.items() if any(values)}
+    return hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def _without(product_filter, dimension):
+    """Résultat du filtre sans la dimension ``dimension``"""
+    data = product_filter.data.copy()
+    data.pop(dimension, None)
+    return type(product_filter)(data, queryset=product_filter.queryset).qs
+
+
+def get_facets(product_filter):
+    """Retourne (depuis le cache si possible) les facettes d'un ProductFilter"""
+    key = f'facets:{get_catalog_version()}:{filter_signature(product_filter.data)}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(product_filter.qs)
+        for dimension in FACET_DIMENSIONS:
+            if product_filter.data.get(dimension):
+                facets[dimension] = compute_facets(_without(product_filter, dimension))[dimension]
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
@@ -1,24 +1,47 @@
 import django_filters
-from .models import Product
+from django.db.models import F
+from .models import Category, Product, ProductVariant, Team
+from .search import search_products
 
 
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains', label='Nom du produit')
-    category = django_filters.ModelChoiceFilter(queryset=Product.objects.values_list('category', flat=True).distinct(), label='Catégorie')
-    team = django_filters.ModelChoiceFilter(queryset=Product.objects.values_list('team', flat=True).distinct(), label='Équipe')
-    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte', label='Prix minimum')
-    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte', label='Prix maximum')
+    name = django_filters.CharFilter(method='filter_by_name', label='Nom du produit')
+    category = django_filters.ModelChoiceFilter(queryset=Category.objects.all(), label='Catégorie')
+    team = django_filters.ModelChoiceFilter(queryset=Team.objects.all(), label='Équipe')
+    min_price = django_filters.NumberFilter(field_name='effective_price', lookup_expr='gte', label='Prix minimum')
+    max_price = django_filters.NumberFilter(field_name='effective_price', lookup_expr='lte', label='Prix maximum')
     on_sale = django_filters.BooleanFilter(method='filter_on_sale', label='En promotion')
     in_stock = django_filters.BooleanFilter(method='filter_in_stock', label='En stock')
     size = django_filters.CharFilter(method='filter_by_size', label='Taille')
+    min_rating = django_filters.NumberFilter(field_name='rating_avg', lookup_expr='gte', label='Note minimum')
+    ordering = django_filters.OrderingFilter(
+        fields=(
+            ('created_at', 'created_at'),
+            ('rating_avg', 'rating'),
+            ('effective_price', 'price'),
+            ('popularity_score', 'popularity'),
+        ),
+        field_labels={
+            'created_at': 'Nouveautés',
+            'rating_avg': 'Mieux notés',
+            'effective_price': 'Prix',
+            'popularity_score': 'Meilleures ventes',
+        },
+        label='Trier par',
+    )
 
     class Meta:
         model = Product
-        fields = ['name', 'category', 'team', 'min_price', 'max_price', 'on_sale', 'in_stock', 'size']
+        fields = ['name', 'category', 'team', 'min_price', 'max_price', 'on_sale', 'in_stock', 'size', 'min_rating']
+
+    def filter_by_name(self, queryset, name, value):
+        if value:
+            return search_products(queryset, value)
+        return queryset
 
     def filter_on_sale(self, queryset, name, value):
         if value:
-            return queryset.filter(sale_price__isnull=False)
+            return queryset.filter(effective_price__lt=F('price'))
         return queryset
 
     def filter_in_stock(self, queryset, name, value):
@@ -28,5 +51,6 @@ class ProductFilter(django_filters.FilterSet):
 
     def filter_by_size(self, queryset, name, value):
         if value:
-            return queryset.filter(available_sizes__contains=[value])
+            # Sous-requête sur l'index (size, product) des variantes disponibles (comme la facette)
+            return queryset.filter(id__in=ProductVariant.objects.available().filter(size=value).values('product_id'))
         return queryset
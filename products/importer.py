@@ -0,0 +1,308 @@
+"""
+Import en masse du catalogue (équipes, catégories, produits)
+
+Le fichier source est lu en flux, ligne par ligne :
+
+- CSV (en-têtes, séparateur ``,``) ;
+- JSON Lines (un objet par ligne, ``.jsonl``) ;
+- JSON (un tableau d'objets, chargé d'un bloc : préférer JSON Lines pour les gros volumes).
+
+Colonnes reconnues : ``name``, ``slug``, ``team``, ``team_slug``, ``team_country``,
+``team_league``, ``category``, ``category_slug``, ``description``, ``price``,
+``sale_price``, ``stock_quantity``, ``available_sizes`` (« S,M,L » ou liste),
+``is_featured``, ``is_active``.
+
+Les produits sont insérés ou mis à jour par lots sur leur slug
+(``bulk_create(update_conflicts=True)``) ; équipes et catégories sont
+résolues en mémoire et créées par lot si elles n'existent pas. Ce que font
+habituellement ``Product.save()`` et les signaux (prix effectif, variantes,
+index de recherche, version du catalogue) est appliqué une fois par lot.
+"""
+
+import csv
+import json
+import re
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import search
+from .cache import bump_catalog_version_on_commit
+from .models import Category, Product, ProductVariant, Team
+
+BATCH_SIZE = 1000
+
+# Colonnes mises à jour lorsqu'un produit existe déjà (les agrégats d'avis sont conservés)
+UPDATE_FIELDS = [
+    'name', 'category', 'team', 'description', 'price', 'sale_price', 'effective_price',
+    'available_sizes', 'stock_quantity', 'is_featured', 'is_active', 'updated_at',
+]
+
+SIZE_CODES = [code for code, _label in Product.SIZES]
+
+TRUE_VALUES = {'1', 'true', 'vrai', 'oui', 'yes', 'y', 'o'}
+
+
+class InvalidRow(ValueError):
+    """Ligne du fichier d'import inexploitable"""
+
+
+def read_rows(stream, fmt):
+    """Itère sur les lignes (dictionnaires) d'un fichier CSV, JSON ou JSON Lines"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == 'json':
+        yield from json.load(stream)
+    else:
+        raise ValueError(f"Format non supporté : {fmt}")
+
+
+def _text(row, key, default=''):
+    value = row.get(key)
+    return default if value is None else str(value).strip()
+
+
+def _decimal(value, label, required=False):
+    value = '' if value is None else str(value).replace(' ', '').replace(',', '.')
+    if not value:
+        if required:
+            raise InvalidRow(f"{label} manquant")
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise InvalidRow(f"{label} invalide : {value!r}")
+
+
+def _boolean(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _sizes(value):
+    if value is None or value == '':
+        return []
+    sizes = value if isinstance(value, list) else re.split(r'[\s,;|]+', str(value))
+    sizes = [str(size).strip().upper() for size in sizes if str(size).strip()]
+    unknown = [size for size in sizes if size not in SIZE_CODES]
+    if unknown:
+        raise InvalidRow(f"Taille(s) inconnue(s) : {', '.join(unknown)}")
+    return list(dict.fromkeys(sizes))
+
+
+def parse_row(row):
+    """Valide et normalise une ligne brute"""
+    name = _text(row, 'name')
+    if not name:
+        raise InvalidRow("Nom du produit manquant")
+    team = _text(row, 'team')
+    team_slug = _text(row, 'team_slug')
+    if not (team or team_slug):
+        raise InvalidRow("Équipe manquante")
+    category = _text(row, 'category')
+    category_slug = _text(row, 'category_slug')
+    if not (category or category_slug):
+        raise InvalidRow("Catégorie manquante")
+
+    try:
+        stock_quantity = int(_text(row, 'stock_quantity') or 0)
+    except ValueError:
+        raise InvalidRow(f"Stock invalide : {row.get('stock_quantity')!r}")
+    if stock_quantity < 0:
+        raise InvalidRow("Le stock ne peut pas être négatif")
+
+    slug = _text(row, 'slug') or slugify(name)
+    if not slug:
+        raise InvalidRow(f"Impossible de déduire un slug de {name!r}")
+
+    return {
+        'name': name,
+        'slug': slug,
+        'team': {'slug': team_slug, 'name': team or team_slug,
+                 'country': _text(row, 'team_country'), 'league': _text(row, 'team_league')},
+        'category': {'slug': category_slug, 'name': category or category_slug},
+        'description': _text(row, 'description'),
+        'price': _decimal(row.get('price'), "Prix", required=True),
+        'sale_price': _decimal(row.get('sale_price'), "Prix promo"),
+        'stock_quantity': stock_quantity,
+        'available_sizes': _sizes(row.get('available_sizes')),
+        'is_featured': _boolean(row.get('is_featured'), False),
+        'is_active': _boolean(row.get('is_active'), True),
+    }
+
+
+class CatalogImporter:
+    """
+    Importe un flux de lignes par lots.
+
+    ``progress`` est appelé après chaque lot avec l'importeur lui-même, pour
+    afficher l'avancement (``processed``, ``rate``...).
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.teams_created = 0
+        self.categories_created = 0
+        self.errors = []
+        self.started_at = None
+        self.elapsed = 0.0
+        self._teams = {}
+        self._categories = {}
+        self._team_names = {}
+        self._category_names = {}
+
+    @property
+    def rate(self):
+        """Produits traités par seconde"""
+        elapsed = self.elapsed or (time.monotonic() - self.started_at if self.started_at else 0)
+        return self.processed / elapsed if elapsed else 0.0
+
+    def run(self, rows):
+        """Importe toutes les lignes ; en mode simulation, tout est annulé à la fin"""
+        self.started_at = time.monotonic()
+        for slug, pk, name in Team.objects.values_list('slug', 'id', 'name'):
+            self._teams[slug] = pk
+            self._team_names.setdefault(name.lower(), slug)
+        for slug, pk, name in Category.objects.values_list('slug', 'id', 'name'):
+            self._categories[slug] = pk
+            self._category_names.setdefault(name.lower(), slug)
+
+        with transaction.atomic():
+            batch = {}
+            for line, raw in enumerate(rows, start=1):
+                try:
+                    item = parse_row(raw)
+                    self._canonical_slug(item['team'], self._team_names)
+                    self._canonical_slug(item['category'], self._category_names)
+                except InvalidRow as exc:
+                    self.errors.append((line, str(exc)))
+                    continue
+                # Un même slug présent deux fois dans le lot : la dernière ligne l'emporte
+                batch.pop(item['slug'], None)
+                batch[item['slug']] = item
+                if len(batch) >= self.batch_size:
+                    self._flush(list(batch.values()))
+                    batch = {}
+            if batch:
+                self._flush(list(batch.values()))
+
+            if self.dry_run:
+                transaction.set_rollback(True)
+            else:
+                bump_catalog_version_on_commit()
+
+        self.elapsed = time.monotonic() - self.started_at
+        return self
+
+    def _canonical_slug(self, data, names):
+        """Sans slug explicite, réutilise l'équipe / la catégorie existante de même nom"""
+        if not data['slug']:
+            data['slug'] = names.get(data['name'].lower()) or slugify(data['name'])
+            if not data['slug']:
+                raise InvalidRow(f"Nom invalide : {data['name']!r}")
+        names.setdefault(data['name'].lower(), data['slug'])
+
+    def _resolve(self, items, key, model, cache, make):
+        """Crée en un lot les équipes / catégories inconnues et complète le cache slug -> id"""
+        missing = {}
+        for item in items:
+            if item[key]['slug'] not in cache:
+                missing.setdefault(item[key]['slug'], item[key])
+        if missing:
+            model.objects.bulk_create([make(data) for data in missing.values()], batch_size=self.batch_size)
+            cache.update(model.objects.filter(slug__in=list(missing)).values_list('slug', 'id'))
+        return len(missing)
+
+    def _flush(self, items):
+        self.teams_created += self._resolve(
+            items, 'team', Team, self._teams,
+            lambda data: Team(slug=data['slug'], name=data['name'], country=data['country'], league=data['league']),
+        )
+        self.categories_created += self._resolve(
+            items, 'category', Category, self._categories,
+            lambda data: Category(slug=data['slug'], name=data['name']),
+        )
+
+        slugs = [item['slug'] for item in items]
+        existing = dict(Product.objects.filter(slug__in=slugs).values_list('slug', 'stock_quantity'))
+
+        products = []
+        for item in items:
+            product = Product(
+                slug=item['slug'],
+                name=item['name'],
+                team_id=self._teams[item['team']['slug']],
+                category_id=self._categories[item['category']['slug']],
+                description=item['description'],
+                price=item['price'],
+                sale_price=item['sale_price'],
+                stock_quantity=item['stock_quantity'],
+                available_sizes=item['available_sizes'],
+                is_featured=item['is_featured'],
+                is_active=item['is_active'],
+            )
+            product.effective_price = product.current_price
+            products.append(product)
+
+        Product.objects.bulk_create(
+            products,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['slug'],
+            update_fields=UPDATE_FIELDS,
+        )
+        ids = dict(Product.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+        self._sync_variants(items, ids, existing)
+        search.index_products(list(ids.values()))
+
+        self.created += len(items) - len(existing)
+        self.updated += len(existing)
+        self.processed += len(items)
+        if self.progress:
+            self.progress(self)
+
+    def _sync_variants(self, items, ids, previous_stock):
+        """
+        Équivalent par lot de Product.sync_variants() et du report de l'écart
+        de stock aux variantes existantes fait par Product.save()
+        """
+        current = {}
+        for variant_id, product_id, size, stock in ProductVariant.objects.filter(
+            product_id__in=list(ids.values())
+        ).values_list('id', 'product_id', 'size', 'stock'):
+            current[(product_id, size)] = (variant_id, stock)
+
+        wanted = set()
+        to_create = []
+        to_update = []
+        for item in items:
+            product_id = ids[item['slug']]
+            delta = item['stock_quantity'] - previous_stock.get(item['slug'], item['stock_quantity'])
+            for size in item['available_sizes']:
+                wanted.add((product_id, size))
+                if (product_id, size) not in current:
+                    to_create.append(
+                        ProductVariant(product_id=product_id, size=size, stock=item['stock_quantity'])
+                    )
+                elif delta:
+                    variant_id, stock = current[(product_id, size)]
+                    to_update.append(ProductVariant(pk=variant_id, stock=max(stock + delta, 0)))
+        obsolete = [variant_id for key, (variant_id, _stock) in current.items() if key not in wanted]
+        if obsolete:
+            ProductVariant.objects.filter(id__in=obsolete).delete()
+        ProductVariant.objects.bulk_create(to_create, batch_size=self.batch_size)
+        ProductVariant.objects.bulk_update(to_update, ['stock'], batch_size=self.batch_size)
@@ -0,0 +1,150 @@
+"""
+Journal des mouvements de stock
+
+Chaque variation du stock d'un produit est ajoutée au journal
+(``StockMovement`` : produit, type, variation signée, commande éventuelle) :
+ventes et annulations par les mouvements groupés de ``stock``, saisies
+directes (création, édition du produit) par ``Product.save``. Le journal
+n'est jamais modifié.
+
+La commande ``snapshot_stock`` cumule périodiquement le journal dans
+``StockSnapshot`` (stock d'un produit jusqu'à un id de mouvement) : le stock
+d'un produit est le dernier instantané plus les mouvements suivants, lus en
+une requête sur les index ``(produit, id)``. Les écarts avec
+``Product.stock_quantity`` (mises à jour en masse, scripts) sont rattrapés au
+passage par un mouvement d'ajustement.
+
+L'historique du tableau de bord (``stock_history``) se calcule à partir du
+journal seul, par jour, sans lire les commandes.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+BATCH_SIZE = 500
+
+# Les mouvements plus récents ne sont pas encore cumulés : une transaction
+# plus lente peut encore valider un mouvement d'id inférieur
+SETTLE_SECONDS = 60
+
+
+def record(kind, by_product, sign=1, order=None):
+    """Ajoute au journal les variations ``{id produit: quantité}`` (une requête)"""
+    movements = [
+        StockMovement(product_id=product_id, kind=kind, quantity=sign * quantity, order=order)
+        for product_id, quantity in by_product.items()
+        if quantity
+    ]
+    if movements:
+        StockMovement.objects.bulk_create(movements)
+
+
+def _latest_snapshot(product_ref):
+    return StockSnapshot.objects.filter(product=product_ref).order_by('-last_movement_id')
+
+
+def with_ledger_stock(products):
+    """Annote ``ledger_stock`` : dernier instantané plus les mouvements qui le suivent"""
+    latest = _latest_snapshot(OuterRef('pk'))
+    delta = StockMovement.objects.filter(
+        product=OuterRef('pk'), id__gt=OuterRef('snapshot_mark')
+    ).values('product').annotate(total=Sum('quantity')).values('total')
+    return products.annotate(
+        snapshot_quantity=Coalesce(Subquery(latest.values('quantity')[:1]), Value(0)),
+        snapshot_mark=Coalesce(Subquery(latest.values('last_movement_id')[:1]), Value(0)),
+    ).annotate(
+        ledger_stock=F('snapshot_quantity') + Coalesce(Subquery(delta[:1]), Value(0), output_field=IntegerField()),
+    )
+
+
+def ledger_stock(product):
+    """Stock d'un produit selon le journal (une requête)"""
+    return with_ledger_stock(Product.objects.filter(pk=product.pk)).values_list('ledger_stock', flat=True).first()
+
+
+def stock_history(product, days=30):
+    """
+    Stock du produit en fin de journée sur les ``days`` derniers jours :
+    liste de ``(date, stock)``, du plus ancien au plus récent (deux requêtes).
+    """
+    today = timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today - timedelta(days=days - 1), time.min))
+    daily = dict(
+        StockMovement.objects.filter(
+            product=product, created_at__gte=start
+        ).annotate(day=TruncDate('created_at')).values('day').annotate(total=Sum('quantity')).values_list('day', 'total')
+    )
+    stock = ledger_stock(product) or 0
+    history = []
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        history.append((day, stock))
+        # Stock de la veille : on retire les mouvements du jour
+        stock -= daily.get(day, 0)
+    history.reverse()
+    return history
+
+
+class StockSnapshotter:
+    """
+    Cumule le journal dans de nouveaux instantanés, par lots de produits.
+
+    Un écart entre ``stock_quantity`` et le journal est d'abord journalisé
+    (ajustement) ; un produit n'a un nouvel instantané que s'il a des
+    mouvements depuis le précédent.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.products = 0
+        self.snapshots = 0
+        self.adjustments = 0
+
+    def run(self):
+        last_id = 0
+        while True:
+            rows = list(
+                with_ledger_stock(Product.objects.filter(pk__gt=last_id)).order_by('pk').values_list(
+                    'pk', 'stock_quantity', 'ledger_stock'
+                )[:self.batch_size]
+            )
+            if not rows:
+                return self
+            self._snapshot(rows)
+            last_id = rows[-1][0]
+            self.products += len(rows)
+
+    def _snapshot(self, rows):
+        ids = [pk for pk, _stock, _ledger in rows]
+        with transaction.atomic():
+            drift = {pk: stock - ledger for pk, stock, ledger in rows if stock != ledger}
+            record(StockMovement.ADJUSTMENT, drift)
+            self.adjustments += len(drift)
+
+            # Mouvements de chaque produit depuis son dernier instantané, en une requête
+            pending = StockMovement.objects.filter(
+                product_id__in=ids, created_at__lt=timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+            ).annotate(
+                mark=Coalesce(
+                    Subquery(_latest_snapshot(OuterRef('product')).values('last_movement_id')[:1]), Value(0)
+                ),
+                previous=Coalesce(Subquery(_latest_snapshot(OuterRef('product')).values('quantity')[:1]), Value(0)),
+            ).filter(id__gt=F('mark')).values('product', 'previous').annotate(
+                total=Sum('quantity'), last=Max('id')
+            )
+            snapshots = [
+                StockSnapshot(
+                    product_id=row['product'],
+                    quantity=row['previous'] + row['total'],
+                    last_movement_id=row['last'],
+                )
+                for row in pending
+            ]
+            StockSnapshot.objects.bulk_create(snapshots)
+            self.snapshots += len(snapshots)
@@ -0,0 +1,42 @@
+"""
+Commande Django pour calculer les produits similaires (achats conjoints + catalogue)
+"""
+
+from django.core.management.base import BaseCommand
+from products import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        "Met à jour les produits similaires à partir des commandes passées depuis "
+        "la dernière exécution (--full pour tout recalculer)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Repart de zéro : tout l'historique des commandes et tout le catalogue",
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=similarity.TOP_N,
+            help=f'Nombre de voisins conservés par produit (défaut : {similarity.TOP_N})',
+        )
+
+    def handle(self, *args, **options):
+        if options['full']:
+            self.stdout.write("🔄 Recalcul complet des produits similaires...")
+        else:
+            self.stdout.write("🔍 Traitement des nouvelles commandes...")
+
+        run = similarity.build_similar_products(full=options['full'], top_n=options['top'])
+
+        self.stdout.write(f"📦 {run.orders_processed} commande(s) traitée(s)")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {run.products_updated} produit(s) recalculé(s) "
+                f"(reprise à la commande #{run.last_order_id})"
+            )
+        )
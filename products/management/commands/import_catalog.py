@@ -0,0 +1,88 @@
+"""
+Commande Django pour importer le catalogue en masse (CSV, JSON ou JSON Lines)
+"""
+
+import csv
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import BATCH_SIZE, CatalogImporter, read_rows
+
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# Nombre maximum d'erreurs de lignes détaillées dans le rapport
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Importe (insère ou met à jour) équipes, catégories et produits depuis un fichier CSV/JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer ('-' pour l'entrée standard)")
+        parser.add_argument(
+            '--format',
+            choices=sorted(set(FORMATS.values())),
+            help="Format du fichier (déduit de l'extension par défaut)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Nombre de produits écrits par lot (défaut : {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Simule l'import : tout est validé et écrit puis annulé",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if not fmt:
+            raise CommandError("Format inconnu : précisez --format csv, json ou jsonl")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être supérieur à 0")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("🧪 Simulation : aucune modification ne sera enregistrée"))
+        self.stdout.write(f"📥 Import de {path} ({fmt})...")
+
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            progress=self.report_progress,
+        )
+        try:
+            if path == '-':
+                importer.run(read_rows(sys.stdin, fmt))
+            else:
+                with open(path, newline='', encoding='utf-8-sig') as stream:
+                    importer.run(read_rows(stream, fmt))
+        except OSError as exc:
+            raise CommandError(f"Impossible de lire {path} : {exc}")
+        except (ValueError, csv.Error) as exc:
+            raise CommandError(f"Fichier illisible : {exc}")
+
+        for line, message in importer.errors[:MAX_REPORTED_ERRORS]:
+            self.stdout.write(self.style.ERROR(f"❌ Ligne {line} : {message}"))
+        if len(importer.errors) > MAX_REPORTED_ERRORS:
+            self.stdout.write(
+                self.style.ERROR(f"❌ ... et {len(importer.errors) - MAX_REPORTED_ERRORS} autre(s) erreur(s)")
+            )
+
+        self.stdout.write(f"🏆 Équipes créées : {importer.teams_created}")
+        self.stdout.write(f"📂 Catégories créées : {importer.categories_created}")
+        self.stdout.write(f"🛍️ Produits créés : {importer.created} / mis à jour : {importer.updated}")
+        summary = (
+            f"{importer.processed} produit(s) en {importer.elapsed:.1f}s "
+            f"({importer.rate:.0f} produits/s), {len(importer.errors)} ligne(s) rejetée(s)"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"🧪 Simulation terminée : {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Import terminé : {summary}"))
+
+    def report_progress(self, importer):
+        self.stdout.write(f"   ⏳ {importer.processed} produit(s) traité(s) ({importer.rate:.0f}/s)")
@@ -0,0 +1,33 @@
+"""
+Commande Django pour reconstruire les agrégats de notes des produits
+"""
+
+from django.core.management.base import BaseCommand
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit rating_sum, rating_count et rating_avg à partir des avis'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=str,
+            help='Reconstruit uniquement le produit avec ce slug',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['product']:
+            products = products.filter(slug=options['product'])
+            if not products.exists():
+                self.stdout.write(
+                    self.style.ERROR(f"❌ Produit {options['product']} non trouvé")
+                )
+                return
+
+        self.stdout.write("🔍 Recalcul des notes moyennes...")
+        updated = Product.rebuild_rating_aggregates(products)
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ {updated} produit(s) mis à jour")
+        )
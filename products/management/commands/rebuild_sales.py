@@ -0,0 +1,42 @@
+"""
+Commande Django pour recalculer les compteurs de ventes des produits
+"""
+
+from django.core.management.base import BaseCommand
+from products.cache import bump_catalog_version
+from products.models import Product
+from products.sales import BATCH_SIZE, rebuild_sales
+
+
+class Command(BaseCommand):
+    help = 'Recalcule units_sold, sales_revenue et popularity_score à partir des commandes vendues'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=str,
+            help='Recalcule uniquement le produit avec ce slug',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Nombre de produits mis à jour par requête (défaut : {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['product']:
+            products = products.filter(slug=options['product'])
+            if not products.exists():
+                self.stdout.write(
+                    self.style.ERROR(f"❌ Produit {options['product']} non trouvé")
+                )
+                return
+
+        self.stdout.write("🔍 Recalcul des ventes et de la popularité...")
+        updated = rebuild_sales(products, batch_size=options['batch_size'])
+        bump_catalog_version()
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ {updated} produit(s) mis à jour")
+        )
@@ -0,0 +1,24 @@
+"""
+Commande Django pour reconstruire l'index de recherche plein texte
+"""
+
+from django.core.management.base import BaseCommand
+from products import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des produits"
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        if not backend.is_available():
+            self.stdout.write(
+                self.style.WARNING("⚠️ Aucun index plein texte disponible (repli icontains)")
+            )
+            return
+
+        self.stdout.write("🔍 Reconstruction de l'index de recherche...")
+        indexed = search.rebuild_index()
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ {indexed} produit(s) indexé(s)")
+        )
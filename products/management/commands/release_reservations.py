@@ -0,0 +1,25 @@
+"""
+Commande Django pour libérer les réservations de stock expirées
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from products.reservations import BATCH_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = "Libère les réservations de stock expirées (à lancer toutes les minutes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Nombre de réservations libérées par transaction (défaut : {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être supérieur à 0")
+
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {released} réservation(s) expirée(s) libérée(s)"))
@@ -0,0 +1,36 @@
+"""
+Commande Django pour cumuler le journal de stock dans des instantanés
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from products.ledger import BATCH_SIZE, StockSnapshotter
+
+
+class Command(BaseCommand):
+    help = (
+        "Cumule les mouvements de stock dans des instantanés par produit et journalise "
+        "les écarts avec le stock des produits (à lancer toutes les heures)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Nombre de produits traités par transaction (défaut : {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être supérieur à 0")
+
+        self.stdout.write("📦 Cumul du journal de stock...")
+        snapshotter = StockSnapshotter(batch_size=options['batch_size']).run()
+
+        if snapshotter.adjustments:
+            self.stdout.write(self.style.WARNING(f"⚠️ {snapshotter.adjustments} écart(s) de stock journalisé(s)"))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {snapshotter.snapshots} instantané(s) pour {snapshotter.products} produit(s)"
+            )
+        )
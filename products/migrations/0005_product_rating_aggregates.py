@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:02
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'Review')
+    stats = Review.objects.values('product_id').annotate(
+        total=Sum('rating'), count=Count('id'), avg=Avg('rating')
+    )
+    for row in stats:
+        Product.objects.filter(pk=row['product_id']).update(
+            rating_sum=row['total'], rating_count=row['count'], rating_avg=row['avg']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0, verbose_name='Note moyenne'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre d'avis"),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Somme des notes'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+import unicodedata
+
+from django.db import migrations, transaction
+from django.db.utils import DatabaseError
+
+# Copie figée, à la date de cette migration, du schéma et des documents de
+# products.search : les évolutions de ce module passent par de nouvelles migrations
+FTS_TABLE = 'products_search_fts'
+PG_TABLE = 'products_search_index'
+
+INDEX_FIELDS = ('id', 'name', 'team__name', 'category__name', 'description')
+
+BATCH_SIZE = 500
+
+CREATE_SQL = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, team, category, description, "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+        # Pondération bm25 : nom > équipe = catégorie > description
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 4.0, 4.0, 1.0)')",
+    ],
+    'postgresql': [
+        f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+        "product_id bigint PRIMARY KEY REFERENCES products_product(id) "
+        "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL)",
+        f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_document_gin ON {PG_TABLE} USING GIN (document)",
+    ],
+}
+
+INSERT_SQL = {
+    'sqlite': (
+        f"INSERT INTO {FTS_TABLE}(rowid, name, team, category, description) "
+        "VALUES (%s, %s, %s, %s, %s)"
+    ),
+    'postgresql': (
+        f"INSERT INTO {PG_TABLE} (product_id, document) VALUES (%s, "
+        "setweight(to_tsvector('french', %s), 'A') || "
+        "setweight(to_tsvector('french', %s), 'B') || "
+        "setweight(to_tsvector('french', %s), 'B') || "
+        "setweight(to_tsvector('french', %s), 'D'))"
+    ),
+}
+
+DROP_SQL = {
+    'sqlite': f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    'postgresql': f"DROP TABLE IF EXISTS {PG_TABLE}",
+}
+
+
+def normalize_text(text):
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_SQL:
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                for sql in CREATE_SQL[connection.vendor]:
+                    cursor.execute(sql)
+    except DatabaseError:
+        # FTS5 indisponible : la recherche utilisera le repli icontains
+        return
+
+    Product = apps.get_model('products', 'Product')
+    rows = Product.objects.using(connection.alias).values_list(*INDEX_FIELDS)
+    documents = [
+        (row[0], *(normalize_text(value) for value in row[1:]))
+        for row in rows.iterator(chunk_size=BATCH_SIZE)
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(documents), BATCH_SIZE):
+            cursor.executemany(INSERT_SQL[connection.vendor], documents[start:start + BATCH_SIZE])
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor in DROP_SQL:
+        with connection.cursor() as cursor:
+            cursor.execute(DROP_SQL[connection.vendor])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_variants_from_sizes(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    variants = [
+        ProductVariant(product_id=product_id, size=size, stock=stock_quantity)
+        for product_id, sizes, stock_quantity in Product.objects.values_list(
+            'id', 'available_sizes', 'stock_quantity'
+        ).iterator()
+        for size in dict.fromkeys(sizes or [])
+    ]
+    ProductVariant.objects.bulk_create(variants, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(choices=[('XS', 'Extra Small'), ('S', 'Small'), ('M', 'Medium'), ('L', 'Large'), ('XL', 'Extra Large'), ('XXL', '2XL'), ('XXXL', '3XL')], max_length=10, verbose_name='Taille')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='Stock')),
+                ('sku', models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Référence (SKU)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Modifié le')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='products.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Variante de produit',
+                'verbose_name_plural': 'Variantes de produits',
+                'ordering': ['product', 'size'],
+                'indexes': [models.Index(fields=['size', 'product'], name='variant_size_product_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productvariant',
+            constraint=models.UniqueConstraint(fields=('product', 'size'), name='unique_product_size'),
+        ),
+        migrations.RunPython(create_variants_from_sizes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:11
+
+from django.db import migrations, models
+from django.db.models import Case, F, When
+
+
+def backfill_effective_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(
+        effective_price=Case(When(sale_price__gt=0, then=F('sale_price')), default=F('price'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Prix effectif'),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='product_active_price_idx'),
+        ),
+    ]
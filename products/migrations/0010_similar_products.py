@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.PositiveIntegerField(default=0, verbose_name='Dernière commande traitée')),
+                ('orders_processed', models.PositiveIntegerField(default=0, verbose_name='Commandes traitées')),
+                ('products_updated', models.PositiveIntegerField(default=0, verbose_name='Produits recalculés')),
+                ('full_rebuild', models.BooleanField(default=False, verbose_name='Reconstruction complète')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Exécuté le')),
+            ],
+            options={
+                'verbose_name': 'Calcul des produits similaires',
+                'verbose_name_plural': 'Calculs des produits similaires',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rang')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='products.product', verbose_name='Produit')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='products.product', verbose_name='Produit similaire')),
+            ],
+            options={
+                'verbose_name': 'Produit similaire',
+                'verbose_name_plural': 'Produits similaires',
+                'ordering': ['product', 'rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Commandes communes')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Acheté avec')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_purchases', to='products.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Achat conjoint',
+                'verbose_name_plural': 'Achats conjoints',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'rank'), name='unique_neighbour_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='copurchase',
+            constraint=models.UniqueConstraint(fields=('product', 'other'), name='unique_co_purchase_pair'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_initial_inventory(apps, schema_editor):
+    """Ouvre le journal avec le stock actuel de chaque produit (mouvement d'inventaire)"""
+    Product = apps.get_model('products', 'Product')
+    StockMovement = apps.get_model('products', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(product_id=product_id, kind=0, quantity=stock)
+            for product_id, stock in Product.objects.filter(stock_quantity__gt=0).values_list('id', 'stock_quantity').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_alter_order_payment_method_and_more'),
+        ('products', '0011_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Stock')),
+                ('last_movement_id', models.PositiveBigIntegerField(verbose_name='Dernier mouvement inclus')),
+                ('taken_at', models.DateTimeField(auto_now_add=True, verbose_name='Pris le')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'indexes': [models.Index(fields=['product', '-last_movement_id'], name='snapshot_product_mark_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(0, 'Inventaire initial'), (1, 'Vente'), (2, 'Annulation'), (3, 'Réassort'), (4, 'Ajustement manuel')], verbose_name='Type')),
+                ('quantity', models.IntegerField(verbose_name='Variation')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='orders.order', verbose_name='Commande')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de stock',
+                'verbose_name_plural': 'Mouvements de stock',
+                'indexes': [models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'), models.Index(fields=['product', 'id'], name='movement_product_id_idx')],
+            },
+        ),
+        migrations.RunPython(record_initial_inventory, migrations.RunPython.noop),
+    ]
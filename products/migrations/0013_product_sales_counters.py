@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:53
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Q
+
+# Copies figées, à la date de cette migration, de products.sales (poids des
+# ventes) et de orders.transitions.sold_orders (commandes vendues)
+HALF_LIFE_DAYS = 14
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SOLD_ORDERS = (
+    (Q(order__status__in=['delivered']) | Q(order__payment_status='paid'))
+    & ~Q(order__status__in=['cancelled', 'refunded'])
+    & ~Q(order__payment_status='refunded')
+)
+
+
+def decay_weight(when):
+    return 2 ** ((when - EPOCH).total_seconds() / (HALF_LIFE_DAYS * 86400))
+
+
+def backfill_sales_counters(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    units, revenue, score = defaultdict(int), defaultdict(Decimal), defaultdict(float)
+    items = OrderItem.objects.filter(SOLD_ORDERS, product__isnull=False).values_list(
+        'product_id', 'quantity', 'total_price', 'order__created_at'
+    )
+    for product_id, quantity, total_price, created_at in items.iterator():
+        units[product_id] += quantity
+        revenue[product_id] += total_price
+        score[product_id] += quantity * decay_weight(created_at)
+    Product.objects.bulk_update(
+        [
+            Product(pk=pk, units_sold=units[pk], sales_revenue=revenue[pk], popularity_score=score[pk])
+            for pk in units
+        ],
+        ['units_sold', 'sales_revenue', 'popularity_score'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_alter_order_payment_method_and_more'),
+        ('products', '0012_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Score de popularité'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name="Chiffre d'affaires"),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Unités vendues'),
+        ),
+        migrations.RunPython(backfill_sales_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-popularity_score', '-id'], name='product_active_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-units_sold', '-id'], name='product_units_sold_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:19
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_reserved_quantity(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    reserved = ProductVariant.objects.filter(reserved__gt=0).values('product_id').annotate(total=Sum('reserved'))
+    for row in reserved:
+        Product.objects.filter(pk=row['product_id']).update(reserved_quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_sales_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Réservé (commandes en cours)'),
+        ),
+        migrations.RunPython(backfill_reserved_quantity, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    Avg, Case, Count, DecimalField, F, FloatField, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
 from django.urls import reverse
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -51,6 +56,36 @@ class Team(models.Model):
         super().save(*args, **kwargs)
 
 
+def effective_price_expression(price, sale_price):
+    """Expression SQL du prix effectif : prix promo s'il est renseigné, sinon prix normal"""
+    output_field = DecimalField(max_digits=10, decimal_places=2)
+    if not hasattr(price, 'resolve_expression'):
+        price = Value(price, output_field=output_field)
+    if not hasattr(sale_price, 'resolve_expression'):
+        return Value(sale_price, output_field=output_field) if sale_price else price
+    return Case(When(GreaterThan(sale_price, 0), then=sale_price), default=price, output_field=output_field)
+
+
+class ProductQuerySet(models.QuerySet):
+    """Maintient effective_price lors des mises à jour en masse"""
+
+    def update(self, **kwargs):
+        if ('price' in kwargs or 'sale_price' in kwargs) and 'effective_price' not in kwargs:
+            # Les colonnes lues dans un UPDATE ont leur ancienne valeur : on substitue les nouvelles
+            kwargs['effective_price'] = effective_price_expression(
+                kwargs.get('price', F('price')), kwargs.get('sale_price', F('sale_price'))
+            )
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs, fields = list(objs), list(fields)
+        if {'price', 'sale_price'} & set(fields) and 'effective_price' not in fields:
+            for obj in objs:
+                obj.effective_price = obj.current_price
+            fields.append('effective_price')
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+
 class Product(models.Model):
     SIZES = [
         ('XS', 'Extra Small'),
@@ -70,25 +105,105 @@ class Product(models.Model):
     description = models.TextField(verbose_name="Description")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Prix")
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Prix en promotion")
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Prix effectif")
     available_sizes = models.JSONField(default=list, verbose_name="Tailles disponibles")
     stock_quantity = models.PositiveIntegerField(default=0, verbose_name="Quantité en stock")
+    reserved_quantity = models.PositiveIntegerField(default=0, editable=False, verbose_name="Réservé (commandes en cours)")
     is_featured = models.BooleanField(default=False, verbose_name="Produit vedette")
     is_active = models.BooleanField(default=True, verbose_name="Actif")
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="Somme des notes")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="Nombre d'avis")
+    rating_avg = models.FloatField(default=0, db_index=True, verbose_name="Note moyenne")
+    units_sold = models.PositiveIntegerField(default=0, editable=False, verbose_name="Unités vendues")
+    sales_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, verbose_name="Chiffre d'affaires")
+    popularity_score = models.FloatField(default=0, editable=False, verbose_name="Score de popularité")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Modifié le")
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
         ordering = ['-created_at']
+        indexes = [
+            # Pagination par curseur sur (created_at, id) des listes du catalogue
+            models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_recent_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_recent_idx'),
+            models.Index(fields=['team', '-created_at', '-id'], name='product_team_recent_idx'),
+            # Filtres et tris par prix : parcours d'intervalle sur le prix effectif
+            models.Index(fields=['is_active', 'effective_price', 'id'], name='product_active_price_idx'),
+            # Tri « Meilleures ventes » du catalogue et classement du tableau de bord
+            models.Index(fields=['is_active', '-popularity_score', '-id'], name='product_active_popular_idx'),
+            models.Index(fields=['-units_sold', '-id'], name='product_units_sold_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser les tailles chargées pour ne synchroniser les variantes qu'en cas de changement
+        instance._loaded_sizes = instance.__dict__.get('available_sizes')
+        # Stock chargé : l'alerte de stock faible se décide sans relire le produit
+        instance._loaded_stock = instance.__dict__.get('stock_quantity')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        # Le stock relu devient la référence des ajustements journalisés
+        if fields is None or 'stock_quantity' in fields:
+            self._loaded_stock = self.stock_quantity
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        self.effective_price = self.current_price
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'sale_price'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        created = self._state.adding
+        if update_fields is None and not created:
+            # Le compteur de réservations n'est tenu que par des UPDATE conditionnels (voir reservations)
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved_quantity'
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'stock_quantity' in update_fields:
+                self._record_stock_change(created)
+            if self.available_sizes != getattr(self, '_loaded_sizes', None):
+                self.sync_variants()
+        self._loaded_sizes = list(self.available_sizes)
+        self._loaded_stock = self.stock_quantity
+        self.__dict__.pop('_variant_stocks_cache', None)
+
+    def _record_stock_change(self, created):
+        """
+        Reporte une saisie directe du stock (création, édition) au journal de
+        stock et, pour une édition, aux variantes existantes (même écart)
+        """
+        if created:
+            kind, delta = StockMovement.INVENTORY, self.stock_quantity
+        elif getattr(self, '_loaded_stock', None) is not None:
+            kind, delta = StockMovement.ADJUSTMENT, self.stock_quantity - self._loaded_stock
+        else:
+            return
+        if delta:
+            StockMovement.objects.create(product=self, kind=kind, quantity=delta)
+            if not created:
+                self.variants.update(stock=Greatest(F('stock') + delta, Value(0)))
+
+    def sync_variants(self):
+        """Aligne les variantes (une par taille) sur available_sizes"""
+        sizes = list(dict.fromkeys(self.available_sizes or []))
+        self.variants.exclude(size__in=sizes).delete()
+        ProductVariant.objects.bulk_create(
+            [ProductVariant(product=self, size=size, stock=self.stock_quantity) for size in sizes],
+            ignore_conflicts=True,
+        )
 
     def get_absolute_url(self):
         return reverse('products:product_detail', args=[self.slug])
@@ -100,42 +215,200 @@ class Product(models.Model):
     
     @property
     def average_rating(self):
-        """Calcule la note moyenne des avis"""
-        from django.db.models import Avg
-        avg_rating = self.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        return round(avg_rating, 1) if avg_rating else 0.0
+        """Retourne la note moyenne des avis (colonne dénormalisée)"""
+        return round(self.rating_avg, 1) if self.rating_count else 0.0
     
     @property
     def total_reviews(self):
-        """Retourne le nombre total d'avis"""
-        return self.reviews.count()
+        """Retourne le nombre total d'avis (colonne dénormalisée)"""
+        return self.rating_count
+
+    @classmethod
+    def apply_rating_delta(cls, product_id, rating_delta, count_delta):
+        """
+        Met à jour les agrégats de notes en un seul UPDATE atomique.
+        Toutes les expressions lisent les valeurs avant mise à jour.
+        """
+        new_sum = F('rating_sum') + rating_delta
+        new_count = F('rating_count') + count_delta
+        return cls.objects.filter(pk=product_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_avg=Case(
+                When(rating_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / new_count),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
+    @classmethod
+    def rebuild_rating_aggregates(cls, queryset=None):
+        """Recalcule entièrement les agrégats de notes à partir des avis"""
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        review_sum = Subquery(reviews.annotate(total=Sum('rating')).values('total'))
+        review_count = Subquery(reviews.annotate(total=Count('id')).values('total'))
+        review_avg = Subquery(reviews.annotate(avg=Avg('rating')).values('avg'))
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.update(
+            rating_sum=Coalesce(review_sum, 0),
+            rating_count=Coalesce(review_count, 0),
+            rating_avg=Coalesce(review_avg, Value(0.0), output_field=FloatField()),
+        )
 
     @property
     def discount_percentage(self):
         """Calcule le pourcentage de réduction"""
-        if self.sale_price and self.price > self.sale_price:
-            return int(((self.price - self.sale_price) / self.price) * 100)
+        if self.is_on_sale:
+            return int(((self.price - self.current_price) / self.price) * 100)
         return 0
 
     @property
     def is_on_sale(self):
-        """Vérifie si le produit est en promotion"""
-        return bool(self.sale_price and self.sale_price < self.price)
+        """Vérifie si le produit est en promotion (même règle que effective_price < price)"""
+        return self.current_price < self.price
 
     @property
     def is_available(self):
         """Vérifie si le produit est disponible (en stock et actif)"""
         return self.stock_quantity > 0 and self.is_active
 
+    def _variant_stocks(self):
+        """Stocks disponibles (hors réservations) par taille, en une requête (ou depuis un prefetch 'variants')"""
+        if '_variant_stocks_cache' not in self.__dict__:
+            if 'variants' in getattr(self, '_prefetched_objects_cache', {}):
+                stocks = {variant.size: variant.available for variant in self.variants.all()}
+            else:
+                stocks = dict(self.variants.values_list('size', F('stock') - F('reserved')))
+            self.__dict__['_variant_stocks_cache'] = stocks
+        return self.__dict__['_variant_stocks_cache']
+
     def is_available_in_size(self, size):
-        """Vérifie si une taille est disponible"""
-        return size in self.available_sizes
+        """Vérifie si une taille est proposée pour ce produit"""
+        return size in self._variant_stocks()
 
     def get_stock_for_size(self, size):
-        """Retourne le stock pour une taille donnée"""
-        # Pour simplifier, on considère que le stock est global
-        # Dans une version plus avancée, on pourrait avoir un modèle Stock par taille
-        return self.stock_quantity
+        """Retourne le stock disponible pour une taille donnée (borné par le stock global non réservé)"""
+        return max(min(self._variant_stocks().get(size, 0), self.stock_quantity - self.reserved_quantity), 0)
+
+
+class ProductVariantQuerySet(models.QuerySet):
+    """Disponibilité des variantes, partagée par le filtre et la facette « taille »"""
+
+    def available(self):
+        """Variantes en stock hors réservations (même règle que ``Product.get_stock_for_size``)"""
+        return self.filter(stock__gt=F('reserved'), product__stock_quantity__gt=F('product__reserved_quantity'))
+
+
+class ProductVariant(models.Model):
+    """Déclinaison d'un produit par taille, avec son propre stock"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants', verbose_name="Produit")
+    size = models.CharField(max_length=10, choices=Product.SIZES, verbose_name="Taille")
+    stock = models.PositiveIntegerField(default=0, verbose_name="Stock")
+    reserved = models.PositiveIntegerField(default=0, verbose_name="Réservé (commandes en cours)")
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Référence (SKU)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Modifié le")
+
+    objects = ProductVariantQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Variante de produit"
+        verbose_name_plural = "Variantes de produits"
+        ordering = ['product', 'size']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'size'], name='unique_product_size'),
+        ]
+        indexes = [
+            # Filtre « taille » de la liste des produits
+            models.Index(fields=['size', 'product'], name='variant_size_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} ({self.size})"
+
+    @property
+    def available(self):
+        """Stock moins les réservations en cours"""
+        return max(self.stock - self.reserved, 0)
+
+
+class StockReservation(models.Model):
+    """Quantité d'une variante mise de côté pendant le passage en caisse d'un panier"""
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations', verbose_name="Variante")
+    cart = models.ForeignKey('cart.Cart', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_reservations', verbose_name="Panier")
+    quantity = models.PositiveIntegerField(verbose_name="Quantité")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Expire le")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+
+    class Meta:
+        verbose_name = "Réservation de stock"
+        verbose_name_plural = "Réservations de stock"
+        indexes = [
+            # Libération des réservations expirées d'une variante
+            models.Index(fields=['variant', 'expires_at'], name='reservation_variant_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.variant} jusqu'à {self.expires_at:%H:%M}"
+
+
+class StockMovement(models.Model):
+    """Mouvement du stock d'un produit (journal en ajout seul, voir ``ledger``)"""
+    INVENTORY = 0
+    SALE = 1
+    CANCELLATION = 2
+    RESTOCK = 3
+    ADJUSTMENT = 4
+    KIND_CHOICES = [
+        (INVENTORY, 'Inventaire initial'),
+        (SALE, 'Vente'),
+        (CANCELLATION, 'Annulation'),
+        (RESTOCK, 'Réassort'),
+        (ADJUSTMENT, 'Ajustement manuel'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements', verbose_name="Produit")
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES, verbose_name="Type")
+    quantity = models.IntegerField(verbose_name="Variation")
+    order = models.ForeignKey('orders.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements', verbose_name="Commande")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date")
+
+    class Meta:
+        verbose_name = "Mouvement de stock"
+        verbose_name_plural = "Mouvements de stock"
+        indexes = [
+            # Historique d'un produit (graphiques du tableau de bord)
+            models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'),
+            # Mouvements postérieurs au dernier instantané d'un produit
+            models.Index(fields=['product', 'id'], name='movement_product_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} - {self.product.name}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Le journal de stock est en ajout seul.")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """Stock d'un produit cumulé jusqu'à un mouvement du journal"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots', verbose_name="Produit")
+    quantity = models.IntegerField(verbose_name="Stock")
+    last_movement_id = models.PositiveBigIntegerField(verbose_name="Dernier mouvement inclus")
+    taken_at = models.DateTimeField(auto_now_add=True, verbose_name="Pris le")
+
+    class Meta:
+        verbose_name = "Instantané de stock"
+        verbose_name_plural = "Instantanés de stock"
+        indexes = [
+            models.Index(fields=['product', '-last_movement_id'], name='snapshot_product_mark_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} : {self.quantity} ({self.taken_at:%d/%m/%Y})"
 
 
 class ProductImage(models.Model):
@@ -181,6 +454,72 @@ class Review(models.Model):
     def __str__(self):
         return f"Avis de {self.user.username} sur {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser la note chargée pour calculer le delta à la sauvegarde
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # L'avis et les agrégats du produit sont écrits dans la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_rating = self.rating
+
+
+class CoPurchase(models.Model):
+    """Nombre de commandes contenant à la fois ``product`` et ``other`` (stocké dans les deux sens)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases', verbose_name="Produit")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="Acheté avec")
+    count = models.PositiveIntegerField(default=0, verbose_name="Commandes communes")
+
+    class Meta:
+        verbose_name = "Achat conjoint"
+        verbose_name_plural = "Achats conjoints"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_co_purchase_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id} ({self.count})"
+
+
+class SimilarProduct(models.Model):
+    """Voisins précalculés d'un produit, lus par la page de détail"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbours', verbose_name="Produit")
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similar_to', verbose_name="Produit similaire")
+    rank = models.PositiveSmallIntegerField(verbose_name="Rang")
+    score = models.FloatField(verbose_name="Score")
+
+    class Meta:
+        verbose_name = "Produit similaire"
+        verbose_name_plural = "Produits similaires"
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_neighbour_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.similar_id} (#{self.rank})"
+
+
+class SimilarityRun(models.Model):
+    """Exécution du calcul des produits similaires (sert de point de reprise)"""
+    last_order_id = models.PositiveIntegerField(default=0, verbose_name="Dernière commande traitée")
+    orders_processed = models.PositiveIntegerField(default=0, verbose_name="Commandes traitées")
+    products_updated = models.PositiveIntegerField(default=0, verbose_name="Produits recalculés")
+    full_rebuild = models.BooleanField(default=False, verbose_name="Reconstruction complète")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Exécuté le")
+
+    class Meta:
+        verbose_name = "Calcul des produits similaires"
+        verbose_name_plural = "Calculs des produits similaires"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Calcul du {self.created_at:%d/%m/%Y %H:%M} (commande #{self.last_order_id})"
+
 
 class JerseyCustomization(models.Model):
     """Options de personnalisation pour les maillots"""
@@ -229,38 +568,28 @@ class JerseyCustomization(models.Model):
     
     @classmethod
     def get_or_create_name_customization(cls):
-        """Récupérer ou créer l'option de personnalisation nom/numéro"""
-        try:
-            return cls.objects.get(
-                customization_type='name',
-                name='Nom et Numéro'
-            )
-        except cls.DoesNotExist:
-            return cls.objects.create(
-                customization_type='name',
-                name='Nom et Numéro',
-                price=500.00,
-                description='Ajoutez votre nom et numéro sur le maillot. Prix: 500 FCFA par caractère.'
-            )
+        """Récupérer ou créer l'option de personnalisation nom/numéro (catalogue en mémoire)"""
+        from .customizations import get_or_create_option
+
+        return get_or_create_option(
+            'name',
+            'Nom et Numéro',
+            price=500.00,
+            description='Ajoutez votre nom et numéro sur le maillot. Prix: 500 FCFA par caractère.'
+        )
     
     @classmethod
     def get_or_create_badge_customization(cls, badge_type):
-        """Récupérer ou créer l'option de personnalisation badge"""
-        badge_name = f"Badge {badge_type.title()}"
-        try:
-            return cls.objects.get(
-                customization_type='badge',
-                badge_type=badge_type,
-                name=badge_name
-            )
-        except cls.DoesNotExist:
-            return cls.objects.create(
-                customization_type='badge',
-                badge_type=badge_type,
-                name=badge_name,
-                price=500.00,
-                description=f'Badge officiel {badge_type}'
-            )
+        """Récupérer ou créer l'option de personnalisation badge (catalogue en mémoire)"""
+        from .customizations import get_or_create_option
+
+        return get_or_create_option(
+            'badge',
+            f"Badge {badge_type.title()}",
+            badge_type=badge_type,
+            price=500.00,
+            description=f'Badge officiel {badge_type}'
+        )
 
 
 class CartItemCustomization(models.Model):
@@ -283,11 +612,8 @@ class CartItemCustomization(models.Model):
             return f"{self.customization.name} sur {self.cart_item.product.name}"
     
     def save(self, *args, **kwargs):
-        # Calculer le prix total
-        if self.customization.customization_type == 'name' and self.custom_text:
-            # Pour les noms/numéros, le prix dépend du nombre de caractères
-            self.price = self.customization.price * len(self.custom_text) * self.quantity
-        else:
-            # Pour les badges, prix fixe
-            self.price = self.customization.price * self.quantity
+        # Prix calculé par les règles de prix (jamais celui envoyé par le client)
+        from .pricing_rules import customization_price
+
+        self.price = customization_price(self.customization, self.custom_text, self.quantity)
         super().save(*args, **kwargs)
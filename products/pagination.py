@@ -0,0 +1,179 @@
+"""
+Pagination par curseur (keyset) pour les listes du catalogue
+
+Contrairement au Paginator de Django (OFFSET + COUNT(*)), chaque page est
+obtenue par un filtre sur les clés de tri de la dernière ligne affichée :
+la page 200 coûte autant que la page 1 tant qu'un index couvre le tri.
+
+Les curseurs sont des jetons opaques (base64 url-safe) utilisables tels
+quels par les templates et par la PWA.
+"""
+
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 12
+
+# Durée de vie du comptage approximatif mis en cache (secondes)
+COUNT_CACHE_TIMEOUT = 300
+
+
+class InvalidCursor(ValueError):
+    """Jeton de curseur illisible ou incompatible avec le tri demandé"""
+
+
+def _encode_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class CursorPage:
+    """Page de résultats compatible avec l'usage fait dans les templates"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginateur keyset sur les clés de tri du queryset.
+
+    Le tri est celui du queryset (ou l'ordre par défaut du modèle), complété
+    par la clé primaire pour garantir un ordre total. Seules les colonnes du
+    modèle et les annotations non nulles sont supportées comme clés de tri.
+    """
+
+    def __init__(self, queryset, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = self._resolve_ordering(queryset)
+
+    def _resolve_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        for key in ordering:
+            if not isinstance(key, str) or '__' in key or key.lstrip('-') == '?':
+                raise ValueError(f"Clé de tri non supportée pour la pagination par curseur : {key!r}")
+        names = [key.lstrip('-') for key in ordering]
+        if 'pk' not in names and 'id' not in names:
+            descending = ordering[0].startswith('-') if ordering else True
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def _field_value(self, obj, name):
+        return getattr(obj, 'pk' if name == 'id' else name)
+
+    def _to_python(self, name, value):
+        opts = self.queryset.model._meta
+        if name in ('pk', 'id'):
+            return opts.pk.to_python(value)
+        try:
+            return opts.get_field(name).to_python(value)
+        except Exception:
+            # Annotation (ex. rang de pertinence) : valeur JSON brute
+            return value
+
+    def encode_cursor(self, obj, direction):
+        values = [_encode_value(self._field_value(obj, key.lstrip('-'))) for key in self.ordering]
+        payload = json.dumps({'d': direction, 'k': self.ordering, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            direction, keys, values = payload['d'], payload['k'], payload['v']
+        except (ValueError, KeyError, TypeError):
+            raise InvalidCursor("Curseur invalide")
+        if direction not in ('n', 'p') or keys != self.ordering or len(values) != len(keys):
+            raise InvalidCursor("Curseur incompatible avec le tri courant")
+        try:
+            values = [self._to_python(key.lstrip('-'), value) for key, value in zip(keys, values)]
+        except Exception:
+            raise InvalidCursor("Curseur invalide")
+        return direction, values
+
+    def _seek(self, ordering, values):
+        """Construit le prédicat (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..."""
+        condition = Q()
+        equal = Q()
+        for key, value in zip(ordering, values):
+            name = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        """Retourne la page suivant (ou précédant) le curseur donné"""
+        direction, values = ('n', None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+
+        ordering = self.ordering
+        if direction == 'p':
+            ordering = [key[1:] if key.startswith('-') else f'-{key}' for key in ordering]
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(ordering, values))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'p':
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = values is not None, has_more
+
+        next_cursor = self.encode_cursor(rows[-1], 'n') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'p') if rows and has_previous else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    @property
+    def count(self):
+        """Nombre total approximatif : mis en cache, calculé seulement si affiché"""
+        key = 'catalog_count:' + hashlib.md5(str(self.queryset.query).encode()).hexdigest()
+        total = cache.get(key)
+        if total is None:
+            total = self.queryset.order_by().count()
+            cache.set(key, total, COUNT_CACHE_TIMEOUT)
+        return total
+
+
+def paginate(request, queryset, per_page=DEFAULT_PER_PAGE):
+    """Pagine un queryset à partir du paramètre GET ``cursor``"""
+    paginator = CursorPaginator(queryset, per_page)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
@@ -0,0 +1,128 @@
+"""
+Règles de prix des personnalisations
+
+Seule source des prix de personnalisation et des totaux de ligne : le prix
+envoyé par le navigateur n'est jamais lu, et les enregistrements
+(``CartItemCustomization``, ``OrderItemCustomization``), l'instantané tarifé
+du panier et la commande passent tous par ces règles.
+
+Chaque option du catalogue (``products.customizations``) est compilée en une
+règle :
+
+- nom/numéro : prix par caractère du texte (espaces compris, comme le texte
+  enregistré ``"MESSI 10"``) ;
+- badge, sponsor : prix fixe.
+
+Les règles sont compilées une fois par révision du catalogue, et les prix
+calculés sont mémorisés pour cette révision : modifier une option (prix,
+création) fait relire le catalogue par tous les processus et tout est
+recalculé au premier accès, sans script de correction. Les promotions produit s'appliquent au prix unitaire
+(``Product.current_price``) dans ``price_line``.
+"""
+
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+
+from . import customizations as catalog
+
+# Types d'options facturés au caractère
+PER_CHARACTER_TYPES = frozenset({'name'})
+
+_lock = threading.Lock()
+_state = {'version': None, 'rules': {}, 'prices': {}}
+
+
+def _compile(option):
+    """Règle ``(longueur du texte, quantité) -> prix`` d'une option"""
+    unit_price = Decimal(option.price)
+    if option.customization_type in PER_CHARACTER_TYPES:
+        def rule(length, quantity):
+            # Sans texte, l'option est facturée comme un caractère (prix fixe)
+            return unit_price * (length or 1) * quantity
+    else:
+        def rule(length, quantity):
+            return unit_price * quantity
+    return rule
+
+
+def _rules():
+    """Règles compilées pour la version courante du catalogue"""
+    by_id, version = catalog.options()
+    if _state['version'] != version:
+        with _lock:
+            _state.update(
+                rules={option_id: _compile(option) for option_id, option in by_id.items()},
+                prices={},
+                version=version,
+            )
+    return _state
+
+
+def _price(state, option_id, custom_text, quantity):
+    # Le prix ne dépend que de la longueur du texte : le cache reste petit
+    key = (option_id, len(custom_text or ''), quantity)
+    prices = state['prices']
+    price = prices.get(key)
+    if price is None:
+        price = prices[key] = state['rules'][option_id](key[1], quantity)
+    return price
+
+
+def price_customizations(customizations):
+    """
+    Prix de chaque personnalisation d'une ligne, évaluées en une passe.
+
+    ``customizations`` : objets portant ``customization_id``,
+    ``custom_text`` et ``quantity`` (personnalisations de panier ou de commande).
+    """
+    customizations = list(customizations)
+    state = _rules()
+    if any(custom.customization_id not in state['rules'] for custom in customizations):
+        # Option créée depuis le chargement du catalogue : il est relu
+        for custom in customizations:
+            if catalog.get_option(custom.customization_id) is None:
+                raise KeyError(f"Option de personnalisation inconnue : {custom.customization_id}")
+        state = _rules()
+    return tuple(
+        _price(state, custom.customization_id, custom.custom_text, custom.quantity)
+        for custom in customizations
+    )
+
+
+def customization_price(option, custom_text='', quantity=1):
+    """Prix d'une personnalisation isolée"""
+    state = _rules()
+    if option.id not in state['rules']:
+        catalog.get_option(option.id)
+        state = _rules()
+    return _price(state, option.id, custom_text, quantity)
+
+
+@dataclass(frozen=True)
+class LinePrice:
+    """Prix d'une ligne : base (prix unitaire × quantité) et personnalisations"""
+    unit_price: Decimal
+    quantity: int
+    customization_prices: tuple
+
+    @property
+    def base_price(self):
+        return self.unit_price * self.quantity
+
+    @property
+    def customization_price(self):
+        return sum(self.customization_prices, Decimal('0'))
+
+    @property
+    def total_price(self):
+        return self.base_price + self.customization_price
+
+
+def price_line(product, quantity, customizations=()):
+    """Prix d'une ligne au prix courant du produit (promotion comprise)"""
+    return LinePrice(
+        unit_price=product.current_price,
+        quantity=quantity,
+        customization_prices=price_customizations(customizations),
+    )
@@ -0,0 +1,80 @@
+"""
+Signaux du catalogue : maintien des colonnes dénormalisées des produits
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, JerseyCustomization, Product, ProductImage, Review, Team
+from . import customizations, search
+from .cache import bump_catalog_version_on_commit
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, **kwargs):
+    """Applique le delta de note au produit lors de la création/modification d'un avis"""
+    if created:
+        Product.apply_rating_delta(instance.product_id, instance.rating, 1)
+        return
+
+    previous_rating = getattr(instance, '_loaded_rating', None)
+    if previous_rating is None:
+        # Instance non chargée depuis la base : recalcul complet du produit
+        Product.rebuild_rating_aggregates(Product.objects.filter(pk=instance.product_id))
+    elif previous_rating != instance.rating:
+        Product.apply_rating_delta(instance.product_id, instance.rating - previous_rating, 0)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    """Retire la note d'un avis supprimé (y compris les suppressions en cascade)"""
+    rating = getattr(instance, '_loaded_rating', None) or instance.rating
+    Product.apply_rating_delta(instance.product_id, -rating, -1)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    """Met à jour l'entrée du produit dans l'index de recherche"""
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    """Retire un produit supprimé de l'index de recherche"""
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Team)
+def reindex_team_products(sender, instance, created, **kwargs):
+    """Le nom de l'équipe fait partie du document indexé de ses produits"""
+    if not created:
+        search.index_products(Product.objects.filter(team=instance).values('id'))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    """Le nom de la catégorie fait partie du document indexé de ses produits"""
+    if not created:
+        search.index_products(Product.objects.filter(category=instance).values('id'))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_catalog_version_on_change(sender, **kwargs):
+    """Invalide les caches dépendant du catalogue (facettes, comptages, page d'accueil, ETag...)"""
+    bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=JerseyCustomization)
+@receiver(post_delete, sender=JerseyCustomization)
+def invalidate_customization_options(sender, **kwargs):
+    """Fait recharger le catalogue des options par tous les processus, après validation"""
+    transaction.on_commit(customizations.invalidate)
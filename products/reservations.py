@@ -0,0 +1,178 @@
+"""
+Réservations de stock pendant le passage en caisse
+
+Chaque variante tient un compteur ``reserved`` à côté de son ``stock`` : le
+disponible est ``stock - reserved``, lu en une requête sur l'index
+``(produit, taille)``. Les tailles d'un produit partagent aussi son stock
+global : le produit tient de même un compteur ``reserved_quantity``, et le
+disponible d'une taille est borné par ``stock_quantity - reserved_quantity``.
+
+Réserver est un ``UPDATE`` conditionnel sur le produit
+(``reserved_quantity + quantité <= stock_quantity``) puis sur la variante
+(``reserved + quantité <= stock``) : la base sérialise les acheteurs
+concurrents sur la ligne du produit, toutes tailles confondues, sans verrou
+de table ni lecture préalable, et aucune réservation ne peut dépasser le
+stock de la taille ni celui du produit.
+
+Cycle de vie :
+
+- ``reserve_cart`` à l'ouverture de la caisse (les réservations précédentes
+  du même panier sont d'abord libérées) ;
+- ``commit_cart`` à la création de la commande : le stock est décrémenté et
+  les réservations supprimées ;
+- ``release_expired`` (``python manage.py release_reservations``) libère
+  périodiquement les réservations expirées. Une réservation refusée libère
+  aussi, avant de conclure, les réservations expirées du produit.
+
+Les sorties de stock elles-mêmes sont des mises à jour groupées (voir
+``stock``).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Product, ProductVariant, StockMovement, StockReservation
+from .stock import amounts, totals, update_stock
+
+# Durée de validité d'une réservation (minutes)
+RESERVATION_TTL_MINUTES = getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 15)
+
+BATCH_SIZE = 500
+
+
+class InsufficientStock(ValueError):
+    """Stock disponible insuffisant pour une ligne du panier"""
+
+    def __init__(self, product_name, size):
+        super().__init__(f"Stock insuffisant pour {product_name} (taille {size}).")
+        self.product_name = product_name
+        self.size = size
+
+
+def _decrement_reserved(by_variant, by_product):
+    """Retire les quantités données des compteurs de réservations (une requête par table)"""
+    if not by_variant:
+        return
+    ProductVariant.objects.filter(pk__in=list(by_variant)).update(
+        reserved=Greatest(F('reserved') - amounts(by_variant), Value(0))
+    )
+    Product.objects.filter(pk__in=list(by_product)).update(
+        reserved_quantity=Greatest(F('reserved_quantity') - amounts(by_product), Value(0))
+    )
+
+
+def release(reservations):
+    """Supprime des réservations et rend leurs quantités au disponible"""
+    rows = list(reservations.values_list('id', 'variant_id', 'variant__product_id', 'quantity'))
+    if not rows:
+        return 0
+    with transaction.atomic():
+        _decrement_reserved(
+            totals((variant_id, quantity) for _id, variant_id, _product_id, quantity in rows),
+            totals((product_id, quantity) for _id, _variant_id, product_id, quantity in rows),
+        )
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def release_cart(cart_id):
+    """Libère les réservations d'un panier"""
+    return release(StockReservation.objects.filter(cart_id=cart_id))
+
+
+def release_expired(batch_size=BATCH_SIZE, product_ids=None):
+    """Libère par lots les réservations expirées ; retourne leur nombre"""
+    expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+    if product_ids is not None:
+        expired = expired.filter(variant__product_id__in=product_ids)
+    released = 0
+    while True:
+        batch = list(expired.order_by('expires_at').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return released
+        released += release(StockReservation.objects.filter(id__in=batch))
+
+
+def _variants(lines):
+    """Variantes des lignes ``(produit, taille, quantité)``, en une requête"""
+    condition = Q()
+    for product_id, size, _quantity in lines:
+        condition |= Q(product_id=product_id, size=size)
+    return {
+        (variant.product_id, variant.size): variant
+        for variant in ProductVariant.objects.filter(condition).select_related('product')
+    }
+
+
+def _reserve_variant(variant, quantity):
+    """
+    Incréments conditionnels des compteurs du produit puis de la variante :
+    False (et aucun compteur modifié) si le disponible de l'un ne suffit pas
+    """
+    products = Product.objects.filter(pk=variant.product_id)
+    if not products.filter(stock_quantity__gte=F('reserved_quantity') + quantity).update(
+        reserved_quantity=F('reserved_quantity') + quantity
+    ):
+        return False
+    if ProductVariant.objects.filter(pk=variant.pk, stock__gte=F('reserved') + quantity).update(
+        reserved=F('reserved') + quantity
+    ):
+        return True
+    products.update(reserved_quantity=F('reserved_quantity') - quantity)
+    return False
+
+
+def reserve_cart(cart_id, lines, ttl_minutes=RESERVATION_TTL_MINUTES):
+    """
+    Réserve les lignes ``(produit, taille, quantité)`` d'un panier.
+
+    Tout ou rien : lève ``InsufficientStock`` (et n'en garde aucune) si une
+    ligne ne peut pas être réservée. Retourne la date d'expiration.
+    """
+    lines = [line for line in lines if line[2] > 0]
+    expires_at = timezone.now() + timedelta(minutes=ttl_minutes)
+    with transaction.atomic():
+        release_cart(cart_id)
+        variants = _variants(lines)
+        reservations = []
+        for product_id, size, quantity in lines:
+            variant = variants.get((product_id, size))
+            if variant is None:
+                name = Product.objects.filter(pk=product_id).values_list('name', flat=True).first()
+                raise InsufficientStock(name or product_id, size)
+            if not _reserve_variant(variant, quantity):
+                # Des réservations expirées non encore balayées (toutes tailles) occupent peut-être le stock
+                if not (release_expired(product_ids=[product_id]) and _reserve_variant(variant, quantity)):
+                    raise InsufficientStock(variant.product.name, size)
+            reservations.append(
+                StockReservation(variant=variant, cart_id=cart_id, quantity=quantity, expires_at=expires_at)
+            )
+        StockReservation.objects.bulk_create(reservations)
+    return expires_at
+
+
+def commit_cart(cart_id, lines, order=None):
+    """
+    Transforme les réservations d'un panier en sorties de stock.
+
+    Les lignes sont re-réservées dans la même transaction (le panier a pu
+    changer depuis l'ouverture de la caisse, ou la réservation expirer), puis
+    le stock des variantes et des produits est décrémenté et les réservations
+    supprimées ; les ventes sont journalisées au nom de ``order``. Lève
+    ``InsufficientStock`` si le stock ne suffit plus.
+    """
+    with transaction.atomic():
+        reserve_cart(cart_id, lines)
+        rows = list(StockReservation.objects.filter(cart_id=cart_id).values_list(
+            'id', 'variant_id', 'variant__product_id', 'quantity'
+        ))
+        by_variant = totals((variant_id, quantity) for _id, variant_id, _product_id, quantity in rows)
+        by_product = totals((product_id, quantity) for _id, _variant_id, product_id, quantity in rows)
+        update_stock(by_variant, by_product, -1, StockMovement.SALE, order=order, release_reserved=True)
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+
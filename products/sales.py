@@ -0,0 +1,109 @@
+"""
+Compteurs de ventes des produits
+
+``units_sold`` et ``sales_revenue`` cumulent les articles des commandes
+vendues (payées ou livrées, voir ``orders.transitions.is_sold``) ;
+``popularity_score`` les pondère par la date de la commande, avec une
+demi-vie de ``HALF_LIFE_DAYS`` jours, pour le tri « Meilleures ventes ».
+
+Le score est stocké relativement à une date fixe (``EPOCH``) : une vente
+vaut 2^(temps écoulé depuis EPOCH / demi-vie). Toutes les ventes décroissent
+au même rythme, l'ordre des produits par score décroissant est donc le bon à
+tout instant, sans tâche périodique de décroissance : chaque vente est une
+simple addition faite par la base. ``popularity`` ramène un score à une date
+donnée (une vente du jour vaut alors 1).
+
+Les compteurs sont tenus à jour par le répartiteur de transitions des
+commandes, en une requête par commande quel que soit son nombre d'articles,
+et recalculés depuis les commandes par la commande ``rebuild_sales``. Ils
+changent l'ordre du catalogue : chaque mise à jour incrémente la version du
+catalogue après validation.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, FloatField, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import bump_catalog_version_on_commit
+from .models import Product
+from .stock import amounts, totals
+
+BATCH_SIZE = 500
+
+HALF_LIFE_DAYS = 14
+
+# Origine des scores : à 26 demi-vies par an, les scores restent des
+# flottants exacts pendant plusieurs décennies
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def decay_weight(when=None):
+    """Poids d'une vente faite à la date ``when`` (par défaut maintenant)"""
+    elapsed = (when or timezone.now()) - EPOCH
+    return 2 ** (elapsed.total_seconds() / (HALF_LIFE_DAYS * 86400))
+
+
+def popularity(score, when=None):
+    """Score ramené à la date ``when`` : ventes pondérées, une vente de ce jour valant 1"""
+    return score / decay_weight(when)
+
+
+def record_sales(items, sign=1, when=None):
+    """
+    Ajoute (``sign=1``) ou retire (``sign=-1``) aux compteurs des produits
+    les articles ``items`` (``OrderItem``) d'une commande passée à la date
+    ``when`` (une requête).
+    """
+    items = [item for item in items if item.product_id]
+    if not items:
+        return 0
+    units = totals((item.product_id, sign * item.quantity) for item in items)
+    revenue = totals((item.product_id, sign * item.total_price) for item in items)
+    weight = decay_weight(when)
+    bump_catalog_version_on_commit()
+    return Product.objects.filter(pk__in=list(units)).update(
+        units_sold=Greatest(F('units_sold') + amounts(units), Value(0)),
+        sales_revenue=Greatest(
+            F('sales_revenue') + amounts(revenue, DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0')),
+        ),
+        popularity_score=Greatest(
+            F('popularity_score') + amounts({pk: quantity * weight for pk, quantity in units.items()}, FloatField()),
+            Value(0.0),
+        ),
+    )
+
+
+def rebuild_sales(products=None, batch_size=BATCH_SIZE):
+    """
+    Recalcule entièrement les compteurs de ventes de ``products`` (tous les
+    produits par défaut) à partir des commandes vendues.
+    """
+    from orders.models import OrderItem
+    from orders.transitions import sold_orders
+
+    if products is None:
+        products = Product.objects.all()
+    units, revenue, score = defaultdict(int), defaultdict(Decimal), defaultdict(float)
+    items = OrderItem.objects.filter(sold_orders('order__'), product__in=products).values_list(
+        'product_id', 'quantity', 'total_price', 'order__created_at'
+    )
+    for product_id, quantity, total_price, created_at in items.iterator():
+        units[product_id] += quantity
+        revenue[product_id] += total_price
+        score[product_id] += quantity * decay_weight(created_at)
+
+    updated = 0
+    ids = list(products.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        batch = [
+            Product(pk=pk, units_sold=units[pk], sales_revenue=revenue[pk], popularity_score=score[pk])
+            for pk in ids[start:start + batch_size]
+        ]
+        Product.objects.bulk_update(batch, ['units_sold', 'sales_revenue', 'popularity_score'])
+        updated += len(batch)
+    return updated
@@ -0,0 +1,275 @@
+"""
+Moteur de recherche plein texte des produits
+
+Le texte indexé (nom, équipe, catégorie, description) est normalisé sans
+accents, de sorte que « equipe » trouve « Équipe ».
+
+- SQLite : table virtuelle FTS5 ``products_search_fts`` (rowid = id du produit)
+- PostgreSQL : table ``products_search_index`` (tsvector français + index GIN)
+- Autres bases : repli sur les filtres ``icontains``
+
+L'index est maintenu par les signaux de ``products.receivers`` et peut être
+reconstruit avec ``python manage.py rebuild_search_index``.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_search_fts'
+PG_TABLE = 'products_search_index'
+
+# Limite le nombre de termes pour éviter des requêtes MATCH démesurées
+MAX_TOKENS = 8
+
+# Nombre de documents écrits par lot lors d'une (ré)indexation
+INDEX_BATCH_SIZE = 500
+
+INDEX_FIELDS = ('id', 'name', 'team__name', 'category__name', 'description')
+
+
+def normalize_text(text):
+    """Met en minuscules et retire les accents (É -> e, ç -> c)"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(query):
+    """Découpe une requête utilisateur en termes normalisés"""
+    return re.findall(r'\w+', normalize_text(query))[:MAX_TOKENS]
+
+
+def build_document(row):
+    """Construit le document indexé à partir d'une ligne ``values(*INDEX_FIELDS)``"""
+    return (
+        row['id'],
+        normalize_text(row['name']),
+        normalize_text(row['team__name']),
+        normalize_text(row['category__name']),
+        normalize_text(row['description']),
+    )
+
+
+class FallbackSearchBackend:
+    """Recherche sans index : filtres icontains (comportement historique)"""
+
+    def is_available(self):
+        return False
+
+    def create_index(self, cursor):
+        pass
+
+    def drop_index(self, cursor):
+        pass
+
+    def upsert(self, documents):
+        pass
+
+    def delete(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def filter(self, queryset, query, tokens):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(team__name__icontains=query) |
+            Q(category__name__icontains=query)
+        )
+
+
+class SQLiteSearchBackend(FallbackSearchBackend):
+    """Index FTS5 avec tokeniseur unicode61 sans diacritiques"""
+
+    # None : présence de la table pas encore vérifiée dans ce processus
+    _available = None
+
+    def is_available(self):
+        if self._available is None:
+            self._available = FTS_TABLE in connection.introspection.table_names()
+        return self._available
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, team, category, description, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        # Pondération bm25 : nom > équipe = catégorie > description
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 4.0, 4.0, 1.0)')"
+        )
+        self._available = True
+
+    def drop_index(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        self._available = False
+
+    def upsert(self, documents):
+        if not documents or not self.is_available():
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, [doc[0] for doc in documents])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, team, category, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+
+    def delete(self, product_ids):
+        if product_ids and self.is_available():
+            with connection.cursor() as cursor:
+                self._delete(cursor, product_ids)
+
+    def clear(self):
+        if self.is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def _delete(self, cursor, product_ids):
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", list(product_ids))
+
+    def filter(self, queryset, query, tokens):
+        if not self.is_available():
+            return super().filter(queryset, query, tokens)
+        # Recherche par préfixe sur chaque terme (saisie au fil de la frappe)
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        table = queryset.model._meta.db_table
+        # Jointure sur l'index : la recherche MATCH n'est évaluée qu'une fois pour toute la page
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+        ).annotate(
+            search_rank=RawSQL(f"{FTS_TABLE}.rank", [])
+        ).order_by('search_rank', '-created_at')
+
+
+class PostgreSQLSearchBackend(FallbackSearchBackend):
+    """Index tsvector (configuration french) avec index GIN"""
+
+    DOCUMENT_SQL = (
+        "setweight(to_tsvector('french', %s), 'A') || "
+        "setweight(to_tsvector('french', %s), 'B') || "
+        "setweight(to_tsvector('french', %s), 'B') || "
+        "setweight(to_tsvector('french', %s), 'D')"
+    )
+
+    # None : présence de la table pas encore vérifiée dans ce processus
+    _available = None
+
+    def is_available(self):
+        if self._available is None:
+            self._available = PG_TABLE in connection.introspection.table_names()
+        return self._available
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+            "product_id bigint PRIMARY KEY REFERENCES products_product(id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_document_gin ON {PG_TABLE} USING GIN (document)"
+        )
+        self._available = True
+
+    def drop_index(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {PG_TABLE}")
+        self._available = False
+
+    def upsert(self, documents):
+        if not documents or not self.is_available():
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE} (product_id, document) VALUES (%s, {self.DOCUMENT_SQL}) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                documents,
+            )
+
+    def delete(self, product_ids):
+        if product_ids and self.is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {PG_TABLE} WHERE product_id = ANY(%s)", [list(product_ids)])
+
+    def clear(self):
+        if self.is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {PG_TABLE}")
+
+    def filter(self, queryset, query, tokens):
+        if not self.is_available():
+            return super().filter(queryset, query, tokens)
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        table = queryset.model._meta.db_table
+        # Jointure sur l'index : le document n'est lu qu'une fois par produit trouvé
+        return queryset.extra(
+            tables=[PG_TABLE],
+            where=[f"{PG_TABLE}.product_id = {table}.id", f"{PG_TABLE}.document @@ to_tsquery('french', %s)"],
+            params=[tsquery],
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank({PG_TABLE}.document, to_tsquery('french', %s))", [tsquery])
+        ).order_by('-search_rank', '-created_at')
+
+
+_BACKENDS = {
+    'sqlite': SQLiteSearchBackend(),
+    'postgresql': PostgreSQLSearchBackend(),
+}
+_FALLBACK = FallbackSearchBackend()
+
+
+def get_backend(vendor=None):
+    """Retourne le backend de recherche adapté à la base de données"""
+    return _BACKENDS.get(vendor or connection.vendor, _FALLBACK)
+
+
+def search_products(queryset, query):
+    """Filtre et trie un queryset de produits par pertinence"""
+    query = (query or '').strip()
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    return get_backend().filter(queryset, query, tokens)
+
+
+def index_products(product_ids=None):
+    """(Ré)indexe les produits donnés, ou tout le catalogue si ``product_ids`` est None"""
+    from .models import Product
+
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    backend = get_backend()
+    batch = []
+    indexed = 0
+    for row in products.values(*INDEX_FIELDS).iterator(chunk_size=INDEX_BATCH_SIZE):
+        batch.append(build_document(row))
+        if len(batch) >= INDEX_BATCH_SIZE:
+            backend.upsert(batch)
+            indexed += len(batch)
+            batch = []
+    backend.upsert(batch)
+    return indexed + len(batch)
+
+
+def remove_products(product_ids):
+    """Retire des produits de l'index"""
+    get_backend().delete(list(product_ids))
+
+
+def rebuild_index():
+    """Vide puis reconstruit entièrement l'index"""
+    with transaction.atomic():
+        get_backend().clear()
+        return index_products()
@@ -0,0 +1,182 @@
+"""
+Produits similaires précalculés
+
+Le score d'un voisin combine deux signaux :
+
+- les achats conjoints (paires de produits présentes dans une même commande),
+  cumulés dans ``CoPurchase`` au fil des exécutions ;
+- la proximité catalogue (même équipe, même catégorie).
+
+Les ``TOP_N`` meilleurs voisins de chaque produit sont stockés dans
+``SimilarProduct`` et lus par ``product_detail`` en une requête indexée.
+
+Chaque exécution ne lit que les commandes postérieures à la précédente
+(``SimilarityRun.last_order_id``) et ne recalcule que les produits concernés :
+``python manage.py build_similar_products`` (``--full`` pour tout reprendre).
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from itertools import groupby, permutations
+
+from django.db import transaction
+
+from .models import CoPurchase, Product, SimilarProduct, SimilarityRun
+
+TOP_N = 8
+
+CO_PURCHASE_WEIGHT = 3.0
+TEAM_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+
+# Candidats « catalogue » retenus par équipe et par catégorie (mieux notés d'abord)
+CANDIDATES_PER_GROUP = 50
+
+BATCH_SIZE = 500
+
+# Commandes ignorées pour les achats conjoints
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'refunded')
+
+
+def collect_co_purchases(after_order_id=0):
+    """
+    Compte les paires de produits achetées ensemble dans les commandes
+    d'id supérieur à ``after_order_id``.
+
+    Retourne ``(paires, dernier id de commande lu, nombre de commandes)``.
+    """
+    from orders.models import OrderItem
+
+    items = (
+        OrderItem.objects.filter(order_id__gt=after_order_id)
+        .exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+    )
+    pairs = Counter()
+    last_order_id = after_order_id
+    orders = 0
+    for order_id, rows in groupby(items.iterator(chunk_size=BATCH_SIZE), key=lambda row: row[0]):
+        product_ids = sorted({product_id for _order_id, product_id in rows})
+        pairs.update(permutations(product_ids, 2))
+        last_order_id = order_id
+        orders += 1
+    return pairs, last_order_id, orders
+
+
+def store_co_purchases(pairs):
+    """Ajoute les compteurs aux paires existantes et crée les nouvelles"""
+    if not pairs:
+        return
+    existing = {
+        (row.product_id, row.other_id): row
+        for row in CoPurchase.objects.filter(product_id__in={product_id for product_id, _other in pairs})
+    }
+    to_create, to_update = [], []
+    for (product_id, other_id), count in pairs.items():
+        row = existing.get((product_id, other_id))
+        if row is None:
+            to_create.append(CoPurchase(product_id=product_id, other_id=other_id, count=count))
+        else:
+            row.count += count
+            to_update.append(row)
+    CoPurchase.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    CoPurchase.objects.bulk_update(to_update, ['count'], batch_size=BATCH_SIZE)
+
+
+def _load_catalog():
+    """Produits actifs triés par popularité : {id: (équipe, catégorie, position)}"""
+    rows = Product.objects.filter(is_active=True).order_by('-rating_avg', '-created_at', '-id').values_list(
+        'id', 'team_id', 'category_id'
+    )
+    catalog = {}
+    by_team = defaultdict(list)
+    by_category = defaultdict(list)
+    for position, (product_id, team_id, category_id) in enumerate(rows.iterator(chunk_size=BATCH_SIZE)):
+        catalog[product_id] = (team_id, category_id, position)
+        if len(by_team[team_id]) < CANDIDATES_PER_GROUP:
+            by_team[team_id].append(product_id)
+        if len(by_category[category_id]) < CANDIDATES_PER_GROUP:
+            by_category[category_id].append(product_id)
+    return catalog, by_team, by_category
+
+
+def rank_neighbours(product_id, catalog, by_team, by_category, co_counts, top_n=TOP_N):
+    """Retourne les ``top_n`` voisins ``(id, score)`` d'un produit, du plus proche au plus lointain"""
+    team_id, category_id, _position = catalog[product_id]
+    candidates = set(by_team[team_id]) | set(by_category[category_id]) | set(co_counts)
+    candidates.discard(product_id)
+
+    scored = []
+    for other_id in candidates:
+        if other_id not in catalog:
+            continue
+        other_team, other_category, position = catalog[other_id]
+        score = (
+            CO_PURCHASE_WEIGHT * co_counts.get(other_id, 0)
+            + TEAM_WEIGHT * (other_team == team_id)
+            + CATEGORY_WEIGHT * (other_category == category_id)
+        )
+        # À score égal, le produit le plus populaire passe devant (ordre déterministe)
+        scored.append((-score, position, other_id))
+    return [(other_id, -score) for score, _position, other_id in heapq.nsmallest(top_n, scored)]
+
+
+def store_neighbours(product_ids=None, top_n=TOP_N):
+    """Recalcule et enregistre les voisins des produits donnés (tous si None)"""
+    catalog, by_team, by_category = _load_catalog()
+    targets = list(catalog) if product_ids is None else list(product_ids)
+
+    for start in range(0, len(targets), BATCH_SIZE):
+        chunk = targets[start:start + BATCH_SIZE]
+        co_counts = defaultdict(dict)
+        for product_id, other_id, count in CoPurchase.objects.filter(product_id__in=chunk).values_list(
+            'product_id', 'other_id', 'count'
+        ):
+            co_counts[product_id][other_id] = count
+
+        rows = []
+        for product_id in chunk:
+            if product_id not in catalog:
+                continue
+            neighbours = rank_neighbours(product_id, catalog, by_team, by_category, co_counts[product_id], top_n)
+            rows.extend(
+                SimilarProduct(product_id=product_id, similar_id=other_id, rank=rank, score=score)
+                for rank, (other_id, score) in enumerate(neighbours, start=1)
+            )
+        SimilarProduct.objects.filter(product_id__in=chunk).delete()
+        SimilarProduct.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(targets)
+
+
+def build_similar_products(full=False, top_n=TOP_N):
+    """
+    Traite les commandes depuis la dernière exécution puis recalcule les
+    voisins des produits concernés (et des produits qui n'en ont pas encore).
+
+    ``full=True`` repart de zéro : tout l'historique et tout le catalogue.
+    """
+    previous = SimilarityRun.objects.order_by('-id').first()
+    after_order_id = 0 if full or previous is None else previous.last_order_id
+
+    with transaction.atomic():
+        if full:
+            CoPurchase.objects.all().delete()
+        pairs, last_order_id, orders = collect_co_purchases(after_order_id)
+        store_co_purchases(pairs)
+
+        if full:
+            targets = None
+        else:
+            targets = {product_id for pair in pairs for product_id in pair}
+            targets.update(
+                Product.objects.filter(is_active=True, neighbours__isnull=True).values_list('id', flat=True)
+            )
+        updated = store_neighbours(targets, top_n)
+
+        return SimilarityRun.objects.create(
+            last_order_id=last_order_id,
+            orders_processed=orders,
+            products_updated=updated,
+            full_rebuild=full,
+        )
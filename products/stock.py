@@ -0,0 +1,172 @@
+"""
+Mouvements de stock groupés
+
+Toutes les sorties et remises en stock liées aux commandes (création,
+annulation, réactivation) passent par ``update_stock`` : une instruction
+``UPDATE ... SET stock = stock ± n`` par table (variantes, produits) pour
+toutes les lignes d'une commande, calculée par la base (``F()``, borné à 0
+par ``Greatest``). Pas de lecture-modification-écriture en Python, donc pas
+de mise à jour perdue entre commandes concurrentes, et pas de
+``Product.save()`` ni de signal par produit.
+
+Dans le même ``UPDATE`` :
+
+- un produit dont le stock tombe à 0 est désactivé ; un produit inactif en
+  rupture redevient actif quand du stock lui est rendu ;
+- les lignes modifiées sont renvoyées (``RETURNING``) : les alertes de stock
+  faible sont déduites de ces lignes, sans relire les produits, et envoyées
+  après validation de la transaction ;
+- un produit qui tombe en rupture ou en sort (et change donc de visibilité)
+  incrémente la version du catalogue après validation, comme le ferait son
+  ``post_save`` : ETag, facettes et rails de l'accueil sont recalculés. Les
+  autres mouvements ne la changent pas : les pages du catalogue n'affichent
+  que « en stock » ou « rupture », jamais la quantité exacte.
+
+Chaque mouvement est aussi ajouté au journal de stock (``ledger``), dans la
+même transaction.
+"""
+
+from collections import defaultdict
+
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.sql import UpdateQuery
+
+from . import ledger
+from .cache import bump_catalog_version_on_commit
+from .models import Product, ProductVariant, StockMovement
+
+# Seuil des alertes de stock faible
+LOW_STOCK_THRESHOLD = 5
+
+
+def crosses_low_stock(before, after):
+    """Le stock vient de passer sous le seuil d'alerte"""
+    return before > LOW_STOCK_THRESHOLD >= after
+
+
+def totals(rows):
+    """Additionne des ``(clé, quantité)`` par clé"""
+    result = defaultdict(int)
+    for key, quantity in rows:
+        result[key] += quantity
+    return result
+
+
+def amounts(by_pk, output_field=None):
+    """Quantité propre à chaque ligne mise à jour (``CASE pk WHEN ...``)"""
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in by_pk.items()],
+        output_field=output_field or IntegerField(),
+    )
+
+
+def update_returning(queryset, returning, **changes):
+    """``queryset.update(**changes)`` qui renvoie les colonnes ``returning`` des lignes modifiées"""
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(changes)
+    compiler = query.get_compiler(queryset.db)
+    compiler.pre_sql_setup()
+    sql, params = compiler.as_sql()
+    connection = connections[queryset.db]
+    columns = ', '.join(
+        connection.ops.quote_name(queryset.model._meta.get_field(name).column) for name in returning
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} RETURNING {columns}", params)
+        return cursor.fetchall()
+
+
+def update_stock(by_variant, by_product, sign, kind, order=None, release_reserved=False):
+    """
+    Ajoute (``sign=1``) ou retire (``sign=-1``) des quantités au stock des
+    variantes et des produits : une requête par table, plus l'ajout au
+    journal (mouvement de type ``kind``, rattaché à ``order``).
+
+    ``release_reserved`` retire aussi les quantités des compteurs de
+    réservations des variantes et des produits (sortie de stock d'un panier
+    réservé).
+    Retourne les lignes ``(id produit, nouveau stock)``.
+    """
+    if not by_product:
+        return []
+    with transaction.atomic():
+        if by_variant:
+            changes = {'stock': Greatest(F('stock') + sign * amounts(by_variant), Value(0))}
+            if release_reserved:
+                changes['reserved'] = Greatest(F('reserved') - amounts(by_variant), Value(0))
+            ProductVariant.objects.filter(pk__in=list(by_variant)).update(**changes)
+
+        new_stock = Greatest(F('stock_quantity') + sign * amounts(by_product), Value(0))
+        if sign < 0:
+            # Rupture : le produit est retiré de la vente dans la même instruction
+            is_active = Case(
+                When(stock_quantity__lte=amounts(by_product), then=Value(False)), default=F('is_active')
+            )
+        else:
+            is_active = Case(When(stock_quantity=0, is_active=False, then=Value(True)), default=F('is_active'))
+        changes = {'stock_quantity': new_stock, 'is_active': is_active}
+        if release_reserved:
+            changes['reserved_quantity'] = Greatest(F('reserved_quantity') - amounts(by_product), Value(0))
+        rows = update_returning(
+            Product.objects.filter(pk__in=list(by_product)), ['id', 'stock_quantity'], **changes
+        )
+        ledger.record(kind, by_product, sign, order=order)
+
+    # RETURNING donne le nouveau stock : l'ancien s'en déduit (une rupture bornée à 0 compte comme un franchissement)
+    low = {
+        product_id: stock
+        for product_id, stock in rows
+        if sign < 0 and crosses_low_stock(stock + by_product[product_id], stock)
+    }
+    if low:
+        transaction.on_commit(lambda: send_low_stock_alerts(low))
+    # Rupture (stock à 0 après un retrait) ou retour en stock (stock à 0 avant une remise)
+    if any(stock == 0 if sign < 0 else stock <= by_product[product_id] for product_id, stock in rows):
+        bump_catalog_version_on_commit()
+    return rows
+
+
+def send_low_stock_alerts(stocks):
+    """Alertes de stock faible pour ``{id produit: stock}``"""
+    from notifications.email_service import get_email_service
+
+    service = get_email_service()
+    for product in Product.objects.filter(pk__in=list(stocks)).select_related('category'):
+        service.send_stock_alert(product, stocks[product.pk])
+
+
+def _variant_ids(lines):
+    """Ids des variantes des lignes ``(produit, taille, quantité)``, en une requête"""
+    condition = Q()
+    for product_id, size, _quantity in lines:
+        condition |= Q(product_id=product_id, size=size)
+    return {
+        (product_id, size): pk
+        for pk, product_id, size in ProductVariant.objects.filter(condition).values_list('id', 'product_id', 'size')
+    }
+
+
+def _adjust_lines(lines, sign, kind, order):
+    lines = [line for line in lines if line[2] > 0]
+    if not lines:
+        return []
+    variants = _variant_ids(lines)
+    by_variant = totals(
+        (variants[(product_id, size)], quantity)
+        for product_id, size, quantity in lines
+        if (product_id, size) in variants
+    )
+    by_product = totals((product_id, quantity) for product_id, _size, quantity in lines)
+    return update_stock(by_variant, by_product, sign, kind, order=order)
+
+
+def restore_stock(lines, order=None):
+    """Remet en stock des lignes ``(produit, taille, quantité)`` (commande annulée)"""
+    return _adjust_lines(lines, 1, StockMovement.CANCELLATION, order)
+
+
+def withdraw_stock(lines, order=None):
+    """Retire du stock des lignes ``(produit, taille, quantité)`` (commande réactivée)"""
+    return _adjust_lines(lines, -1, StockMovement.SALE, order)
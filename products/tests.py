@@ -1,3 +1,878 @@
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from cart.models import Cart as CartModel
+from .facets import get_facets
+from .filters import ProductFilter
+from orders.models import Order, OrderItem
+from .ledger import StockSnapshotter, ledger_stock, stock_history
+from .models import (
+    Category, CoPurchase, Team, Product, ProductVariant, Review, StockMovement, StockReservation, StockSnapshot
+)
+from .pagination import CursorPaginator, InvalidCursor
+from .reservations import InsufficientStock, commit_cart, reserve_cart
+from .sales import popularity
+from .search import SQLiteSearchBackend, search_products
+from .similarity import build_similar_products
+from .stock import restore_stock, withdraw_stock
 
-# Create your tests here.
+
+class RatingAggregateTest(TestCase):
+    """Tests des agrégats de notes dénormalisés"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Maillots Domicile")
+        self.team = Team.objects.create(name="ASEC Mimosas", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot ASEC Domicile",
+            category=self.category,
+            team=self.team,
+            description="Maillot officiel",
+            price=Decimal('15000'),
+            available_sizes=['M', 'L'],
+            stock_quantity=10
+        )
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+
+    def test_review_create_edit_delete(self):
+        """Les agrégats suivent la création, la modification et la suppression"""
+        review = Review.objects.create(product=self.product, user=self.alice, rating=5, comment="Top")
+        Review.objects.create(product=self.product, user=self.bob, rating=2, comment="Bof")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 7)
+        self.assertEqual(self.product.total_reviews, 2)
+        self.assertEqual(self.product.average_rating, 3.5)
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 3
+        review.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 5)
+        self.assertEqual(self.product.average_rating, 2.5)
+
+        Review.objects.filter(user=self.bob).delete()
+        review.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 0)
+        self.assertEqual(self.product.average_rating, 0.0)
+
+    def test_average_rating_without_query(self):
+        """average_rating ne déclenche plus de requête d'agrégation"""
+        Review.objects.create(product=self.product, user=self.alice, rating=4, comment="Bien")
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(product.average_rating, 4.0)
+            self.assertEqual(product.total_reviews, 1)
+
+    def test_rebuild_rating_aggregates(self):
+        """La reconstruction corrige des agrégats incohérents"""
+        Review.objects.create(product=self.product, user=self.alice, rating=4, comment="Bien")
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=0, rating_count=0, rating_avg=0)
+        Product.rebuild_rating_aggregates()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 4)
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, 4.0)
+
+
+class ProductSearchTest(TestCase):
+    """Tests du moteur de recherche plein texte"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Maillots Extérieur")
+        self.team = Team.objects.create(name="Équipe de France", country="France")
+        self.other_team = Team.objects.create(name="Real Madrid", country="Espagne")
+        self.france = Product.objects.create(
+            name="Maillot Bleu 2024",
+            category=self.category,
+            team=self.team,
+            description="Maillot officiel",
+            price=Decimal('20000'),
+            available_sizes=['M'],
+            stock_quantity=5
+        )
+        self.madrid = Product.objects.create(
+            name="Maillot Real Madrid",
+            category=self.category,
+            team=self.other_team,
+            description="Tenue blanche, idéale pour supporter l'équipe",
+            price=Decimal('20000'),
+            available_sizes=['M'],
+            stock_quantity=5
+        )
+
+    def test_accent_insensitive_search(self):
+        """« equipe » trouve « Équipe » et le nom d'équipe passe avant la description"""
+        results = list(search_products(Product.objects.all(), 'equipe'))
+        self.assertEqual(results, [self.france, self.madrid])
+
+    def test_prefix_search(self):
+        """Les termes partiels correspondent par préfixe"""
+        results = list(search_products(Product.objects.all(), 'mad'))
+        self.assertEqual(results, [self.madrid])
+
+    def test_index_follows_team_rename(self):
+        """Renommer une équipe réindexe ses produits"""
+        self.other_team.name = "Atlético"
+        self.other_team.save()
+        results = list(search_products(Product.objects.all(), 'atletico'))
+        self.assertEqual(results, [self.madrid])
+
+    def test_deleted_product_not_found(self):
+        """Un produit supprimé disparaît de l'index"""
+        self.france.delete()
+        results = list(search_products(Product.objects.all(), 'bleu'))
+        self.assertEqual(results, [])
+
+    def test_filter_name_uses_search(self):
+        """ProductFilter.name s'appuie sur le moteur de recherche"""
+        product_filter = ProductFilter({'name': 'Équipe France'}, queryset=Product.objects.all())
+        self.assertEqual(list(product_filter.qs), [self.france])
+
+    def test_index_joined_once(self):
+        """La recherche plein texte n'est évaluée qu'une fois, y compris en pagination"""
+        queryset = search_products(Product.objects.all(), 'maillot')
+        with CaptureQueriesContext(connection) as queries:
+            first = CursorPaginator(queryset, per_page=1).page()
+        self.assertEqual(queries[0]['sql'].count('MATCH'), 1)
+        second = CursorPaginator(queryset, per_page=1).page(first.next_cursor)
+        self.assertEqual({first[0], second[0]}, {self.france, self.madrid})
+
+    def test_missing_index_checked_once(self):
+        """Sans index, la présence de la table n'est vérifiée qu'une fois par processus"""
+        backend = SQLiteSearchBackend()
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]) as table_names:
+            self.assertFalse(backend.is_available())
+            self.assertFalse(backend.is_available())
+        self.assertEqual(table_names.call_count, 1)
+
+
+class CursorPaginationTest(TestCase):
+    """Tests de la pagination par curseur"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Maillots Domicile")
+        team = Team.objects.create(name="Africa Sports", country="Côte d'Ivoire")
+        self.products = [
+            Product.objects.create(
+                name=f"Maillot {i}",
+                category=category,
+                team=team,
+                description="Maillot",
+                price=Decimal('10000'),
+                available_sizes=['M'],
+                stock_quantity=5,
+                rating_avg=i % 3,
+            )
+            for i in range(25)
+        ]
+
+    def test_walk_forward_and_back(self):
+        """Parcourt toutes les pages dans les deux sens sans doublon"""
+        paginator = CursorPaginator(Product.objects.all(), per_page=10)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, list(Product.objects.order_by('-created_at', '-pk')))
+        self.assertEqual(len(page), 5)
+
+        previous = paginator.page(page.previous_cursor)
+        self.assertEqual(list(previous), seen[10:20])
+        self.assertTrue(previous.has_previous())
+        self.assertTrue(previous.has_next())
+
+    def test_custom_sort_key(self):
+        """Le tri par note est paginé avec l'id comme départage"""
+        paginator = CursorPaginator(Product.objects.order_by('-rating_avg'), per_page=7)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, list(Product.objects.order_by('-rating_avg', '-pk')))
+
+    def test_invalid_cursor(self):
+        """Un curseur illisible est rejeté, la vue retombe sur la première page"""
+        paginator = CursorPaginator(Product.objects.all())
+        with self.assertRaises(InvalidCursor):
+            paginator.page('pas-un-curseur')
+        response = self.client.get(reverse('products:product_list'), {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 12)
+
+    def test_count_is_cached(self):
+        """Le comptage total n'est exécuté qu'une fois"""
+        paginator = CursorPaginator(Product.objects.filter(is_active=True))
+        self.assertEqual(paginator.count, 25)
+        with self.assertNumQueries(0):
+            self.assertEqual(CursorPaginator(Product.objects.filter(is_active=True)).count, 25)
+
+
+class FacetTest(TestCase):
+    """Tests des comptages de facettes"""
+
+    def setUp(self):
+        cache.clear()
+        self.home = Category.objects.create(name="Domicile")
+        self.away = Category.objects.create(name="Extérieur")
+        self.team = Team.objects.create(name="Stella Club", country="Côte d'Ivoire")
+        self.first = Product.objects.create(
+            name="Maillot Stella Domicile", category=self.home, team=self.team,
+            description="Maillot", price=Decimal('10000'), sale_price=Decimal('8000'),
+            available_sizes=['M', 'L'], stock_quantity=3
+        )
+        self.second = Product.objects.create(
+            name="Maillot Stella Extérieur", category=self.away, team=self.team,
+            description="Maillot", price=Decimal('10000'),
+            available_sizes=['L'], stock_quantity=0
+        )
+
+    def test_counts_in_fixed_queries(self):
+        """Toutes les dimensions sont comptées en deux requêtes puis servies par le cache"""
+        product_filter = ProductFilter({}, queryset=Product.objects.all())
+        with self.assertNumQueries(2):
+            facets = get_facets(product_filter)
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['category'], {self.home.id: 1, self.away.id: 1})
+        self.assertEqual(facets['team'], {self.team.id: 2})
+        # Le second produit est en rupture : sa taille L n'est pas comptée
+        self.assertIn(('L', 1), facets['size'])
+        self.assertIn(('M', 1), facets['size'])
+        self.assertEqual(facets['on_sale'], 1)
+        self.assertEqual(facets['in_stock'], 1)
+        with self.assertNumQueries(0):
+            get_facets(ProductFilter({}, queryset=Product.objects.all()))
+
+    def test_active_filter_keeps_other_values(self):
+        """Une facette filtrée est comptée sans son propre filtre, mais avec les autres"""
+        facets = get_facets(ProductFilter({'category': self.home.id}, queryset=Product.objects.all()))
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['category'], {self.home.id: 1, self.away.id: 1})
+        self.assertEqual(facets['team'], {self.team.id: 1})
+
+        facets = get_facets(
+            ProductFilter({'category': self.away.id, 'in_stock': 'true'}, queryset=Product.objects.all())
+        )
+        self.assertEqual(facets['total'], 0)
+        self.assertEqual(facets['category'], {self.home.id: 1})
+        self.assertEqual(facets['in_stock'], 0)
+
+    def test_size_count_matches_size_filter(self):
+        """Une taille comptée renvoie autant de produits une fois choisie, réservations déduites"""
+        ProductVariant.objects.filter(product=self.first, size='M').update(reserved=3)
+        facets = get_facets(ProductFilter({}, queryset=Product.objects.all()))
+        for size, count in facets['size']:
+            product_filter = ProductFilter({'size': size}, queryset=Product.objects.all())
+            self.assertEqual(product_filter.qs.count(), count, size)
+        self.assertIn(('M', 0), facets['size'])
+
+    def test_filtered_facets_and_invalidation(self):
+        """Les facettes suivent les filtres et sont invalidées par une modification"""
+        data = {'category': str(self.home.id)}
+        facets = get_facets(ProductFilter(data, queryset=Product.objects.all()))
+        self.assertEqual(facets['total'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.category = self.home
+            self.second.save()
+        facets = get_facets(ProductFilter(data, queryset=Product.objects.all()))
+        self.assertEqual(facets['total'], 2)
+
+
+class ProductVariantTest(TestCase):
+    """Tests des variantes par taille"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="Séwé Sport", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Séwé", category=category, team=team,
+            description="Maillot", price=Decimal('10000'),
+            available_sizes=['M', 'L'], stock_quantity=8
+        )
+        self.other = Product.objects.create(
+            name="Maillot Séwé Extérieur", category=category, team=team,
+            description="Maillot", price=Decimal('10000'),
+            available_sizes=['XL'], stock_quantity=4
+        )
+
+    def test_variants_follow_available_sizes(self):
+        """Les variantes sont créées puis alignées sur available_sizes"""
+        self.assertEqual(
+            dict(self.product.variants.values_list('size', 'stock')), {'M': 8, 'L': 8}
+        )
+        product = Product.objects.get(pk=self.product.pk)
+        product.available_sizes = ['L', 'XL']
+        product.save()
+        self.assertEqual(sorted(product.variants.values_list('size', flat=True)), ['L', 'XL'])
+        self.assertFalse(product.is_available_in_size('M'))
+
+    def test_stock_per_size(self):
+        """Le stock par taille vient de la variante, en une seule requête"""
+        ProductVariant.objects.filter(product=self.product, size='M').update(stock=2)
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(product.is_available_in_size('M'))
+            self.assertEqual(product.get_stock_for_size('M'), 2)
+            self.assertEqual(product.get_stock_for_size('L'), 8)
+            self.assertEqual(product.get_stock_for_size('XS'), 0)
+
+        products = Product.objects.prefetch_related('variants')
+        with self.assertNumQueries(2):
+            stocks = {p.pk: p.get_stock_for_size('L') for p in products}
+        self.assertEqual(stocks, {self.product.pk: 8, self.other.pk: 0})
+
+    def test_filter_by_size(self):
+        """Le filtre « taille » s'appuie sur les variantes"""
+        product_filter = ProductFilter({'size': 'XL'}, queryset=Product.objects.all())
+        self.assertEqual(list(product_filter.qs), [self.other])
+
+
+class EffectivePriceTest(TestCase):
+    """Tests du prix effectif stocké"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="Racing Club d'Abidjan", country="Côte d'Ivoire")
+        self.discounted = Product.objects.create(
+            name="Maillot RCA Domicile", category=category, team=team,
+            description="Maillot", price=Decimal('20000'), sale_price=Decimal('9000'),
+            available_sizes=['M'], stock_quantity=5
+        )
+        self.regular = Product.objects.create(
+            name="Maillot RCA Extérieur", category=category, team=team,
+            description="Maillot", price=Decimal('12000'),
+            available_sizes=['M'], stock_quantity=5
+        )
+
+    def test_price_filter_uses_sale_price(self):
+        """Un produit soldé sous le plafond est retenu, le tri se fait en base"""
+        self.assertEqual(self.discounted.effective_price, Decimal('9000'))
+        product_filter = ProductFilter({'max_price': '10000'}, queryset=Product.objects.all())
+        self.assertEqual(list(product_filter.qs), [self.discounted])
+        product_filter = ProductFilter({'ordering': '-price'}, queryset=Product.objects.all())
+        self.assertEqual(list(product_filter.qs), [self.regular, self.discounted])
+
+    def test_bulk_update_keeps_effective_price(self):
+        """update() et bulk_update() recalculent le prix effectif"""
+        Product.objects.filter(pk=self.discounted.pk).update(sale_price=None)
+        Product.objects.filter(pk=self.regular.pk).update(price=F('price') - 2000)
+        self.discounted.refresh_from_db()
+        self.regular.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, Decimal('20000'))
+        self.assertEqual(self.regular.effective_price, Decimal('10000'))
+
+        self.regular.sale_price = Decimal('7000')
+        Product.objects.bulk_update([self.regular], ['sale_price'])
+        self.assertEqual(list(Product.objects.filter(effective_price__lt=F('price'))), [self.regular])
+
+
+class HomeCacheTest(TestCase):
+    """Tests du cache des rails de la page d'accueil"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="SOA", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot SOA Vedette", category=category, team=team,
+            description="Maillot", price=Decimal('10000'),
+            available_sizes=['M'], stock_quantity=5, is_featured=True
+        )
+
+    def test_rails_served_from_cache_until_catalog_changes(self):
+        """Un second affichage n'interroge plus le catalogue ; une modification l'invalide"""
+        self.assertContains(self.client.get(reverse('products:home')), "Maillot SOA Vedette")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('products:home'))
+        self.assertFalse([q for q in queries if 'products_product' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Maillot SOA Collector"
+            self.product.save()
+        self.assertContains(self.client.get(reverse('products:home')), "Maillot SOA Collector")
+
+
+class SimilarProductsTest(TestCase):
+    """Tests du précalcul des produits similaires"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', password='testpass123')
+        category = Category.objects.create(name="Domicile")
+        other_category = Category.objects.create(name="Accessoires")
+        team = Team.objects.create(name="ASEC Mimosas", country="Côte d'Ivoire")
+        other_team = Team.objects.create(name="Africa Sports", country="Côte d'Ivoire")
+
+        def create(name, team, category):
+            return Product.objects.create(
+                name=name, category=category, team=team, description="Maillot",
+                price=Decimal('10000'), available_sizes=['M'], stock_quantity=5
+            )
+
+        self.jersey = create("Maillot ASEC", team, category)
+        self.same_team = create("Short ASEC", team, other_category)
+        self.scarf = create("Écharpe Africa", other_team, other_category)
+        self.unrelated = create("Maillot Africa", other_team, category)
+
+    def _order(self, *products):
+        order = Order.objects.create(
+            user=self.user, order_number=f"CMD-TEST-{Order.objects.count()}",
+            subtotal=Decimal('10000'), total=Decimal('10000')
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, size='M', quantity=1, price=product.price)
+        return order
+
+    def test_co_purchases_rank_first_and_run_is_incremental(self):
+        """Les achats conjoints priment et seules les nouvelles commandes sont relues"""
+        self._order(self.jersey, self.scarf)
+        self._order(self.jersey, self.scarf)
+        run = build_similar_products()
+        self.assertEqual(run.orders_processed, 2)
+        neighbours = list(self.jersey.neighbours.values_list('similar_id', flat=True))
+        self.assertEqual(neighbours[:2], [self.scarf.id, self.same_team.id])
+        self.assertEqual(CoPurchase.objects.get(product=self.scarf, other=self.jersey).count, 2)
+
+        order = self._order(self.jersey, self.scarf)
+        run = build_similar_products()
+        self.assertEqual(run.orders_processed, 1)
+        self.assertEqual(run.last_order_id, order.id)
+        self.assertEqual(CoPurchase.objects.get(product=self.jersey, other=self.scarf).count, 3)
+
+    def test_product_detail_reads_neighbours(self):
+        """La page produit affiche les voisins précalculés dans l'ordre du rang"""
+        self._order(self.jersey, self.scarf)
+        build_similar_products(full=True)
+        response = self.client.get(self.jersey.get_absolute_url())
+        self.assertEqual(response.context['similar_products'][0], self.scarf)
+
+
+class ImportCatalogTest(TestCase):
+    """Tests de la commande import_catalog"""
+
+    CSV = (
+        "name,team,team_country,category,price,sale_price,stock_quantity,available_sizes\n"
+        "Maillot ASEC Domicile,ASEC Mimosas,Côte d'Ivoire,Domicile,15000,12000,10,\"S,M\"\n"
+        "Maillot ASEC Extérieur,ASEC Mimosas,Côte d'Ivoire,Extérieur,15000,,4,L\n"
+        "Sans prix,ASEC Mimosas,Côte d'Ivoire,Domicile,,,1,M\n"
+    )
+
+    def setUp(self):
+        self.team = Team.objects.create(name="ASEC Mimosas", slug="asec", country="Côte d'Ivoire")
+
+    def _import(self, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command('import_catalog', handle.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_then_update(self):
+        """Les produits sont créés puis mis à jour, l'équipe existante est réutilisée par son nom"""
+        output = self._import(self.CSV)
+        self.assertIn("Ligne 3 : Prix manquant", output)
+        self.assertEqual(Team.objects.count(), 1)
+        self.assertEqual(Category.objects.count(), 2)
+        product = Product.objects.get(slug='maillot-asec-domicile')
+        self.assertEqual(product.team, self.team)
+        self.assertEqual(product.effective_price, Decimal('12000'))
+        self.assertEqual(product.get_stock_for_size('M'), 10)
+        self.assertEqual(list(search_products(Product.objects.all(), 'exterieur')), [
+            Product.objects.get(slug='maillot-asec-exterieur')
+        ])
+
+        self._import(self.CSV.replace('15000,12000,10,"S,M"', '16000,,8,"M,XL"'))
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal('16000'))
+        self.assertEqual(sorted(product.variants.values_list('size', flat=True)), ['M', 'XL'])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_reimport_restocks_existing_variants(self):
+        """Un nouveau stock importé est reporté aux variantes déjà créées"""
+        self._import(self.CSV)
+        product = Product.objects.get(slug='maillot-asec-domicile')
+        # Taille M vendue jusqu'à la rupture
+        Product.objects.filter(pk=product.pk).update(stock_quantity=0)
+        product.variants.filter(size='M').update(stock=0)
+
+        self._import(self.CSV.replace('15000,12000,10,"S,M"', '15000,12000,20,"S,M"'))
+        self.assertEqual(dict(product.variants.values_list('size', 'stock')), {'S': 30, 'M': 20})
+        self.assertEqual(Product.objects.get(pk=product.pk).get_stock_for_size('M'), 20)
+
+    def test_dry_run_writes_nothing(self):
+        """La simulation rapporte les comptes sans rien enregistrer"""
+        output = self._import(self.CSV, '--dry-run')
+        self.assertIn("Produits créés : 2", output)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+
+class ConditionalGetTest(TestCase):
+    """Tests des réponses 304 sur les pages du catalogue"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="SC Gagnoa", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Gagnoa", category=category, team=team,
+            description="Maillot", price=Decimal('10000'),
+            available_sizes=['M'], stock_quantity=5
+        )
+        self.url = self.product.get_absolute_url()
+
+    def test_not_modified_until_catalog_or_cart_changes(self):
+        """304 tant que rien ne change ; une modification du produit ou du panier relance le rendu"""
+        # La première visite pose le cookie CSRF, qui fait partie de l'ETag
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        session = self.client.session
+        session['cart'] = {f'{self.product.id}_M': {'quantity': 1, 'price': '10000', 'size': 'M'}}
+        session.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('9000')
+            self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_only_for_anonymous_without_cart(self):
+        """Last-Modified n'est envoyé que si la page ne dépend pas de la session"""
+        response = self.client.get(reverse('products:product_list'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(
+            reverse('products:product_list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        User.objects.create_user(username='fan', password='testpass123')
+        self.client.login(username='fan', password='testpass123')
+        response = self.client.get(reverse('products:product_list'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class StockReservationTest(TestCase):
+    """Tests des réservations de stock pendant la commande"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="Africa Sports", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Africa", category=category, team=team,
+            description="Maillot", price=Decimal('10000'),
+            available_sizes=['M'], stock_quantity=3
+        )
+        self.first = CartModel.objects.create(session_key='first')
+        self.second = CartModel.objects.create(session_key='second')
+
+    def _variant(self):
+        return ProductVariant.objects.get(product=self.product, size='M')
+
+    def test_reservations_never_exceed_stock(self):
+        """Le disponible est le stock moins les réservations, et une réservation refusée n'en garde aucune"""
+        reserve_cart(self.first.id, [(self.product.id, 'M', 2)])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).get_stock_for_size('M'), 1)
+
+        with self.assertRaises(InsufficientStock):
+            reserve_cart(self.second.id, [(self.product.id, 'M', 2)])
+        self.assertFalse(StockReservation.objects.filter(cart=self.second).exists())
+
+        # Une nouvelle ouverture de caisse remplace les réservations du même panier
+        reserve_cart(self.first.id, [(self.product.id, 'M', 3)])
+        self.assertEqual(self._variant().reserved, 3)
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+
+    def test_expired_reservations_are_released(self):
+        """Les réservations expirées sont libérées par la commande ou à la demande"""
+        reserve_cart(self.first.id, [(self.product.id, 'M', 3)])
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        reserve_cart(self.second.id, [(self.product.id, 'M', 2)])
+        self.assertEqual(list(StockReservation.objects.values_list('cart', flat=True)), [self.second.id])
+        self.assertEqual(self._variant().reserved, 2)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('release_reservations', stdout=out)
+        self.assertIn("1 réservation(s)", out.getvalue())
+        self.assertEqual(self._variant().reserved, 0)
+
+    def test_commit_turns_reservation_into_stock_movement(self):
+        """La création de commande décrémente le stock et supprime les réservations"""
+        reserve_cart(self.first.id, [(self.product.id, 'M', 1)])
+        commit_cart(self.first.id, [(self.product.id, 'M', 2)])
+
+        variant = self._variant()
+        self.assertEqual((variant.stock, variant.reserved), (1, 0))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+        with self.assertRaises(InsufficientStock):
+            commit_cart(self.second.id, [(self.product.id, 'M', 2)])
+        self.assertEqual(self._variant().stock, 1)
+
+    def test_restock_reaches_variants(self):
+        """Un réassort saisi sur le produit rend la taille vendue de nouveau disponible"""
+        commit_cart(self.first.id, [(self.product.id, 'M', 3)])
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock_quantity = 20
+        product.save()
+
+        self.assertEqual(self._variant().stock, 20)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.get_stock_for_size('M'), 20)
+        reserve_cart(self.second.id, [(self.product.id, 'M', 2)])
+
+    def test_sizes_share_product_stock(self):
+        """Les tailles d'un produit ne réservent pas ensemble plus que son stock"""
+        self.product.available_sizes = ['M', 'L']
+        self.product.save()
+        reserve_cart(self.first.id, [(self.product.id, 'M', 2)])
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.reserved_quantity, product.get_stock_for_size('L')), (2, 1))
+
+        with self.assertRaises(InsufficientStock):
+            reserve_cart(self.second.id, [(self.product.id, 'L', 2)])
+        # Le refus de la taille L ne garde rien, ni sur le produit ni sur la variante
+        self.assertEqual(Product.objects.get(pk=self.product.pk).reserved_quantity, 2)
+        self.assertEqual(ProductVariant.objects.get(product=self.product, size='L').reserved, 0)
+
+        commit_cart(self.first.id, [(self.product.id, 'M', 2)])
+        commit_cart(self.second.id, [(self.product.id, 'L', 1)])
+        with self.assertRaises(InsufficientStock):
+            commit_cart(self.second.id, [(self.product.id, 'L', 1)])
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stock_quantity, product.reserved_quantity), (0, 0))
+        self.assertEqual(ledger_stock(product), 0)
+
+
+class StockAdjustmentTest(TestCase):
+    """Tests des mouvements de stock groupés"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Third")
+        team = Team.objects.create(name="Séwé Sport", country="Côte d'Ivoire")
+        self.products = [
+            Product.objects.create(
+                name=f"Maillot Séwé {index}", category=category, team=team, description="Maillot",
+                price=Decimal('10000'), available_sizes=['M', 'L'], stock_quantity=stock
+            )
+            for index, stock in enumerate((8, 2))
+        ]
+
+    def test_withdraw_deactivates_and_alerts_in_one_statement(self):
+        """Une requête par table ; rupture et alerte de stock faible déduites des lignes renvoyées"""
+        first, second = self.products
+        with self.captureOnCommitCallbacks() as callbacks:
+            # Variantes, produits (RETURNING), journal
+            with self.assertNumQueries(6):
+                rows = withdraw_stock([(first.id, 'M', 2), (first.id, 'L', 1), (second.id, 'M', 2)])
+        self.assertEqual(dict(rows), {first.id: 5, second.id: 0})
+        # Une seule alerte groupée (le premier produit passe sous le seuil) et,
+        # le second étant en rupture, une nouvelle version du catalogue
+        self.assertEqual(len(callbacks), 2)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.is_active)
+        self.assertFalse(second.is_active)
+        self.assertEqual(
+            dict(ProductVariant.objects.filter(product=first).values_list('size', 'stock')), {'M': 6, 'L': 7}
+        )
+
+        restore_stock([(second.id, 'M', 2)])
+        second.refresh_from_db()
+        self.assertEqual(second.stock_quantity, 2)
+        self.assertTrue(second.is_active)
+
+    def test_sell_out_refreshes_catalog_pages(self):
+        """Un produit vendu jusqu'à la rupture n'est plus servi par les ETag ni par les rails en cache"""
+        cache.clear()
+        product = self.products[1]
+        Product.objects.filter(pk=product.pk).update(is_featured=True)
+        url = product.get_absolute_url()
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertContains(self.client.get(reverse('products:home')), product.name)
+
+        # La page n'affiche pas la quantité : une vente partielle peut garder l'ETag
+        self.assertNotContains(self.client.get(url), "2 disponibles")
+        with self.captureOnCommitCallbacks(execute=True):
+            withdraw_stock([(product.id, 'M', 2)])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+        self.assertNotContains(self.client.get(reverse('products:home')), product.name)
+
+
+class StockLedgerTest(TestCase):
+    """Tests du journal de stock et de ses instantanés"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="Stella Club", country="Côte d'Ivoire")
+        self.product = Product.objects.create(
+            name="Maillot Stella", category=category, team=team, description="Maillot",
+            price=Decimal('10000'), available_sizes=['M'], stock_quantity=10
+        )
+
+    def _settle(self):
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+    def test_movements_explain_stock(self):
+        """Inventaire, vente, annulation et saisie manuelle : le journal suit le stock"""
+        withdraw_stock([(self.product.id, 'M', 3)])
+        restore_stock([(self.product.id, 'M', 1)])
+        self.product.refresh_from_db()
+        self.product.stock_quantity = 15
+        self.product.save()
+
+        kinds = list(StockMovement.objects.order_by('id').values_list('kind', 'quantity'))
+        self.assertEqual(kinds, [
+            (StockMovement.INVENTORY, 10), (StockMovement.SALE, -3),
+            (StockMovement.CANCELLATION, 1), (StockMovement.ADJUSTMENT, 7),
+        ])
+        self.assertEqual(ledger_stock(self.product), 15)
+        self.assertEqual(stock_history(self.product, days=3)[-1], (timezone.localdate(), 15))
+        with self.assertRaises(ValueError):
+            StockMovement.objects.first().save()
+
+    def test_snapshot_plus_recent_delta(self):
+        """Le stock est le dernier instantané plus les mouvements suivants, en une requête"""
+        withdraw_stock([(self.product.id, 'M', 4)])
+        self._settle()
+        snapshotter = StockSnapshotter().run()
+        self.assertEqual((snapshotter.snapshots, snapshotter.adjustments), (1, 0))
+        self.assertEqual(StockSnapshot.objects.get().quantity, 6)
+
+        withdraw_stock([(self.product.id, 'M', 1)])
+        with self.assertNumQueries(1):
+            self.assertEqual(ledger_stock(self.product), 5)
+
+        # Écart (mise à jour en masse hors journal) : rattrapé par un ajustement
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=9)
+        snapshotter = StockSnapshotter().run()
+        self.assertEqual(snapshotter.adjustments, 1)
+        self.assertEqual(ledger_stock(self.product), 9)
+
+
+class SalesCounterTest(TestCase):
+    """Tests des compteurs de ventes et du score de popularité"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('yao', password='secret')
+        category = Category.objects.create(name="Domicile")
+        team = Team.objects.create(name="SOA", country="Côte d'Ivoire")
+        self.old, self.recent = [
+            Product.objects.create(
+                name=f"Maillot SOA {index}", category=category, team=team, description="Maillot",
+                price=Decimal('10000'), available_sizes=['M'], stock_quantity=20
+            )
+            for index in range(2)
+        ]
+
+    def _order(self, product, quantity, days_ago=0):
+        order = Order.objects.create(
+            user=self.user, order_number=f"CMD{Order.objects.count()}",
+            subtotal=Decimal('10000') * quantity, total=Decimal('10000') * quantity
+        )
+        OrderItem.objects.create(
+            order=order, product=product, product_name=product.name, size='M', quantity=quantity,
+            price=Decimal('10000'), total_price=Decimal('10000') * quantity
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return Order.objects.get(pk=order.pk)
+
+    def _counters(self, product):
+        product.refresh_from_db()
+        return product.units_sold, product.sales_revenue
+
+    def test_sold_order_counts_once(self):
+        """Payée puis livrée : comptée une fois ; remboursée : décomptée"""
+        order = self._order(self.recent, 2)
+        order.payment_status = 'paid'
+        # Commande, articles, compteurs
+        with self.assertNumQueries(3):
+            order.save()
+        self.assertEqual(self._counters(self.recent), (2, Decimal('20000')))
+        self.assertAlmostEqual(popularity(self.recent.popularity_score), 2, places=3)
+
+        order.status = 'delivered'
+        order.save()
+        self.assertEqual(self._counters(self.recent), (2, Decimal('20000')))
+
+        order.status = 'refunded'
+        order.save()
+        self.assertEqual(self._counters(self.recent), (0, Decimal('0')))
+
+    def test_recent_sales_rank_first(self):
+        """Les ventes récentes pèsent plus que les anciennes ; la reconstruction retrouve les compteurs"""
+        old_order = self._order(self.old, 5, days_ago=60)
+        old_order.status = 'delivered'
+        old_order.save()
+        recent_order = self._order(self.recent, 2)
+        recent_order.payment_status = 'paid'
+        recent_order.save()
+
+        product_filter = ProductFilter({'ordering': '-popularity'}, queryset=Product.objects.all())
+        self.assertEqual(list(product_filter.qs), [self.recent, self.old])
+
+        expected = list(Product.objects.order_by('id').values_list('units_sold', 'sales_revenue', 'popularity_score'))
+        Product.objects.update(units_sold=0, sales_revenue=0, popularity_score=0)
+        call_command('rebuild_sales', stdout=StringIO())
+        rebuilt = list(Product.objects.order_by('id').values_list('units_sold', 'sales_revenue', 'popularity_score'))
+        self.assertEqual([row[:2] for row in rebuilt], [row[:2] for row in expected])
+        for (_units, _revenue, score), (_expected_units, _expected_revenue, expected_score) in zip(rebuilt, expected):
+            self.assertAlmostEqual(score / expected_score, 1)
+
+    def test_migration_backfills_counters(self):
+        """La migration des compteurs les calcule pour les commandes déjà vendues"""
+        order = self._order(self.old, 3, days_ago=30)
+        Order.objects.filter(pk=order.pk).update(status='delivered')
+        migration = import_module('products.migrations.0013_product_sales_counters')
+        migration.backfill_sales_counters(apps, None)
+        self.assertEqual(self._counters(self.old), (3, Decimal('30000')))
+        self.assertEqual(self._counters(self.recent), (0, Decimal('0')))
+
+    def test_sale_refreshes_popularity_ordering(self):
+        """Une vente change l'ordre « Meilleures ventes » : l'ancien ETag n'est plus servi"""
+        cache.clear()
+        url = reverse('products:product_list') + '?ordering=-popularity'
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        order = self._order(self.recent, 2)
+        order.payment_status = 'paid'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['products'])[0], self.recent)
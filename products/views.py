@@ -1,22 +1,28 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
+from django.db.models import F, Q
 from django_filters import rest_framework as filters
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .models import Product, Category, Team, Review
+from .cache import HOME_RAILS_TIMEOUT, get_catalog_version
+from .conditional import catalog_condition
+from .facets import get_facets
 from .filters import ProductFilter
+from .pagination import paginate
+from .search import search_products
 
 
+@catalog_condition
 def home(request):
     """Page d'accueil avec produits vedettes et promotions"""
+    # Querysets paresseux : ils ne sont évalués que si le fragment n'est pas en cache
     featured_products = Product.objects.filter(
         is_featured=True, 
         is_active=True
     ).prefetch_related('images', 'team', 'category')[:8]
     
     sale_products = Product.objects.filter(
-        sale_price__isnull=False,
+        effective_price__lt=F('price'),
         is_active=True
     ).prefetch_related('images', 'team', 'category')[:8]
     
@@ -31,10 +37,13 @@ def home(request):
         'sale_products': sale_products,
         'latest_products': latest_products,
         'categories': categories,
+        'catalog_version': get_catalog_version(),
+        'rails_cache_timeout': HOME_RAILS_TIMEOUT,
     }
     return render(request, 'products/home.html', context)
 
 
+@catalog_condition
 def product_list(request):
     """Liste des produits avec filtres"""
     products = Product.objects.filter(is_active=True).prefetch_related('images', 'team', 'category')
@@ -43,29 +52,31 @@ def product_list(request):
     product_filter = ProductFilter(request.GET, queryset=products)
     products = product_filter.qs
     
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
+    # Pagination par curseur (keyset)
+    products = paginate(request, products)
+    
+    # Comptages par facette (un seul parcours, mis en cache)
+    facets = get_facets(product_filter)
     
     # Obtenir les filtres disponibles
-    categories = Category.objects.all()
-    teams = Team.objects.all()
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.facet_count = facets['category'].get(category.id, 0)
+    teams = list(Team.objects.all())
+    for team in teams:
+        team.facet_count = facets['team'].get(team.id, 0)
     
     context = {
         'products': products,
         'filter': product_filter,
+        'facets': facets,
         'categories': categories,
         'teams': teams,
     }
     return render(request, 'products/product_list.html', context)
 
 
+@catalog_condition
 def product_detail(request, slug):
     """Détail d'un produit"""
     product = get_object_or_404(
@@ -74,11 +85,19 @@ def product_detail(request, slug):
         is_active=True
     )
     
-    # Produits similaires
-    similar_products = Product.objects.filter(
-        Q(category=product.category) | Q(team=product.team),
-        is_active=True
-    ).exclude(id=product.id).prefetch_related('images')[:4]
+    # Produits similaires précalculés (build_similar_products), lus via l'index (produit, rang)
+    similar_products = list(
+        Product.objects.filter(
+            similar_to__product=product,
+            is_active=True
+        ).order_by('similar_to__rank').select_related('team').prefetch_related('images')[:4]
+    )
+    if not similar_products:
+        # Produit pas encore traité par le calcul : repli sur l'équipe / la catégorie
+        similar_products = Product.objects.filter(
+            Q(category=product.category) | Q(team=product.team),
+            is_active=True
+        ).exclude(id=product.id).select_related('team').prefetch_related('images')[:4]
     
     # Avis du produit
     reviews = product.reviews.all()
@@ -91,6 +110,7 @@ def product_detail(request, slug):
     return render(request, 'products/product_detail.html', context)
 
 
+@catalog_condition
 def category_detail(request, slug):
     """Détail d'une catégorie avec ses produits"""
     category = get_object_or_404(Category, slug=slug)
@@ -99,15 +119,8 @@ def category_detail(request, slug):
         is_active=True
     ).prefetch_related('images', 'team')
     
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
+    # Pagination par curseur (keyset)
+    products = paginate(request, products)
     
     context = {
         'category': category,
@@ -116,6 +129,7 @@ def category_detail(request, slug):
     return render(request, 'products/category_detail.html', context)
 
 
+@catalog_condition
 def team_detail(request, slug):
     """Détail d'une équipe avec ses produits"""
     team = get_object_or_404(Team, slug=slug)
@@ -124,15 +138,8 @@ def team_detail(request, slug):
         is_active=True
     ).prefetch_related('images', 'category')
     
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
+    # Pagination par curseur (keyset)
+    products = paginate(request, products)
     
     context = {
         'team': team,
@@ -147,22 +154,11 @@ def search(request):
     products = Product.objects.filter(is_active=True)
     
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(team__name__icontains=query) |
-            Q(category__name__icontains=query)
-        ).prefetch_related('images', 'team', 'category')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
+        # Recherche plein texte indexée, triée par pertinence
+        products = search_products(products, query).prefetch_related('images', 'team', 'category')
+    
+    # Pagination par curseur (keyset)
+    products = paginate(request, products)
     
     context = {
         'products': products,